@@ -1,11 +1,41 @@
 from passlib.context import CryptContext
 from jose import jwt
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+import multiprocessing
 import os
+import threading
 from datetime import datetime, timedelta
 from pydantic import BaseModel, Field
 
+# Argon2 cost parameters. Changing them makes existing hashes "deprecated";
+# they are transparently re-hashed on the user's next successful login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 65536))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 4))
+
+# Password hashing runs in a dedicated process pool so it never competes with
+# request handling for the GIL. At most PASSWORD_MAX_PENDING jobs may be queued
+# or running; beyond that callers get a fast 503 instead of piling up.
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", os.cpu_count() or 2))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", PASSWORD_WORKERS * 4))
+PASSWORD_TIMEOUT = float(os.getenv("PASSWORD_TIMEOUT", 10))
+# Workers start from a clean interpreter rather than a fork of a process that
+# holds threads, DB connections and locks
+PASSWORD_START_METHOD = os.getenv(
+    "PASSWORD_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
 # Password hashing context using Argon2 (no 72-byte limit)
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -27,6 +57,78 @@ def verify_password(password: str, hashed: str) -> bool:
     """
     return pwd_context.verify(password, hashed)
 
+def verify_and_update(password: str, hashed: str):
+    """
+    Verify a password; also return a new hash if the stored one uses
+    outdated parameters (else None).
+    """
+    return pwd_context.verify_and_update(password, hashed)
+
+# ----------------------------
+# Hashing Worker Pool
+# ----------------------------
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(PASSWORD_MAX_PENDING)
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    # One pool per process: a forked worker must not reuse its parent's pool
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(
+                    max_workers=PASSWORD_WORKERS,
+                    mp_context=multiprocessing.get_context(PASSWORD_START_METHOD)
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+def _discard_pool(broken: ProcessPoolExecutor) -> None:
+    """
+    Drop a pool whose worker died (e.g. OOM-killed); the next call starts a new one.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def _submit(fn, *args):
+    pool = _get_pool()
+    try:
+        return pool, pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        pool = _get_pool()
+        return pool, pool.submit(fn, *args)
+
+def run_in_password_pool(fn, *args):
+    """
+    Run a hashing function in the worker pool and wait for the result.
+    Raises 503 immediately when the pool is saturated, and when the job
+    times out or its worker dies.
+    """
+    if not _pending.acquire(blocking=False):
+        raise HTTPException(503, "Server busy, please retry", headers={"Retry-After": "1"})
+    try:
+        pool, future = _submit(fn, *args)
+    except Exception:
+        _pending.release()
+        raise
+    # The slot is freed when the job actually finishes, not when we stop
+    # waiting for it, so timed-out jobs still count against the limit
+    future.add_done_callback(lambda _: _pending.release())
+
+    try:
+        return future.result(timeout=PASSWORD_TIMEOUT)
+    except FutureTimeoutError:
+        raise HTTPException(503, "Password check timed out, please retry", headers={"Retry-After": "1"})
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise HTTPException(503, "Server busy, please retry", headers={"Retry-After": "1"})
+
 # ----------------------------
 # JWT Token Creation
 # ----------------------------
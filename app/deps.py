@@ -1,17 +1,197 @@
 from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import jwt
+from sqlalchemy import delete, or_
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from datetime import datetime, timezone
+import hashlib
 import os
+import threading
+import time
+
+from .database import SessionLocal, dialect_insert
+from .models import RevokedToken
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+# How often each worker pulls logouts made through other workers
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", 5))
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+# ----------------------------
+# Verified Token Cache
+# ----------------------------
+class TokenCache:
+    """
+    LRU of verified JWT claims keyed by the token's SHA-256 digest.
+    Entries are dropped once the token's `exp` has passed, so a cached token
+    never outlives its signature check.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> (exp, claims)
+        self._revoked = {}             # digest -> exp
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected_revoked = 0
+
+    def get(self, digest: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            exp, claims = entry
+            if exp is not None and exp <= now:
+                del self._entries[digest]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return claims
+
+    def put(self, digest: str, claims: dict) -> None:
+        with self._lock:
+            self._entries[digest] = (claims.get("exp"), claims)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # ---------- revocation ----------
+    def revoke(self, digest: str, exp) -> None:
+        now = time.time()
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._revoked[digest] = exp
+            # Revoked tokens only need remembering until they would expire anyway
+            self._revoked = {d: e for d, e in self._revoked.items() if e is None or e > now}
+
+    def load_revoked(self, revoked: dict) -> None:
+        """
+        Merge the shared denylist (digest -> exp) read from the database.
+        """
+        now = time.time()
+        with self._lock:
+            for digest in revoked:
+                self._entries.pop(digest, None)
+            merged = {**self._revoked, **revoked}
+            self._revoked = {d: e for d, e in merged.items() if e is None or e > now}
+
+    def is_revoked(self, digest: str) -> bool:
+        if digest in self._revoked:
+            with self._lock:
+                self.rejected_revoked += 1
+            return True
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "revoked": len(self._revoked),
+                "rejected_revoked": self.rejected_revoked,
+            }
+
+
+token_cache = TokenCache()
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+# ----------------------------
+# Shared Revocation List
+# ----------------------------
+# Logouts are written to revoked_tokens so every worker honours them. Each
+# worker keeps the unexpired rows in its token cache and re-reads them at most
+# every REVOCATION_SYNC_INTERVAL seconds, so a token revoked elsewhere stops
+# working within that interval; the worker that handled the logout rejects it
+# immediately.
+_revocations_synced_at = 0.0
+_revocations_lock = threading.Lock()  # one sync at a time; the others wait, then find it done
+
+
+def revoke_token(db: Session, token: str, exp) -> None:
+    digest = token_digest(token)
+    expires_at = datetime.fromtimestamp(exp, timezone.utc).replace(tzinfo=None) if exp else None
+    insert = dialect_insert(db)
+    db.execute(
+        insert(RevokedToken).values(digest=digest, expires_at=expires_at)
+        .on_conflict_do_nothing(index_elements=["digest"])
+    )
+    # Rows are only needed until the token would have expired anyway
+    db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= datetime.utcnow()))
+    db.commit()
+    token_cache.revoke(digest, exp)
+
+
+def _revocations_due() -> bool:
+    return time.monotonic() - _revocations_synced_at > REVOCATION_SYNC_INTERVAL
+
+
+def sync_revocations() -> None:
+    global _revocations_synced_at
+    if not _revocations_due():
+        return
+    with _revocations_lock:
+        if not _revocations_due():  # another request synced while we waited
+            return
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(RevokedToken.digest, RevokedToken.expires_at)
+                .filter(or_(RevokedToken.expires_at == None, RevokedToken.expires_at > datetime.utcnow()))
+                .all()
+            )
+        finally:
+            db.close()
+        token_cache.load_revoked({
+            digest: expires_at.replace(tzinfo=timezone.utc).timestamp() if expires_at else None
+            for digest, expires_at in rows
+        })
+        _revocations_synced_at = time.monotonic()
+
+
+def bearer_token(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> str:
+    if credentials is None or credentials.scheme.lower() != "bearer":
+        raise HTTPException(401, "Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return credentials.credentials
+
+
 # decode token to get user
-def get_current_user(token: str):
+def get_current_user(token: str = Depends(bearer_token)):
+    digest = token_digest(token)
+    sync_revocations()
+    if token_cache.is_revoked(digest):
+        raise HTTPException(401, "Token has been revoked", headers={"WWW-Authenticate": "Bearer"})
+
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except Exception:
-        raise HTTPException(401, "Invalid or expired token")
+        raise HTTPException(401, "Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+    token_cache.put(digest, payload)
+    return payload
 
 # role check dependencies
 def admin_only(user=Depends(get_current_user)):
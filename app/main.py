@@ -1,10 +1,19 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routes import auth, inventory, products, orders, cart,pricing,customer,warehouses
-from .database import engine, Base
+from app.routes import auth, inventory, products, orders, cart,pricing,customer,warehouses,admin
+from .database import engine, Base, DB_ASYNC, SessionLocal
+from .migrations import run_migrations
+from .services.cart import warm_indexes
+from .services.cart_sweeper import start_cart_sweeper
+from .payments.dispatcher import payment_dispatcher
+from .services.categories import backfill_paths
+from .services.idempotency import start_idempotency_sweeper
+from .services.reservations import start_hold_sweeper
+from .services.search import product_search
 
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)  # columns / indexes added to existing tables
 
 app = FastAPI(title="E-Commerce API")
 
@@ -19,13 +28,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],         # allow GET, POST, PUT, DELETE...
     allow_headers=["*"],         # allow all headers
+    expose_headers=["X-Next-Cursor", "ETag", "Idempotent-Replayed"],  # pagination cursor, conditional GETs, replays
 )
 
+@app.on_event("startup")
+def start_background_jobs():
+    db = SessionLocal()
+    try:
+        backfill_paths(db)
+        warm_indexes(db)  # the first checkouts find them loaded
+    finally:
+        db.close()
+    start_hold_sweeper()
+    start_cart_sweeper()
+    start_idempotency_sweeper()
+    payment_dispatcher.start()
+    product_search.start()
+
 app.include_router(auth.router)
 app.include_router(products.router)
-app.include_router(cart.router)
+if DB_ASYNC:
+    from app.routes import cart_async
+    app.include_router(cart_async.router)
+else:
+    app.include_router(cart.router)
 app.include_router(orders.router)
 app.include_router(inventory.router)
 app.include_router(pricing.router)
 app.include_router(customer.router)
 app.include_router(warehouses.router)
+app.include_router(admin.router)
@@ -0,0 +1,102 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from . import models  # registers every table on Base.metadata
+from .database import Base
+
+# Idempotent schema upgrades, run at startup right after create_all().
+# create_all() only creates missing tables; columns and indexes added to
+# tables that already exist are brought in here. Every step checks before it
+# acts, so running this on an up-to-date database is a no-op.
+
+# (table, column, column DDL) -- existing rows get the DEFAULT on Postgres and SQLite
+COLUMNS = [
+    ("categories", "path", "VARCHAR"),
+    ("categories", "depth", "INTEGER DEFAULT 0"),
+    ("products", "category_id", "INTEGER REFERENCES categories (id)"),
+    ("products", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ("product_variants", "weight", "FLOAT DEFAULT 0"),
+    ("orders", "discount", "FLOAT DEFAULT 0"),
+    ("orders", "tax", "FLOAT DEFAULT 0"),
+    ("orders", "coupon_code", "VARCHAR REFERENCES coupons (code)"),
+    ("coupons", "times_used", "INTEGER NOT NULL DEFAULT 0"),
+    ("discounts", "automatic", "BOOLEAN DEFAULT FALSE"),
+    ("payments", "phone", "VARCHAR"),
+    ("payments", "attempts", "INTEGER DEFAULT 0"),
+    ("payments", "next_attempt_at", "TIMESTAMP"),
+    ("payments", "last_error", "VARCHAR"),
+]
+
+# Serializes concurrent upgrades when several workers start at once
+_MIGRATION_LOCK_ID = 7_240_001
+
+
+def _add_columns(conn: Connection) -> None:
+    inspector = inspect(conn)
+    existing = {}
+    for table, column, ddl in COLUMNS:
+        if table not in existing:
+            existing[table] = {c["name"] for c in inspector.get_columns(table)}
+        if column not in existing[table]:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            existing[table].add(column)
+
+
+def _inventory_unique(conn: Connection) -> None:
+    """
+    uq_inventory_variant_warehouse backs the ON CONFLICT fan-out inserts.
+    Duplicate (variant, warehouse) rows are merged into the oldest one,
+    quantities summed, before the constraint is added.
+    """
+    inspector = inspect(conn)
+    names = {c["name"] for c in inspector.get_unique_constraints("inventory")}
+    names |= {i["name"] for i in inspector.get_indexes("inventory")}
+    if "uq_inventory_variant_warehouse" in names:
+        return
+
+    duplicates = """
+        SELECT MIN(id) FROM inventory
+        WHERE product_variant_id IS NOT NULL AND warehouse_id IS NOT NULL
+        GROUP BY product_variant_id, warehouse_id
+    """
+    conn.execute(text(f"""
+        UPDATE inventory SET quantity = (
+            SELECT SUM(COALESCE(i2.quantity, 0)) FROM inventory i2
+            WHERE i2.product_variant_id = inventory.product_variant_id
+              AND i2.warehouse_id = inventory.warehouse_id
+        )
+        WHERE id IN ({duplicates} HAVING COUNT(*) > 1)
+    """))
+    conn.execute(text(f"""
+        DELETE FROM inventory
+        WHERE product_variant_id IS NOT NULL AND warehouse_id IS NOT NULL
+          AND id NOT IN ({duplicates})
+    """))
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(
+            "ALTER TABLE inventory ADD CONSTRAINT uq_inventory_variant_warehouse "
+            "UNIQUE (product_variant_id, warehouse_id)"
+        ))
+    else:
+        # SQLite cannot add constraints to an existing table; a unique index
+        # satisfies ON CONFLICT just the same
+        conn.execute(text(
+            "CREATE UNIQUE INDEX uq_inventory_variant_warehouse "
+            "ON inventory (product_variant_id, warehouse_id)"
+        ))
+
+
+def _create_indexes(conn: Connection) -> None:
+    # Index definitions (names, columns, postgresql_ops) come from the models
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def run_migrations(engine: Engine) -> None:
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _MIGRATION_LOCK_ID})
+        _add_columns(conn)
+        _inventory_unique(conn)
+        _create_indexes(conn)
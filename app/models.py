@@ -1,5 +1,5 @@
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Float, ForeignKey, Text, func
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, DateTime, Integer, String, Float, ForeignKey, Index, Text, UniqueConstraint, func
+from sqlalchemy.orm import backref, column_property, relationship
 from .database import Base
 
 # -------------------------
@@ -13,7 +13,7 @@ class User(Base):
     password = Column(String)
     sso_provider = Column(String, nullable=True)
     sso_id = Column(String, nullable=True)
-    role = Column(String, default="USER")  # ADMIN, CASHIER, CUSTOMER
+    role = Column(String, default="USER", index=True)  # ADMIN, CASHIER, CUSTOMER
     is_active = Column(Boolean, default=True)
     loyalty_points = Column(Integer, default=0)
     customer_segment = Column(String, nullable=True)
@@ -43,10 +43,16 @@ class Address(Base):
 # -------------------------
 class Category(Base):
     __tablename__ = "categories"
+    __table_args__ = (
+        # text_pattern_ops lets Postgres use the index for `path LIKE '/1/4/%'`
+        Index("ix_categories_path", "path", postgresql_ops={"path": "text_pattern_ops"}),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True)
     parent_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    path = Column(String, nullable=True)  # materialized ancestry, e.g. "/1/4/9/"
+    depth = Column(Integer, default=0)
 
     parent = relationship("Category", remote_side=[id], backref="subcategories")
 
@@ -55,6 +61,9 @@ class Category(Base):
 # -------------------------
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_active_type", "is_active", "product_type"),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
@@ -62,19 +71,27 @@ class Product(Base):
     product_type = Column(String)  # physical | digital | service
     is_active = Column(Boolean, default=True)
     url = Column(String, unique=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
     created_at = Column(DateTime, server_default=func.now())
+    version = Column(Integer, nullable=False, default=0)  # bumped by any write to it or its variants (ETag)
 
     variants = relationship("ProductVariant", back_populates="product")
+    category = relationship("Category")
 
 class ProductVariant(Base):
     __tablename__ = "product_variants"
+    __table_args__ = (
+        Index("ix_product_variants_product_id", "product_id"),  # variants of a product: reindex, facets, detail
+    )
 
     id = Column(Integer, primary_key=True)
-    product_id = Column(Integer, ForeignKey("products.id"))
+    # active_history: a move to another product knows which one it left (product versions)
+    product_id = column_property(Column(Integer, ForeignKey("products.id")), active_history=True)
     sku = Column(String, unique=True)
     price = Column(Float)
     size = Column(String, nullable=True)
     color = Column(String, nullable=True)
+    weight = Column(Float, default=0)  # kg, used for shipping brackets
     is_active = Column(Boolean, default=True)
 
     product = relationship("Product", back_populates="variants")
@@ -110,16 +127,34 @@ class Warehouse(Base):
 
 class Inventory(Base):
     __tablename__ = "inventory"
+    __table_args__ = (
+        UniqueConstraint("product_variant_id", "warehouse_id", name="uq_inventory_variant_warehouse"),
+    )
 
     id = Column(Integer, primary_key=True)
     product_variant_id = Column(Integer, ForeignKey("product_variants.id"))
-    warehouse_id = Column(Integer, ForeignKey("warehouses.id"))
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), index=True)
     quantity = Column(Integer, default=0)
     reorder_level = Column(Integer, default=5)
 
     product_variant = relationship("ProductVariant", back_populates="inventory")
     warehouse = relationship("Warehouse", back_populates="inventory")
 
+# Append-only ledger of temporary cart reservations:
+# available stock = sum(Inventory.quantity) - unexpired holds
+class StockHold(Base):
+    __tablename__ = "stock_holds"
+    __table_args__ = (
+        Index("ix_stock_holds_variant_expires", "product_variant_id", "expires_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    cart_id = Column(Integer, ForeignKey("carts.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_variant_id = Column(Integer, ForeignKey("product_variants.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, server_default=func.now())
+
 # -------------------------
 # Cart & Cart Items
 # -------------------------
@@ -133,7 +168,7 @@ class Cart(Base):
     guest_email = Column(String, nullable=True)
 
     is_abandoned = Column(Boolean, default=False)
-    last_activity_at = Column(DateTime, server_default=func.now())
+    last_activity_at = Column(DateTime, server_default=func.now(), index=True)  # abandoned-cart sweeper
 
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -149,7 +184,7 @@ class CartItem(Base):
     __tablename__ = "cart_items"
 
     id = Column(Integer, primary_key=True)
-    cart_id = Column(Integer, ForeignKey("carts.id", ondelete="CASCADE"), nullable=False)
+    cart_id = Column(Integer, ForeignKey("carts.id", ondelete="CASCADE"), nullable=False, index=True)
     product_variant_id = Column(Integer, ForeignKey("product_variants.id"), nullable=False)
     quantity = Column(Integer, nullable=False, default=1)
 
@@ -162,6 +197,9 @@ class CartItem(Base):
 # -------------------------
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_user_id_id", "user_id", "id"),  # order history, keyset-paged by id
+    )
 
     id = Column(Integer, primary_key=True)
 
@@ -169,13 +207,16 @@ class Order(Base):
     guest_email = Column(String, nullable=True)
 
     source = Column(String)  # POS | ONLINE
-    status = Column(String, default="CREATED")
+    status = Column(String, default="CREATED", index=True)
 
-    total = Column(Float, default=0)
+    total = Column(Float, default=0)  # subtotal - discount + tax + shipping_cost
+    discount = Column(Float, default=0)
+    tax = Column(Float, default=0)
     shipping_cost = Column(Float, default=0)
+    coupon_code = Column(String, ForeignKey("coupons.code"), nullable=True)
     currency = Column(String, default="KES")
 
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, server_default=func.now(), index=True)
 
     user = relationship("User", back_populates="orders")
     items = relationship(
@@ -184,14 +225,14 @@ class Order(Base):
         cascade="all, delete-orphan"
     )
     payment = relationship("Payment", back_populates="order", uselist=False)
-    shipment = relationship("Shipment", back_populates="order", uselist=False)
+    shipments = relationship("Shipment", back_populates="order")  # one per warehouse
 
 
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"))
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), index=True)
     product_variant_id = Column(Integer, ForeignKey("product_variants.id"))
     quantity = Column(Integer, nullable=False)
     price = Column(Float)
@@ -203,13 +244,13 @@ class OrderAddress(Base):
     __tablename__ = "order_addresses"
 
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"))
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), index=True)
 
     line1 = Column(String)
     city = Column(String)
     country = Column(String)
 
-    order = relationship("Order", backref="shipping_address")
+    order = relationship("Order", backref=backref("shipping_address", uselist=False))  # one per order
 
 # -------------------------
 # Payments
@@ -218,11 +259,15 @@ class Payment(Base):
     __tablename__ = "payments"
 
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     provider = Column(String)  # MPESA, STRIPE
     reference = Column(String)
-    status = Column(String)  # PENDING, SUCCESS, FAILED
+    status = Column(String, index=True)  # PENDING, SENDING (non-idempotent call in flight), PROCESSING (sent, awaiting provider confirmation), SUCCESS, FAILED, UNKNOWN (may have been sent; reconcile by hand)
     amount = Column(Float)
+    phone = Column(String, nullable=True)  # MPESA STK push target
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, nullable=True)  # dispatcher backoff / claim lease
+    last_error = Column(String, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
 
     order = relationship("Order", back_populates="payment")
@@ -234,13 +279,13 @@ class Shipment(Base):
     __tablename__ = "shipments"
 
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     warehouse_id = Column(Integer, ForeignKey("warehouses.id"))
     carrier = Column(String)
     tracking_number = Column(String)
     status = Column(String)
 
-    order = relationship("Order", back_populates="shipment")
+    order = relationship("Order", back_populates="shipments")
     warehouse = relationship("Warehouse", back_populates="shipments")
 
 
@@ -258,6 +303,7 @@ class Discount(Base):
     end_date = Column(DateTime, nullable=True)
     active = Column(Boolean, default=True)
     customer_segment = Column(String, nullable=True)  # optional, e.g., VIP, Wholesale
+    automatic = Column(Boolean, default=False)  # applies to every matching basket without a coupon
 
     coupons = relationship("Coupon", back_populates="discount")
 
@@ -265,8 +311,9 @@ class Coupon(Base):
     __tablename__ = "coupons"
 
     code = Column(String, primary_key=True)
-    discount_id = Column(Integer, ForeignKey("discounts.id"))
-    usage_limit = Column(Integer, default=1)
+    discount_id = Column(Integer, ForeignKey("discounts.id"), index=True)
+    usage_limit = Column(Integer, default=1)  # NULL = unlimited
+    times_used = Column(Integer, default=0, nullable=False)
 
     discount = relationship("Discount", back_populates="coupons")
 
@@ -277,7 +324,7 @@ class PriceRule(Base):
     __tablename__ = "price_rules"
 
     id = Column(Integer, primary_key=True)
-    product_variant_id = Column(Integer, ForeignKey("product_variants.id"))
+    product_variant_id = Column(Integer, ForeignKey("product_variants.id"), index=True)
     customer_segment = Column(String, nullable=True)
     region = Column(String, nullable=True)
     price = Column(Float, nullable=False)
@@ -294,7 +341,61 @@ class TaxRule(Base):
     __tablename__ = "tax_rules"
 
     id = Column(Integer, primary_key=True)
-    region = Column(String, nullable=False)
+    region = Column(String, nullable=False, index=True)
     tax_percentage = Column(Float, nullable=False)
     active = Column(Boolean, default=True)
 
+
+# -------------------------
+# Bulk Import Jobs
+# -------------------------
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True)
+    filename = Column(String)
+    format = Column(String)  # csv | ndjson
+    status = Column(String, default="PENDING")  # PENDING, RUNNING, DONE, FAILED
+    rows_processed = Column(Integer, default=0)
+    rows_imported = Column(Integer, default=0)
+    rows_failed = Column(Integer, default=0)
+    errors = Column(Text, nullable=True)  # JSON list of {"row", "error"} (capped)
+    created_at = Column(DateTime, server_default=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+# -------------------------
+# Table Versions (ETags)
+# -------------------------
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+# -------------------------
+# Revoked Tokens (logout)
+# -------------------------
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    digest = Column(String, primary_key=True)  # SHA-256 of the bearer token
+    expires_at = Column(DateTime, nullable=True, index=True)  # the token's exp; row can go after that
+
+# -------------------------
+# Idempotency Keys
+# -------------------------
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("scope", "key", name="uq_idempotency_scope_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    scope = Column(String, nullable=False)  # endpoint, e.g. "cart.checkout"
+    key = Column(String, nullable=False)    # client's Idempotency-Key header
+    fingerprint = Column(String, nullable=False)  # SHA-256 of the request body
+    status = Column(String, default="IN_PROGRESS")  # IN_PROGRESS, DONE
+    status_code = Column(Integer, nullable=True)
+    response = Column(Text, nullable=True)  # JSON body replayed to retries
+    locked_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
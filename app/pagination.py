@@ -0,0 +1,78 @@
+import base64
+import json
+import os
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+
+# Keyset (cursor) pagination shared by the list endpoints. Pages are ordered by
+# a unique key column and the cursor is the last key seen, so every page is
+# one indexed range scan no matter how deep the client pages.
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 500))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Page:
+    """
+    Query parameters for a page: ?cursor=<X-Next-Cursor of previous page>&limit=N
+    """
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+def encode_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind=(int, str)):
+    """
+    The key a cursor carries. Anything but a `kind` value (a JSON object,
+    list, float, bool...) is rejected before it reaches a comparison.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Invalid cursor")
+    if isinstance(value, bool) or not isinstance(value, kind):
+        raise HTTPException(400, "Invalid cursor")
+    return value
+
+
+def fetch_page(query, key_column, page: Page, descending: bool = False) -> tuple[list, Optional[str]]:
+    """
+    Apply keyset pagination on `key_column` (must be unique, e.g. the primary
+    key). Returns (rows, next cursor or None).
+    """
+    if page.cursor:
+        last = decode_cursor(page.cursor, key_column.type.python_type)
+        query = query.filter(key_column < last if descending else key_column > last)
+
+    query = query.order_by(key_column.desc() if descending else key_column.asc())
+    rows = query.limit(page.limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        # rows may be entities or tuples; read the key off the mapped attribute
+        next_cursor = encode_cursor(getattr(rows[-1], key_column.key))
+    return rows, next_cursor
+
+
+def paginate(query, key_column, page: Page, response: Response, descending: bool = False) -> list:
+    """
+    fetch_page() that also sets the X-Next-Cursor header when more rows exist.
+    """
+    rows, next_cursor = fetch_page(query, key_column, page, descending)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
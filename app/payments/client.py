@@ -0,0 +1,183 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Shared HTTP plumbing for payment providers: one keep-alive requests.Session
+# per provider (connection pool sized for the dispatcher's workers), explicit
+# connect/read timeouts, a few quick retries with jittered backoff for
+# transient failures, and a circuit breaker so a provider outage fails fast
+# instead of tying up every worker on timeouts. Calls that are not safe to
+# repeat (idempotent=False, e.g. an M-Pesa STK push) are only retried when the
+# request provably never reached the provider.
+
+PAYMENT_CONNECT_TIMEOUT = float(os.getenv("PAYMENT_CONNECT_TIMEOUT", 3))
+PAYMENT_READ_TIMEOUT = float(os.getenv("PAYMENT_READ_TIMEOUT", 15))
+PAYMENT_HTTP_RETRIES = int(os.getenv("PAYMENT_HTTP_RETRIES", 2))
+PAYMENT_HTTP_BACKOFF = float(os.getenv("PAYMENT_HTTP_BACKOFF", 0.5))  # seconds, doubled per retry
+PAYMENT_POOL_SIZE = int(os.getenv("PAYMENT_POOL_SIZE", 10))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("PAYMENT_BREAKER_FAILURES", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("PAYMENT_BREAKER_RESET", 30))
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+NOT_PROCESSED_STATUS = {425, 429, 503}  # the provider turned the request away unprocessed
+
+
+class ProviderError(Exception):
+    """
+    A failed provider call. `retryable` is False when repeating the same
+    request cannot succeed (bad request, rejected payment, missing config).
+    """
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class OutcomeUnknownError(ProviderError):
+    """
+    A non-idempotent request may have reached the provider but no answer came
+    back (read timeout, dropped connection, gateway error). Sending it again
+    could repeat it, so the caller must reconcile instead.
+    """
+
+    def __init__(self, message: str):
+        super().__init__(message, retryable=False)
+
+
+class CircuitOpenError(ProviderError):
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} circuit open, retry in {retry_in:.0f}s", retryable=True)
+        self.retry_in = retry_in
+
+
+# ----------------------------
+# Circuit Breaker
+# ----------------------------
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures; after
+    `reset_seconds` a single trial call is let through (half-open) and its
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_seconds or self._trial_running:
+                raise CircuitOpenError(self.name, max(self.reset_seconds - elapsed, 0))
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+# ----------------------------
+# Provider Client
+# ----------------------------
+def _not_sent(exc: requests.RequestException) -> bool:
+    """
+    True when the connection was never established, so the provider cannot
+    have seen the request.
+    """
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], "reason", None) if exc.args else None
+    return isinstance(exc, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+class ProviderClient:
+    def __init__(self, name: str, base_url: str):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.breaker = CircuitBreaker(name)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=PAYMENT_POOL_SIZE, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, path: str, idempotent: bool = True, **kwargs) -> dict:
+        """
+        Send a request and return the decoded JSON body. Raises ProviderError
+        (or CircuitOpenError without touching the network). With
+        idempotent=False, a failure after the request may have been delivered
+        raises OutcomeUnknownError instead of being retried.
+        """
+        self.breaker.before_call()
+        kwargs.setdefault("timeout", (PAYMENT_CONNECT_TIMEOUT, PAYMENT_READ_TIMEOUT))
+        url = f"{self.base_url}{path}"
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+                if response.status_code in RETRYABLE_STATUS:
+                    if not idempotent and response.status_code not in NOT_PROCESSED_STATUS:
+                        self.breaker.record_failure()
+                        raise OutcomeUnknownError(f"{self.name} returned {response.status_code}")
+                    raise ProviderError(f"{self.name} returned {response.status_code}")
+                if response.status_code >= 400:
+                    # The provider understood and refused; not a health problem
+                    self.breaker.record_success()
+                    raise ProviderError(
+                        f"{self.name} rejected the request ({response.status_code}): {response.text[:200]}",
+                        retryable=False
+                    )
+                self.breaker.record_success()
+                try:
+                    return response.json()
+                except ValueError:
+                    raise ProviderError(f"{self.name} returned invalid JSON", retryable=False)
+            except requests.RequestException as exc:
+                message = f"{self.name} request failed: {exc.__class__.__name__}: {exc}"
+                if not idempotent and not _not_sent(exc):
+                    self.breaker.record_failure()
+                    raise OutcomeUnknownError(message)
+                error = ProviderError(message)
+            except ProviderError as exc:
+                if not exc.retryable:
+                    raise
+                error = exc
+
+            attempt += 1
+            if attempt > PAYMENT_HTTP_RETRIES:
+                self.breaker.record_failure()
+                raise error
+            time.sleep(PAYMENT_HTTP_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
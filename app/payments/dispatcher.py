@@ -0,0 +1,329 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, update
+
+from app.database import SessionLocal
+from app.models import Order, Payment
+from app.payments import mpesa, stripe
+from app.payments.client import CircuitOpenError, OutcomeUnknownError, ProviderError
+
+# Payment dispatch off the request path. Checkout only records the Payment as
+# PENDING and wakes the dispatcher; a background loop claims due payments
+# (a lease written with a conditional UPDATE, so several workers never send
+# the same payment), calls the provider from a small thread pool, and stores
+# the outcome. Transient failures are retried with exponential backoff up to
+# PAYMENT_MAX_ATTEMPTS; while a provider's circuit is open its payments are
+# simply rescheduled. PROCESSING means the provider accepted the request and
+# final confirmation is still to come; for providers with a status query
+# (M-Pesa STK push query) the loop polls it every PAYMENT_RECONCILE_DELAY
+# seconds until the payment settles. A non-idempotent call that may have
+# reached the provider without an answer is never resent: the payment is
+# marked UNKNOWN for manual reconciliation. Before such a call the payment is
+# committed as SENDING, so if the worker dies mid-call the expired lease
+# leads to UNKNOWN rather than to a second send.
+
+PAYMENT_WORKERS = int(os.getenv("PAYMENT_WORKERS", 4))
+PAYMENT_POLL_INTERVAL = float(os.getenv("PAYMENT_POLL_INTERVAL", 5))
+PAYMENT_BATCH = int(os.getenv("PAYMENT_BATCH", 50))
+PAYMENT_MAX_ATTEMPTS = int(os.getenv("PAYMENT_MAX_ATTEMPTS", 6))
+PAYMENT_RETRY_BASE = float(os.getenv("PAYMENT_RETRY_BASE", 5))    # seconds, doubled per attempt
+PAYMENT_RETRY_MAX = float(os.getenv("PAYMENT_RETRY_MAX", 600))
+PAYMENT_CLAIM_LEASE = int(os.getenv("PAYMENT_CLAIM_LEASE", 120))  # must exceed a call's worst-case duration
+PAYMENT_RECONCILE_DELAY = float(os.getenv("PAYMENT_RECONCILE_DELAY", 90))  # STK prompts expire after about a minute
+
+
+# -------------------------
+# Providers
+# -------------------------
+def _send_stripe(payment: dict) -> tuple[str, str | None]:
+    body = stripe.create_payment_intent(
+        payment["amount"],
+        payment["currency"] or "usd",
+        idempotency_key=f"payment-{payment['id']}",
+        metadata={"order_id": payment["order_id"], "payment_id": payment["id"]},
+    )
+    return ("SUCCESS" if body.get("status") == "succeeded" else "PROCESSING"), body.get("id")
+
+
+def _send_mpesa(payment: dict) -> tuple[str, str | None]:
+    if not payment["phone"]:
+        raise ProviderError("A phone number is required for M-Pesa", retryable=False)
+    body = mpesa.mpesa_stk_push(payment["phone"], payment["amount"], f"Order {payment['order_id']}")
+    return "PROCESSING", body.get("CheckoutRequestID")
+
+
+def _query_mpesa(payment: dict) -> tuple[str, str | None]:
+    body = mpesa.mpesa_stk_query(payment["reference"])
+    if body.get("ResultCode") is None:
+        raise ProviderError(f"STK push query returned no ResultCode: {body}")
+    if str(body["ResultCode"]) == "0":
+        return "SUCCESS", None
+    return "FAILED", str(body.get("ResultDesc") or body["ResultCode"])[:500]
+
+
+PROVIDERS = {
+    "STRIPE": (_send_stripe, stripe.client),
+    "MPESA": (_send_mpesa, mpesa.client),
+}
+
+# Sends without an idempotency key: at most once per payment
+AT_MOST_ONCE = {"MPESA"}
+
+# Status queries for PROCESSING payments: payment -> (final status, error)
+RECONCILERS = {
+    "MPESA": _query_mpesa,
+}
+
+
+# -------------------------
+# Dispatcher
+# -------------------------
+class PaymentDispatcher:
+    def __init__(self):
+        self._wake = threading.Event()
+        self._executor = None
+        self._lock = threading.Lock()
+        self.counters = {"sent": 0, "retried": 0, "failed": 0, "deferred": 0, "unknown": 0, "settled": 0}
+
+    def notify(self) -> None:
+        """
+        Wake the loop now instead of at the next poll (call after commit).
+        """
+        self._wake.set()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _backoff(self, attempts: int) -> float:
+        return min(PAYMENT_RETRY_BASE * 2 ** (attempts - 1), PAYMENT_RETRY_MAX)
+
+    # ---------- claim ----------
+    def _lease(self, db, *conditions) -> list[int]:
+        now = datetime.utcnow()
+        ids = [
+            row[0] for row in
+            db.query(Payment.id)
+            .filter(*conditions)
+            .order_by(Payment.id)
+            .limit(PAYMENT_BATCH)
+            .all()
+        ]
+        if not ids:
+            return []
+        claimed = [
+            row[0] for row in db.execute(
+                update(Payment)
+                .where(Payment.id.in_(ids), *conditions)
+                .values(next_attempt_at=now + timedelta(seconds=PAYMENT_CLAIM_LEASE))
+                .returning(Payment.id)
+                .execution_options(synchronize_session=False)
+            )
+        ]
+        db.commit()
+        return claimed
+
+    def claim(self, db) -> list[dict]:
+        """
+        Lease up to PAYMENT_BATCH due payments for this worker.
+        """
+        due = or_(Payment.next_attempt_at == None, Payment.next_attempt_at <= datetime.utcnow())
+        claimed = self._lease(db, Payment.status == "PENDING", due)
+        if not claimed:
+            return []
+        rows = (
+            db.query(
+                Payment.id, Payment.order_id, Payment.provider, Payment.amount,
+                Payment.phone, Payment.attempts, Order.currency
+            )
+            .join(Order, Order.id == Payment.order_id)
+            .filter(Payment.id.in_(claimed))
+            .all()
+        )
+        return [row._asdict() for row in rows]
+
+    def claim_processing(self, db) -> list[dict]:
+        """
+        Lease up to PAYMENT_BATCH PROCESSING payments whose status query is due.
+        """
+        claimed = self._lease(
+            db,
+            Payment.status == "PROCESSING",
+            func.upper(Payment.provider).in_(list(RECONCILERS)),
+            Payment.reference != None,
+            Payment.next_attempt_at <= datetime.utcnow(),
+        )
+        if not claimed:
+            return []
+        rows = (
+            db.query(Payment.id, Payment.provider, Payment.reference)
+            .filter(Payment.id.in_(claimed))
+            .all()
+        )
+        return [row._asdict() for row in rows]
+
+    def recover_stalled(self, db) -> list[int]:
+        """
+        SENDING payments whose lease ran out: the worker stopped during a
+        non-idempotent call that may have reached the provider. They go to
+        UNKNOWN for reconciliation, never back to PENDING.
+        """
+        stalled = [
+            row[0] for row in db.execute(
+                update(Payment)
+                .where(Payment.status == "SENDING", Payment.next_attempt_at <= datetime.utcnow())
+                .values(status="UNKNOWN", next_attempt_at=None,
+                        last_error="Worker stopped while sending; the provider may have received it")
+                .returning(Payment.id)
+                .execution_options(synchronize_session=False)
+            )
+        ]
+        db.commit()
+        for payment_id in stalled:
+            self._count("unknown")
+            print(f"⚠️ Payment {payment_id} outcome unknown, needs manual reconciliation: worker stopped while sending")
+        return stalled
+
+    # ---------- send ----------
+    def _record(self, payment_id: int, current: str = "PENDING", **values) -> bool:
+        db = SessionLocal()
+        try:
+            # Only while still `current`, so a settled payment is never overwritten
+            result = db.execute(
+                update(Payment)
+                .where(Payment.id == payment_id, Payment.status == current)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return result.rowcount > 0
+        finally:
+            db.close()
+
+    def process(self, payment: dict) -> None:
+        provider = PROVIDERS.get((payment["provider"] or "").upper())
+        attempts = (payment["attempts"] or 0) + 1
+        if provider is None:
+            self._count("failed")
+            self._record(payment["id"], status="FAILED", attempts=attempts,
+                         last_error=f"Unknown payment provider {payment['provider']!r}")
+            return
+
+        send, _ = provider
+        current = "PENDING"
+        if payment["provider"].upper() in AT_MOST_ONCE:
+            # Committed before the call; the lease from claim() still applies
+            if not self._record(payment["id"], status="SENDING"):
+                return
+            current = "SENDING"
+        try:
+            status, reference = send(payment)
+        except CircuitOpenError as exc:
+            # The provider was never called; not an attempt
+            self._count("deferred")
+            self._record(payment["id"], current, status="PENDING", last_error=str(exc),
+                         next_attempt_at=datetime.utcnow() + timedelta(seconds=max(exc.retry_in, 1)))
+            return
+        except OutcomeUnknownError as exc:
+            # The provider may have acted on it; resending could charge twice
+            self._count("unknown")
+            self._record(payment["id"], current, status="UNKNOWN", attempts=attempts, last_error=str(exc)[:500],
+                         next_attempt_at=None)
+            print(f"⚠️ Payment {payment['id']} outcome unknown, needs manual reconciliation: {exc}")
+            return
+        except Exception as exc:
+            retryable = getattr(exc, "retryable", True)
+            if retryable and attempts < PAYMENT_MAX_ATTEMPTS:
+                self._count("retried")
+                self._record(payment["id"], current, status="PENDING", attempts=attempts, last_error=str(exc)[:500],
+                             next_attempt_at=datetime.utcnow() + timedelta(seconds=self._backoff(attempts)))
+            else:
+                self._count("failed")
+                self._record(payment["id"], current, status="FAILED", attempts=attempts, last_error=str(exc)[:500],
+                             next_attempt_at=None)
+                print(f"⚠️ Payment {payment['id']} failed: {exc}")
+            return
+
+        self._count("sent")
+        next_attempt_at = None
+        if status == "PROCESSING" and reference and payment["provider"].upper() in RECONCILERS:
+            next_attempt_at = datetime.utcnow() + timedelta(seconds=PAYMENT_RECONCILE_DELAY)
+        self._record(payment["id"], current, status=status, reference=reference, attempts=attempts,
+                     last_error=None, next_attempt_at=next_attempt_at)
+
+    def reconcile(self, payment: dict) -> None:
+        """
+        Ask the provider how a PROCESSING payment ended; reschedule the query
+        while it cannot say.
+        """
+        query = RECONCILERS[payment["provider"].upper()]
+        try:
+            status, error = query(payment)
+        except Exception as exc:
+            retry_in = max(getattr(exc, "retry_in", 0), PAYMENT_RECONCILE_DELAY)
+            self._record(payment["id"], current="PROCESSING", last_error=str(exc)[:500],
+                         next_attempt_at=datetime.utcnow() + timedelta(seconds=retry_in))
+            return
+        self._count("settled")
+        self._record(payment["id"], current="PROCESSING", status=status, last_error=error,
+                     next_attempt_at=None)
+
+    # ---------- loop ----------
+    def _claim_with(self, claim) -> list[dict]:
+        # No session stays open while providers are called
+        db = SessionLocal()
+        try:
+            return claim(db)
+        finally:
+            db.close()
+
+    def _map(self, work, payments: list[dict]) -> None:
+        if self._executor is None:
+            for payment in payments:
+                work(payment)
+        else:
+            list(self._executor.map(work, payments))
+
+    def run_once(self) -> int:
+        """
+        Move stalled sends to UNKNOWN, claim and send one batch, then query
+        one batch of PROCESSING payments, waiting for both to finish.
+        Returns the number of payments handled.
+        """
+        stalled = self._claim_with(self.recover_stalled)
+        payments = self._claim_with(self.claim)
+        self._map(self.process, payments)
+        pending = self._claim_with(self.claim_processing)
+        self._map(self.reconcile, pending)
+        return len(stalled) + len(payments) + len(pending)
+
+    def _run_forever(self):
+        while True:
+            try:
+                processed = self.run_once()
+            except Exception as exc:
+                print(f"⚠️ Payment dispatch failed: {exc}")
+                processed = 0
+            if processed < PAYMENT_BATCH:
+                self._wake.wait(PAYMENT_POLL_INTERVAL)
+                self._wake.clear()
+
+    def start(self) -> threading.Thread:
+        self._executor = ThreadPoolExecutor(max_workers=PAYMENT_WORKERS, thread_name_prefix="payment")
+        thread = threading.Thread(target=self._run_forever, name="payment-dispatcher", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "breakers": {name: client.breaker.stats() for name, (_, client) in PROVIDERS.items()},
+        }
+
+
+payment_dispatcher = PaymentDispatcher()
@@ -1,4 +1,98 @@
-import requests, base64, os, datetime
+import base64
+import datetime
+import os
+import threading
+import time
+from zoneinfo import ZoneInfo
 
-def mpesa_stk_push(phone, amount):
-    return {"message": "STK Push sent (sandbox demo)"}
+from app.payments.client import ProviderClient, ProviderError
+
+# M-Pesa (Daraja) STK push over the shared keep-alive client. MPESA_API_BASE
+# can point at a local stub server in tests.
+MPESA_API_BASE = os.getenv("MPESA_API_BASE", "https://sandbox.safaricom.co.ke")
+MPESA_CONSUMER_KEY = os.getenv("MPESA_CONSUMER_KEY")
+MPESA_CONSUMER_SECRET = os.getenv("MPESA_CONSUMER_SECRET")
+MPESA_SHORTCODE = os.getenv("MPESA_SHORTCODE")
+MPESA_PASSKEY = os.getenv("MPESA_PASSKEY")
+MPESA_CALLBACK_URL = os.getenv("MPESA_CALLBACK_URL")
+
+# Daraja checks the password timestamp against Kenyan time, whatever the
+# server's local zone
+NAIROBI = ZoneInfo("Africa/Nairobi")
+
+client = ProviderClient("MPESA", MPESA_API_BASE)
+
+_token = {"value": None, "expires": 0.0}
+_token_lock = threading.Lock()
+
+def access_token() -> str:
+    """
+    OAuth token, reused until shortly before it expires. The lock only
+    guards the cached value; the HTTP call runs outside it, so a slow token
+    endpoint never blocks callers that hold a valid token.
+    """
+    with _token_lock:
+        if _token["value"] and _token["expires"] > time.monotonic():
+            return _token["value"]
+    if not (MPESA_CONSUMER_KEY and MPESA_CONSUMER_SECRET):
+        raise ProviderError("M-Pesa consumer key/secret are not configured", retryable=False)
+    body = client.request(
+        "GET", "/oauth/v1/generate",
+        params={"grant_type": "client_credentials"},
+        auth=(MPESA_CONSUMER_KEY, MPESA_CONSUMER_SECRET)
+    )
+    with _token_lock:
+        _token["value"] = body["access_token"]
+        _token["expires"] = time.monotonic() + int(body.get("expires_in", 3599)) - 60
+        return _token["value"]
+
+def _password() -> tuple[str, str]:
+    timestamp = datetime.datetime.now(NAIROBI).strftime("%Y%m%d%H%M%S")
+    password = base64.b64encode(f"{MPESA_SHORTCODE}{MPESA_PASSKEY}{timestamp}".encode()).decode()
+    return password, timestamp
+
+def mpesa_stk_push(phone, amount, account_reference="Order"):
+    """
+    Prompt the customer's phone to approve the payment; returns Daraja's JSON
+    (CheckoutRequestID identifies the request in the callback and in
+    mpesa_stk_query). A push cannot be safely repeated, so it is only retried
+    when it never left; otherwise OutcomeUnknownError is raised.
+    """
+    password, timestamp = _password()
+    body = client.request(
+        "POST", "/mpesa/stkpush/v1/processrequest",
+        idempotent=False,
+        headers={"Authorization": f"Bearer {access_token()}"},
+        json={
+            "BusinessShortCode": MPESA_SHORTCODE,
+            "Password": password,
+            "Timestamp": timestamp,
+            "TransactionType": "CustomerPayBillOnline",
+            "Amount": int(round(amount)),
+            "PartyA": phone,
+            "PartyB": MPESA_SHORTCODE,
+            "PhoneNumber": phone,
+            "CallBackURL": MPESA_CALLBACK_URL,
+            "AccountReference": account_reference,
+            "TransactionDesc": f"Payment for {account_reference}",
+        }
+    )
+    if str(body.get("ResponseCode")) != "0":
+        raise ProviderError(f"STK push rejected: {body.get('ResponseDescription') or body}", retryable=False)
+    return body
+
+def mpesa_stk_query(checkout_request_id):
+    """
+    Outcome of an earlier STK push; ResultCode "0" means the customer paid.
+    """
+    password, timestamp = _password()
+    return client.request(
+        "POST", "/mpesa/stkpushquery/v1/query",
+        headers={"Authorization": f"Bearer {access_token()}"},
+        json={
+            "BusinessShortCode": MPESA_SHORTCODE,
+            "Password": password,
+            "Timestamp": timestamp,
+            "CheckoutRequestID": checkout_request_id,
+        }
+    )
@@ -1,8 +1,25 @@
-import stripe, os
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-
-def create_payment_intent(amount):
-    return stripe.PaymentIntent.create(
-        amount=int(amount * 100),
-        currency="usd"
-    )
+import os
+
+from app.payments.client import ProviderClient, ProviderError
+
+# Stripe PaymentIntents over the shared keep-alive client. STRIPE_API_BASE can
+# point at a local stub server in tests.
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+
+client = ProviderClient("STRIPE", STRIPE_API_BASE)
+
+def create_payment_intent(amount, currency="usd", idempotency_key=None, metadata=None):
+    """
+    Create a PaymentIntent; returns Stripe's JSON object. The idempotency key
+    makes retried calls return the same intent instead of a second one.
+    """
+    if not STRIPE_SECRET_KEY:
+        raise ProviderError("STRIPE_SECRET_KEY is not configured", retryable=False)
+    data = {"amount": int(round(amount * 100)), "currency": currency.lower()}
+    for key, value in (metadata or {}).items():
+        data[f"metadata[{key}]"] = value
+    headers = {"Authorization": f"Bearer {STRIPE_SECRET_KEY}"}
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    return client.request("POST", "/v1/payment_intents", data=data, headers=headers)
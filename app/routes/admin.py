@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.database import get_db, pool_status
+from app.deps import admin_only, token_cache
+from app.payments.dispatcher import payment_dispatcher
+from app.services import cart as cart_service, cart_sweeper
+from app.services.catalog_cache import product_cache
+from app.services.facets import facet_index
+from app.services.search import product_search
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+# -------------------------
+# Database Pool
+# -------------------------
+@router.get("/db/pool")
+def db_pool_stats(user=Depends(admin_only)):
+    """
+    Live connection pool statistics for the worker serving this request.
+    """
+    return pool_status()
+
+# -------------------------
+# Auth
+# -------------------------
+@router.get("/auth/token-cache")
+def token_cache_stats(user=Depends(admin_only)):
+    """
+    Hit rate and size of this worker's verified-token cache.
+    """
+    return token_cache.stats()
+
+# -------------------------
+# Catalog Cache
+# -------------------------
+@router.get("/catalog-cache")
+def catalog_cache_stats(user=Depends(admin_only)):
+    return product_cache.stats()
+
+@router.delete("/catalog-cache")
+def clear_catalog_cache(user=Depends(admin_only)):
+    product_cache.clear()
+    return {"message": "Catalog cache cleared"}
+
+@router.get("/search-index")
+def search_index_status(user=Depends(admin_only)):
+    return product_search.status()
+
+@router.post("/search-index/rebuild")
+def rebuild_search_index(user=Depends(admin_only)):
+    product_search.rebuild()
+    return product_search.status()
+
+@router.get("/facet-index")
+def facet_index_status(user=Depends(admin_only)):
+    return facet_index.stats()
+
+# -------------------------
+# Carts
+# -------------------------
+@router.get("/carts/totals")
+def open_cart_totals(user=Depends(admin_only), db: Session = Depends(get_db)):
+    """
+    Re-price every open cart at current prices and discounts (pre tax/shipping).
+    """
+    return cart_service.open_cart_totals(db)
+
+@router.get("/carts/sweeper")
+def cart_sweeper_status(user=Depends(admin_only)):
+    """
+    Report from this worker's last abandoned-cart sweep.
+    """
+    return cart_sweeper.last_run or {"message": "No sweep has run yet"}
+
+@router.post("/carts/sweep")
+def run_cart_sweep(user=Depends(admin_only), db: Session = Depends(get_db)):
+    return cart_sweeper.sweep(db)
+
+# -------------------------
+# Payments
+# -------------------------
+@router.get("/payments/dispatcher")
+def payment_dispatcher_status(user=Depends(admin_only)):
+    """
+    This worker's dispatch counters and per-provider circuit breaker state.
+    """
+    return payment_dispatcher.stats()
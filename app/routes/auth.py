@@ -3,19 +3,13 @@ from sqlalchemy.orm import Session
 
 from app.schemas.user import UserCreate, UserLogin
 
-from ..database import SessionLocal
+from ..database import get_db
 from ..models import User
-from ..auth import hash_password, create_token
+from ..auth import hash_password, verify_and_update, run_in_password_pool, create_token
+from ..deps import bearer_token, get_current_user, revoke_token
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/register")
 def register(user: UserCreate, db: Session = Depends(get_db)):
     # Optional: validate role
@@ -24,7 +18,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 
     db_user = User(
         email=user.email,
-        password=hash_password(user.password),
+        password=run_in_password_pool(hash_password, user.password),
         role=user.role
     )
     db.add(db_user)
@@ -40,12 +34,30 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 @router.post("/login")
 def login(user: UserLogin, db: Session = Depends(get_db)):
     db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user:
+    if not db_user or not db_user.password:
+        raise HTTPException(401, "Invalid credentials")
+
+    valid, new_hash = run_in_password_pool(verify_and_update, user.password, db_user.password)
+    if not valid:
         raise HTTPException(401, "Invalid credentials")
+    if new_hash:
+        # Stored hash used old Argon2 parameters
+        db_user.password = new_hash
+        db.commit()
 
-    # Include role in token
-    token_data = {"sub": db_user.email, "role": db_user.role}
+    # Include role and user id in token
+    token_data = {"sub": db_user.email, "role": db_user.role, "uid": db_user.id}
     token = create_token(token_data)
 
     return {"access_token": token}
 
+
+@router.post("/logout")
+def logout(
+    token: str = Depends(bearer_token),
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Shared with the other workers through revoked_tokens until the token expires
+    revoke_token(db, token, user.get("exp"))
+    return {"message": "Logged out"}
@@ -0,0 +1,59 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import SessionLocal, get_async_db
+from app.schemas.cart import CartItemCreate, CartResponse, CheckoutRequest, OrderResponse
+from app.services import cart as cart_service, idempotency
+
+# Async twin of app.routes.cart, mounted instead of it when DB_ASYNC=true.
+# Handlers run on the event loop; the shared cart logic executes through
+# AsyncSession.run_sync so every round-trip goes over the async driver
+# without occupying a threadpool slot. run_sync code still runs on the event
+# loop, so checkout first refreshes the in-memory indexes it reads (full
+# reloads behind threading locks) in a worker thread over a sync session.
+router = APIRouter(prefix="/cart", tags=["Cart & Checkout"])
+
+
+def _warm_checkout_indexes() -> None:
+    db = SessionLocal()
+    try:
+        cart_service.warm_indexes(db)
+    finally:
+        db.close()
+
+
+@router.post("/items", response_model=CartResponse)
+async def add_to_cart(
+    payload: CartItemCreate,
+    cart_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await db.run_sync(cart_service.add_to_cart, payload, cart_id)
+
+
+@router.post("/checkout", response_model=OrderResponse)
+async def checkout(
+    payload: CheckoutRequest,
+    idempotency_key: Optional[str] = Header(None, alias=idempotency.IDEMPOTENCY_HEADER),
+    db: AsyncSession = Depends(get_async_db)
+):
+    await run_in_threadpool(_warm_checkout_indexes)
+    return await idempotency.run_async(
+        db, "cart.checkout", idempotency_key, payload, lambda: db.run_sync(cart_service.checkout, payload)
+    )
+
+@router.get("/items", response_model=CartResponse)
+async def get_cart_items(cart_id: Optional[int] = Query(None), db: AsyncSession = Depends(get_async_db)):
+    """
+    Fetch all items in a cart by cart_id with full product details.
+    """
+    return await db.run_sync(cart_service.get_cart_items, cart_id)
+
+@router.delete("/items", response_model=CartResponse)
+async def clear_cart(cart_id: Optional[int] = Query(None), db: AsyncSession = Depends(get_async_db)):
+    """
+    Clear all items from a cart.
+    """
+    return await db.run_sync(cart_service.clear_cart, cart_id)
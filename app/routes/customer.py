@@ -1,22 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import get_db
 from app.models import User, Address, Order
 from app.schemas.customer import UserCreate, UserOut, AddressCreate, AddressOut
 from app.deps import admin_only
+from app.pagination import Page, paginate
 
 router = APIRouter(prefix="/customers", tags=["Customer Management"])
 
-# -------------------------
-# DB Dependency
-# -------------------------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # -------------------------
 # Customer Registration
 # -------------------------
@@ -54,8 +46,19 @@ def create_guest(db: Session = Depends(get_db)):
 # List Customers / Profiles
 # -------------------------
 @router.get("/", response_model=list[UserOut])
-def list_customers(db: Session = Depends(get_db)):
-    return db.query(User).all()
+def list_customers(
+    response: Response,
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    page: Page = Depends(),
+    db: Session = Depends(get_db)
+):
+    query = db.query(User)
+    if role:
+        query = query.filter(User.role == role)
+    if is_active is not None:
+        query = query.filter(User.is_active == is_active)
+    return paginate(query, User.id, page, response)
 
 # -------------------------
 # Customer Address Management
@@ -1,20 +1,16 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.orm import Session,joinedload
-from app.database import SessionLocal
+from app.database import get_db
 from app.models import Inventory, ProductVariant
 from app.schemas.inventory import InventoryAdjust, InventoryOut
 from app.deps import admin_only
-from typing import List
+from app.pagination import Page, paginate
+from app.services.allocation import availability
+from app.services.facets import facet_index
+from typing import List, Optional
 
 router = APIRouter(prefix="/inventory", tags=["Inventory"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/adjust", response_model=InventoryOut)
 def adjust_inventory(data: InventoryAdjust, db: Session = Depends(get_db)):
     inv = db.query(Inventory).filter_by(
@@ -32,10 +28,8 @@ def adjust_inventory(data: InventoryAdjust, db: Session = Depends(get_db)):
 
     db.commit()
     db.refresh(inv)
-
-    # Low-stock alert
-    if inv.quantity <= inv.reorder_level:
-        print(f"⚠️ Low stock alert for variant {inv.product_variant_id} in warehouse {inv.warehouse_id}")
+    availability.set(inv.product_variant_id, inv.warehouse_id, inv.quantity)
+    facet_index.add_stock(inv.product_variant_id, data.quantity)
 
     # Manually return a dict with the extra fields
     return {
@@ -51,16 +45,25 @@ def adjust_inventory(data: InventoryAdjust, db: Session = Depends(get_db)):
 
 # ----------------- List Inventory -----------------
 @router.get("/", response_model=List[InventoryOut])
-def inventory_list(db: Session = Depends(get_db)):
+def inventory_list(
+    response: Response,
+    warehouse_id: Optional[int] = None,
+    product_variant_id: Optional[int] = None,
+    low_stock: bool = False,
+    page: Page = Depends(),
+    db: Session = Depends(get_db)
+):
     """
     Fetch all inventory rows where:
     - The inventory has a product variant
     - The product variant has a linked product
     - The inventory has a warehouse
+    Optionally narrowed to one warehouse / variant, or to rows at or below
+    their reorder level.
     """
     
     # Query inventory with joins
-    inventory_rows = (
+    query = (
         db.query(Inventory)
         .join(Inventory.product_variant)  # inner join → only rows with variant
         .join(ProductVariant.product)      # inner join → only rows with product
@@ -69,8 +72,14 @@ def inventory_list(db: Session = Depends(get_db)):
             joinedload(Inventory.product_variant).joinedload(ProductVariant.product),
             joinedload(Inventory.warehouse)
         )
-        .all()
     )
+    if warehouse_id is not None:
+        query = query.filter(Inventory.warehouse_id == warehouse_id)
+    if product_variant_id is not None:
+        query = query.filter(Inventory.product_variant_id == product_variant_id)
+    if low_stock:
+        query = query.filter(Inventory.quantity <= Inventory.reorder_level)
+    inventory_rows = paginate(query, Inventory.id, page, response)
 
     # Build response
     result = [
@@ -1,32 +1,113 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app.models import Order, OrderItem, Payment
-from app.deps import get_current_user
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.database import get_db
+from app.models import Order, OrderItem, User
+from app.deps import admin_only, get_current_user
+from app.pagination import Page, paginate
+from app.schemas.order import OrderOut
+from app.services import idempotency
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
-def get_db():
-    db = SessionLocal()
-    try: yield db
-    finally: db.close()
+def current_user_id(db: Session, user: dict) -> int:
+    """
+    Id of the authenticated user. Tokens issued before the `uid` claim
+    existed only carry the email, so fall back to a lookup.
+    """
+    if user.get("uid") is not None:
+        return user["uid"]
+    user_id = db.query(User.id).filter(User.email == user.get("sub")).scalar()
+    if user_id is None:
+        raise HTTPException(401, "User not found")
+    return user_id
 
 @router.post("/")
-def create_order(data: dict, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    order = Order(user_id=user.id, source="ONLINE")
-    db.add(order)
-    db.flush()
-
-    total = 0
-    for item in data["items"]:
-        oi = OrderItem(order_id=order.id, **item)
-        total += oi.price * oi.quantity
-        db.add(oi)
-
-    order.total = total
-    db.commit()
-    return {"order_id": order.id, "total": total}
-
-@router.get("/")
-def list_orders(db: Session = Depends(get_db)):
-    return db.query(Order).all()
+def create_order(
+    data: dict,
+    idempotency_key: Optional[str] = Header(None, alias=idempotency.IDEMPOTENCY_HEADER),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    user_id = current_user_id(db, user)
+
+    def place():
+        order = Order(user_id=user_id, source="ONLINE")
+        db.add(order)
+        db.flush()
+
+        total = 0
+        for item in data["items"]:
+            oi = OrderItem(order_id=order.id, **item)
+            total += oi.price * oi.quantity
+            db.add(oi)
+
+        order.total = total
+        result = {"order_id": order.id, "total": total}
+        idempotency.record(db, result)  # commits with the order
+        db.commit()
+        return result
+
+    # Keys are per customer, so two users' keys never collide
+    return idempotency.run(db, f"orders.create:{user_id}", idempotency_key, data, place)
+
+# ----------------- Order History -----------------
+def order_history_query(
+    db: Session,
+    user_id: Optional[int] = None,
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    """
+    Orders with items, payment, shipments and address loaded in a fixed four
+    queries per page (orders + payment joined, then one IN query each for
+    items, shipments and address), however many orders the page holds.
+    """
+    query = db.query(Order).options(
+        joinedload(Order.payment),
+        selectinload(Order.items),
+        selectinload(Order.shipments),
+        selectinload(Order.shipping_address),
+    )
+    if user_id is not None:
+        query = query.filter(Order.user_id == user_id)
+    if status:
+        query = query.filter(Order.status == status)
+    if created_from:
+        query = query.filter(Order.created_at >= created_from)
+    if created_to:
+        query = query.filter(Order.created_at < created_to)
+    return query
+
+@router.get("/me", response_model=List[OrderOut])
+def my_orders(
+    response: Response,
+    status: Optional[str] = None,
+    page: Page = Depends(),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    """
+    The caller's orders, newest first.
+    """
+    query = order_history_query(db, current_user_id(db, user), status)
+    return paginate(query, Order.id, page, response, descending=True)
+
+@router.get("/", response_model=List[OrderOut])
+def list_orders(
+    response: Response,
+    user_id: Optional[int] = None,
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    page: Page = Depends(),
+    db: Session = Depends(get_db),
+    user=Depends(admin_only)
+):
+    """
+    Newest orders first, optionally for one customer.
+    """
+    query = order_history_query(db, user_id, status, created_from, created_to)
+    return paginate(query, Order.id, page, response, descending=True)
@@ -1,18 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app.models import Discount, Coupon, PriceRule, TaxRule
-from app.schemas.pricing import CouponCreate, DiscountCreate, PriceRuleCreate, TaxRuleCreate
+from app.database import get_db
+from app.models import CartItem, Discount, Coupon, PriceRule, ProductVariant, ShippingRate, TaxRule
+from app.schemas.pricing import CouponCreate, CouponValidate, DiscountCreate, PriceRuleCreate, TaxRuleCreate, QuoteRequest, QuoteResponse, ShippingRateCreate
+from app.services import coupons, rates, totals
+from app.services.pricing import price_index, quote_lines
+from app.services.rates import shipping_rates, tax_rates
+from app.services.versions import not_modified
+from app.pagination import Page, paginate
 
 router = APIRouter(prefix="/pricing", tags=["Pricing & Promotions"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # -------------------------
 # Discounts
 # -------------------------
@@ -22,11 +21,27 @@ def create_discount(data: DiscountCreate, db: Session = Depends(get_db)):
     db.add(discount)
     db.commit()
     db.refresh(discount)
+    coupons.invalidate()
     return discount
 
 @router.get("/discounts")
-def list_discounts(db: Session = Depends(get_db)):
-    return db.query(Discount).all()
+def list_discounts(
+    request: Request,
+    response: Response,
+    active: Optional[bool] = None,
+    type: Optional[str] = None,
+    page: Page = Depends(),
+    db: Session = Depends(get_db)
+):
+    cached = not_modified(request, response, "discounts")
+    if cached:
+        return cached
+    query = db.query(Discount)
+    if active is not None:
+        query = query.filter(Discount.active == active)
+    if type:
+        query = query.filter(Discount.type == type)
+    return paginate(query, Discount.id, page, response)
 
 # -------------------------
 # Coupons
@@ -37,11 +52,37 @@ def create_coupon(data: CouponCreate, db: Session = Depends(get_db)):
     db.add(coupon)
     db.commit()
     db.refresh(coupon)
+    coupons.invalidate()  # drop a cached "not found" for this code
     return coupon
 
+@router.post("/coupons/validate")
+def validate_coupon(data: CouponValidate, db: Session = Depends(get_db)):
+    """
+    "Apply coupon" check, served from a short-lived cache. Usage is only
+    counted when the order is placed.
+    """
+    snapshot = coupons.validate(db, data.code, data.customer_segment)
+    result = {
+        "code": snapshot["code"],
+        "type": snapshot["type"],
+        "value": snapshot["value"],
+        "valid": True,
+    }
+    if data.subtotal is not None:
+        result["discount"] = coupons.discount_amount(snapshot["type"], snapshot["value"], data.subtotal)
+    return result
+
 @router.get("/coupons")
-def list_coupons(db: Session = Depends(get_db)):
-    return db.query(Coupon).all()
+def list_coupons(
+    response: Response,
+    discount_id: Optional[int] = None,
+    page: Page = Depends(),
+    db: Session = Depends(get_db)
+):
+    query = db.query(Coupon)
+    if discount_id is not None:
+        query = query.filter(Coupon.discount_id == discount_id)
+    return paginate(query, Coupon.code, page, response)
 
 # -------------------------
 # Price Rules
@@ -52,11 +93,29 @@ def create_price_rule(data: PriceRuleCreate, db: Session = Depends(get_db)):
     db.add(rule)
     db.commit()
     db.refresh(rule)
+    price_index.add(rule)
     return rule
 
 @router.get("/price-rules")
-def list_price_rules(db: Session = Depends(get_db)):
-    return db.query(PriceRule).all()
+def list_price_rules(
+    response: Response,
+    product_variant_id: Optional[int] = None,
+    customer_segment: Optional[str] = None,
+    region: Optional[str] = None,
+    active: Optional[bool] = None,
+    page: Page = Depends(),
+    db: Session = Depends(get_db)
+):
+    query = db.query(PriceRule)
+    if product_variant_id is not None:
+        query = query.filter(PriceRule.product_variant_id == product_variant_id)
+    if customer_segment:
+        query = query.filter(PriceRule.customer_segment == customer_segment)
+    if region:
+        query = query.filter(PriceRule.region == region)
+    if active is not None:
+        query = query.filter(PriceRule.active == active)
+    return paginate(query, PriceRule.id, page, response)
 
 # -------------------------
 # Tax Rules
@@ -67,8 +126,93 @@ def create_tax_rule(data: TaxRuleCreate, db: Session = Depends(get_db)):
     db.add(rule)
     db.commit()
     db.refresh(rule)
+    tax_rates.load(db)
     return rule
 
 @router.get("/tax-rules")
-def list_tax_rules(db: Session = Depends(get_db)):
-    return db.query(TaxRule).all()
+def list_tax_rules(
+    request: Request,
+    response: Response,
+    region: Optional[str] = None,
+    active: Optional[bool] = None,
+    page: Page = Depends(),
+    db: Session = Depends(get_db)
+):
+    cached = not_modified(request, response, "tax_rules")
+    if cached:
+        return cached
+    query = db.query(TaxRule)
+    if region:
+        query = query.filter(TaxRule.region == region)
+    if active is not None:
+        query = query.filter(TaxRule.active == active)
+    return paginate(query, TaxRule.id, page, response)
+
+# -------------------------
+# Shipping Rates
+# -------------------------
+@router.post("/shipping-rates")
+def create_shipping_rate(data: ShippingRateCreate, db: Session = Depends(get_db)):
+    rate = ShippingRate(**data.dict())
+    db.add(rate)
+    db.commit()
+    db.refresh(rate)
+    shipping_rates.load(db)
+    return rate
+
+@router.get("/shipping-rates")
+def list_shipping_rates(
+    response: Response,
+    country: Optional[str] = None,
+    page: Page = Depends(),
+    db: Session = Depends(get_db)
+):
+    query = db.query(ShippingRate)
+    if country:
+        query = query.filter(ShippingRate.country == country)
+    return paginate(query, ShippingRate.id, page, response)
+
+# -------------------------
+# Price Quotes
+# -------------------------
+@router.post("/quote", response_model=QuoteResponse)
+def quote(data: QuoteRequest, db: Session = Depends(get_db)):
+    """
+    Effective prices for a batch of variants (or a whole cart) for one
+    customer segment / region at one point in time.
+    """
+    lines = {}
+    if data.cart_id:
+        rows = db.query(CartItem.product_variant_id, CartItem.quantity).filter(CartItem.cart_id == data.cart_id)
+        for variant_id, quantity in rows:
+            lines[variant_id] = lines.get(variant_id, 0) + quantity
+    for item in data.items:
+        lines[item.product_variant_id] = lines.get(item.product_variant_id, 0) + item.quantity
+    if not lines:
+        raise HTTPException(400, "Nothing to quote")
+
+    quoted = quote_lines(db, lines, data.customer_segment, data.region, data.at)
+    priced = [line for line in quoted if line.get("unit_price") is not None]
+
+    rates.ensure_loaded(db)
+    weights = dict(
+        db.query(ProductVariant.id, ProductVariant.weight)
+        .filter(ProductVariant.id.in_(list(lines)))
+        .all()
+    )
+    weight = sum((weights.get(vid) or 0) * qty for vid, qty in lines.items())
+    sums = totals.basket_totals(
+        [line["unit_price"] for line in priced],
+        [line["quantity"] for line in priced],
+        coupons.automatic_discounts(db, data.customer_segment),
+        tax_rates.percentage(data.region),
+        shipping_rates.cost(data.region, weight) or 0
+    )
+    return {
+        "lines": quoted,
+        "subtotal": sums["subtotal"],
+        "discount": sums["discount"],
+        "tax": sums["tax"],
+        "shipping": sums["shipping"],
+        "total": sums["total"],
+    }
@@ -1,28 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app.models import Product, ProductVariant, Category, Inventory, Warehouse
+from bisect import bisect_right
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, selectinload
+from app.database import get_db
+from app.models import Product, ProductVariant, Category, ImportJob
 from app.deps import admin_only
+from app.pagination import NEXT_CURSOR_HEADER, Page, decode_cursor, encode_cursor, fetch_page
+from app.services import catalog_export, categories, product_import
+from app.services.catalog_cache import product_cache, product_key, list_key, invalidate_product
+from app.services.facets import facet_index
+from app.services.inventory import fan_out_variants
+from app.services.search import product_search
+from app.services.versions import not_modified, not_modified_as
 from app.schemas.product import ProductCreate, ProductOut, ProductVariantCreate
-import csv, io
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
-# ----------------- DB -----------------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # ----------------- Products -----------------
+def serialize_product(product: Product) -> dict:
+    """
+    JSON-ready ProductOut payload, as stored in the catalog cache.
+    """
+    return ProductOut.model_validate(product).model_dump(mode="json")
+
 @router.post("/", response_model=ProductOut)
 def create_product(data: ProductCreate, db: Session = Depends(get_db)):
     product = Product(**data.dict())
     db.add(product)
     db.commit()
     db.refresh(product)
+    invalidate_product(product.id)
+    product_search.reindex(db, [product.id])
+    facet_index.refresh_products(db, [product.id])
     return product
 
 @router.put("/{product_id}", response_model=ProductOut)
@@ -34,6 +44,9 @@ def update_product(product_id: int, data: ProductCreate, db: Session = Depends(g
         setattr(product, key, value)
     db.commit()
     db.refresh(product)
+    invalidate_product(product_id)
+    product_search.reindex(db, [product_id])
+    facet_index.refresh_products(db, [product_id])
     return product
 
 @router.delete("/{product_id}")
@@ -43,44 +56,100 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
         return {"error": "Product not found"}
     db.delete(product)
     db.commit()
+    invalidate_product(product_id)
+    product_search.reindex(db, [product_id])
+    facet_index.refresh_products(db, [product_id])
     return {"message": "Product deleted"}
 
 @router.get("/", response_model=list[ProductOut])
-def list_products(db: Session = Depends(get_db)):
-    return db.query(Product).all()
+def list_products(
+    request: Request,
+    response: Response,
+    is_active: Optional[bool] = None,
+    product_type: Optional[str] = None,
+    page: Page = Depends(),
+    db: Session = Depends(get_db)
+):
+    def load():
+        query = db.query(Product).options(selectinload(Product.variants))
+        if is_active is not None:
+            query = query.filter(Product.is_active == is_active)
+        if product_type:
+            query = query.filter(Product.product_type == product_type)
+        rows, next_cursor = fetch_page(query, Product.id, page)
+        return [serialize_product(p) for p in rows], next_cursor
 
-@router.get("/{product_id}", response_model=ProductOut)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.get(Product, product_id)
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    cached = not_modified(request, response, "products", "product_variants")
+    if cached:
+        return cached
+    items, next_cursor = product_cache.get_or_load(
+        list_key(is_active, product_type, page.cursor, page.limit), load
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
+
+# ----------------- Search -----------------
+@router.get("/search")
+def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    prefix: bool = True
+):
+    """
+    Full-text search over name, description and variant sku/color/size.
+    The last word is matched as a prefix, for typeahead.
+    """
+    if not product_search.ready:
+        raise HTTPException(status_code=503, detail="Search index is still building")
+    return product_search.index.search(q, limit, prefix)
+
+# ----------------- Faceted Browse -----------------
+@router.get("/browse")
+def browse_products(
+    response: Response,
+    category_id: Optional[int] = None,
+    size: list[str] = Query([]),
+    color: list[str] = Query([]),
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: bool = False,
+    page: Page = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    Active products having a variant that matches every filter (size/color
+    may repeat), plus variant counts per facet for the same filters.
+    """
+    product_ids, facets = facet_index.browse(db, category_id, size, color, min_price, max_price, in_stock)
+
+    start = bisect_right(product_ids, decode_cursor(page.cursor, int)) if page.cursor else 0
+    page_ids = product_ids[start:start + page.limit]
+    if start + page.limit < len(product_ids):
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page_ids[-1])
+
+    rows = (
+        db.query(Product)
+        .options(selectinload(Product.variants))
+        .filter(Product.id.in_(page_ids))
+        .order_by(Product.id)
+        .all()
+    ) if page_ids else []
+    return {"total": len(product_ids), "items": [serialize_product(p) for p in rows], "facets": facets}
 
 # ----------------- Product Variants -----------------
 @router.post("/{product_id}/variants", response_model=dict)
 def create_variant(product_id: int, data: ProductVariantCreate, db: Session = Depends(get_db)):
     variant = ProductVariant(product_id=product_id, **data.dict())
     db.add(variant)
-    db.commit()
-    db.refresh(variant)
-
-    print("Variant created:", variant.id)
-
-    warehouses = db.query(Warehouse).all()
-    print("Warehouses found:", len(warehouses))
-
-    for wh in warehouses:
-        inv = Inventory(
-            product_variant_id=variant.id,
-            warehouse_id=wh.id,
-            quantity=0,
-            reorder_level=0
-        )
-        db.add(inv)
-        print(f"Inventory staged for variant {variant.id} in warehouse {wh.id}")
+    db.flush()  # variant.id available
 
+    # One INSERT ... SELECT for variant x all warehouses, same transaction
+    fan_out_variants(db, [variant.id])
     db.commit()
-    print("Inventory committed")
+    invalidate_product(product_id)
+    product_search.reindex(db, [product_id])
+    facet_index.refresh_products(db, [product_id])
 
     return {"id": variant.id}
 
@@ -89,32 +158,109 @@ def create_variant(product_id: int, data: ProductVariantCreate, db: Session = De
 # ----------------- Categories -----------------
 @router.post("/categories")
 def create_category(name: str, parent_id: int | None = None, db: Session = Depends(get_db)):
-    cat = Category(name=name, parent_id=parent_id)
-    db.add(cat)
-    db.commit()
-    db.refresh(cat)
-    return cat
+    return categories.create_category(db, name, parent_id)
 
 @router.get("/categories")
-def list_categories(db: Session = Depends(get_db)):
+def list_categories(request: Request, response: Response, db: Session = Depends(get_db)):
+    cached = not_modified(request, response, "categories")
+    if cached:
+        return cached
     return db.query(Category).all()
 
+@router.get("/categories/tree")
+def category_tree(request: Request, response: Response, db: Session = Depends(get_db)):
+    cached = not_modified(request, response, "categories")
+    if cached:
+        return cached
+    return categories.category_tree(db)
+
+@router.get("/categories/{category_id}/products", response_model=list[ProductOut])
+def category_products(
+    category_id: int,
+    response: Response,
+    is_active: Optional[bool] = None,
+    page: Page = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    Products in a category and all of its subcategories.
+    """
+    query = categories.subtree_products_query(db, category_id).options(selectinload(Product.variants))
+    if is_active is not None:
+        query = query.filter(Product.is_active == is_active)
+    rows, next_cursor = fetch_page(query, Product.id, page)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
 # ----------------- Bulk Import/Export -----------------
-@router.post("/import")
-def import_products(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    content = io.StringIO(file.file.read().decode())
-    reader = csv.DictReader(content)
-    for row in reader:
-        product = Product(
-            name=row["name"],
-            description=row.get("description"),
-            product_type=row.get("product_type", "physical")
-        )
-        db.add(product)
-    db.commit()
-    return {"message": "Products imported successfully"}
+@router.post("/import", status_code=202)
+def import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    db: Session = Depends(get_db)
+):
+    """
+    Queue a CSV or NDJSON upload for background import. Products are upserted
+    by url and variants (rows with a sku) by sku. Poll /products/import/{job_id}.
+    """
+    if not format:
+        format = "ndjson" if (file.filename or "").endswith((".ndjson", ".jsonl")) else "csv"
+    job = product_import.submit(db, file, format)
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/import/{job_id}")
+def import_status(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(ImportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return product_import.job_status(job)
 
 @router.get("/export")
-def export_products(db: Session = Depends(get_db)):
-    products = db.query(Product).all()
-    return [{"id": p.id, "name": p.name, "type": p.product_type} for p in products]
+def export_products(
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    include_variants: bool = False,
+    include_stock: bool = False,
+):
+    """
+    Stream the whole catalog as CSV or NDJSON without loading it into memory.
+    include_stock implies include_variants.
+    """
+    include_variants = include_variants or include_stock
+    if format == "csv":
+        return StreamingResponse(
+            catalog_export.export_csv(include_variants, include_stock),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=products.csv"}
+        )
+    return StreamingResponse(
+        catalog_export.export_ndjson(include_variants, include_stock),
+        media_type="application/x-ndjson"
+    )
+
+# ----------------- Single Product -----------------
+# Registered last so /categories, /export, /search and /browse are not captured by /{product_id}
+@router.get("/{product_id}", response_model=ProductOut)
+def get_product(product_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    # One primary-key read; writes to other products leave this ETag and
+    # cache entry valid
+    version = db.query(Product.version).filter(Product.id == product_id).scalar()
+    if version is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    cached = not_modified_as(request, response, f"product-{version}")
+    if cached:
+        return cached
+
+    def load():
+        product = (
+            db.query(Product)
+            .options(selectinload(Product.variants))
+            .filter(Product.id == product_id)
+            .first()
+        )
+        return serialize_product(product) if product else None
+
+    product = product_cache.get_or_load(product_key(product_id, version), load)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
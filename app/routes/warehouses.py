@@ -1,31 +1,43 @@
 # app/routers/warehouses.py
-from typing import List
-from fastapi import APIRouter, Depends
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.orm import Session
 
-from app.database import SessionLocal
+from app.database import get_db
 from app.models import Warehouse
 from app.schemas.warehouse import WarehouseCreate, WarehouseOut
+from app.pagination import Page, paginate
+from app.services.inventory import fan_out_warehouses
+from app.services.versions import not_modified
 
 
 
 router = APIRouter(prefix="/warehouses", tags=["Wherehouses"])
 
-# ----------------- DB -----------------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 @router.post("/", response_model=WarehouseOut)
 def create_warehouse(data: WarehouseCreate, db: Session = Depends(get_db)):
     wh = Warehouse(**data.dict())
     db.add(wh)
+    db.flush()  # wh.id available
+
+    # Stock rows for every existing variant, same transaction
+    fan_out_warehouses(db, [wh.id])
     db.commit()
     db.refresh(wh)
     return wh
 
 @router.get("/", response_model=List[WarehouseOut])
-def list_warehouses(db: Session = Depends(get_db)):
-    return db.query(Warehouse).all()
+def list_warehouses(
+    request: Request,
+    response: Response,
+    location: Optional[str] = None,
+    page: Page = Depends(),
+    db: Session = Depends(get_db)
+):
+    cached = not_modified(request, response, "warehouses")
+    if cached:
+        return cached
+    query = db.query(Warehouse)
+    if location:
+        query = query.filter(Warehouse.location == location)
+    return paginate(query, Warehouse.id, page, response)
@@ -47,9 +47,11 @@ class CheckoutRequest(BaseModel):
     city: Optional[str] = None
     country: Optional[str] = None
     payment_provider: str                # MPESA | STRIPE
+    phone: Optional[str] = None          # MPESA STK push number
     currency: str = "KES"
     guest_email: Optional[EmailStr] = None
-    warehouse_id: Optional[int] = None
+    warehouse_id: Optional[int] = None  # omit to let the allocator pick warehouses
+    coupon_code: Optional[str] = None
 
 
 class OrderResponse(BaseModel):
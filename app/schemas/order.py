@@ -0,0 +1,64 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+
+# -------------------------
+# Order History
+# -------------------------
+class OrderItemOut(BaseModel):
+    product_variant_id: int
+    quantity: int
+    price: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+
+class OrderPaymentOut(BaseModel):
+    provider: Optional[str] = None
+    status: Optional[str] = None
+    amount: Optional[float] = None
+    reference: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class OrderShipmentOut(BaseModel):
+    warehouse_id: Optional[int] = None
+    carrier: Optional[str] = None
+    tracking_number: Optional[str] = None
+    status: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class OrderAddressOut(BaseModel):
+    line1: Optional[str] = None
+    city: Optional[str] = None
+    country: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class OrderOut(BaseModel):
+    id: int
+    user_id: Optional[int] = None
+    status: Optional[str] = None
+    source: Optional[str] = None
+    total: float
+    discount: Optional[float] = None
+    tax: Optional[float] = None
+    shipping_cost: Optional[float] = None
+    currency: Optional[str] = None
+    created_at: Optional[datetime] = None
+    items: List[OrderItemOut] = []
+    payment: Optional[OrderPaymentOut] = None
+    shipments: List[OrderShipmentOut] = []
+    shipping_address: Optional[OrderAddressOut] = None
+
+    class Config:
+        from_attributes = True
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 # Discount & Coupon
@@ -10,12 +10,18 @@ class DiscountCreate(BaseModel):
     end_date: Optional[datetime]
     active: bool = True
     customer_segment: Optional[str]
+    automatic: bool = False  # apply without a coupon
 
 class CouponCreate(BaseModel):
     code: str
     discount_id: int
     usage_limit: Optional[int] = 1
 
+class CouponValidate(BaseModel):
+    code: str
+    customer_segment: Optional[str] = None
+    subtotal: Optional[float] = None      # to preview the discount amount
+
 # Price Rules
 class PriceRuleCreate(BaseModel):
     product_variant_id: int
@@ -31,3 +37,39 @@ class TaxRuleCreate(BaseModel):
     region: str
     tax_percentage: float
     active: bool = True
+
+# Price Quotes
+class QuoteItem(BaseModel):
+    product_variant_id: int
+    quantity: int = Field(1, gt=0)
+
+class QuoteRequest(BaseModel):
+    items: List[QuoteItem] = []
+    cart_id: Optional[int] = None         # quote a whole cart instead of items
+    customer_segment: Optional[str] = None
+    region: Optional[str] = None
+    at: Optional[datetime] = None         # defaults to now (UTC)
+
+class QuoteLine(BaseModel):
+    product_variant_id: int
+    quantity: int
+    base_price: Optional[float] = None
+    unit_price: Optional[float] = None
+    price_rule_id: Optional[int] = None
+    line_total: Optional[float] = None
+    error: Optional[str] = None
+
+class QuoteResponse(BaseModel):
+    lines: List[QuoteLine]
+    subtotal: float
+    discount: float = 0         # automatic discounts (coupons apply at checkout)
+    tax: float = 0
+    shipping: float = 0         # single shipment estimate for `region`
+    total: float
+
+# Shipping Rates
+class ShippingRateCreate(BaseModel):
+    country: str
+    min_weight: float = Field(0, ge=0)
+    max_weight: Optional[float] = None
+    price: float = Field(..., ge=0)
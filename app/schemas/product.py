@@ -7,6 +7,7 @@ class ProductCreate(BaseModel):
     description: Optional[str] = Field(None, example="Latest Apple phone")
     product_type: str = Field(..., example="physical")  # physical | digital | service
     url: str = Field(..., example="https://example.com/iphone15")
+    category_id: Optional[int] = Field(None, example=1)
     is_active: bool = True
 
 class ProductVariantCreate(BaseModel):
@@ -14,6 +15,7 @@ class ProductVariantCreate(BaseModel):
     price: float = Field(..., gt=0)
     size: Optional[str] = Field(None, example="128GB")
     color: Optional[str] = Field(None, example="Black")
+    weight: Optional[float] = Field(0, ge=0, example=0.2)
     is_active: bool = True
 
 class ProductVariantOut(BaseModel):
@@ -22,6 +24,7 @@ class ProductVariantOut(BaseModel):
     price: float
     size: Optional[str]
     color: Optional[str]
+    weight: Optional[float] = 0
     is_active: bool
 
     class Config:
@@ -34,6 +37,7 @@ class ProductOut(BaseModel):
     product_type: str
     is_active: bool
     url: str
+    category_id: Optional[int] = None
     created_at: datetime
     variants: Optional[List[ProductVariantOut]] = []
 
@@ -45,5 +49,6 @@ class ProductVariantCreate(BaseModel):
     price: float = Field(..., gt=0)
     size: Optional[str] = Field(None, example="128GB")
     color: Optional[str] = Field(None, example="Black")
+    weight: Optional[float] = Field(0, ge=0, example=0.2)
     is_active: bool = True
 
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.models import Inventory
+from app.services.rates import shipping_rates
+
+# Warehouse allocation for checkout. Stock per (variant, warehouse) is kept in
+# memory so picking warehouses costs no queries; the set-based deduction in
+# app.services.stock stays the source of truth and any conflict refreshes the
+# affected variants from the database. A full reload every AVAILABILITY_TTL
+# seconds picks up stock changed by other workers.
+
+AVAILABILITY_TTL = int(os.getenv("AVAILABILITY_TTL", 300))
+
+
+def shipment_cost(lines: dict, weights: dict, country: str | None) -> float:
+    """
+    Shipping price for one shipment of {variant_id: qty} (0 when no rate matches).
+    """
+    weight = sum((weights.get(vid) or 0) * qty for vid, qty in lines.items())
+    return shipping_rates.cost(country, weight) or 0
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._stock = None  # variant_id -> {warehouse_id: quantity}
+        self._loaded_at = 0.0
+
+    # ---------- loading / refresh ----------
+    def load(self, db: Session) -> None:
+        stock = {}
+        rows = db.query(Inventory.product_variant_id, Inventory.warehouse_id, Inventory.quantity)
+        for variant_id, warehouse_id, quantity in rows.yield_per(10000):
+            if quantity and quantity > 0:
+                stock.setdefault(variant_id, {})[warehouse_id] = quantity
+        with self._lock:
+            self._stock = stock
+            self._loaded_at = time.monotonic()
+
+    def _stale(self) -> bool:
+        return self._stock is None or time.monotonic() - self._loaded_at > AVAILABILITY_TTL
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self._stale():
+            return
+        # One checkout reloads; concurrent ones wait for it rather than each
+        # scanning the inventory table
+        with self._reload_lock:
+            if self._stale():
+                self.load(db)
+
+    def refresh(self, db: Session, variant_ids) -> None:
+        """
+        Reload the given variants from the database.
+        """
+        if self._stock is None:
+            return
+        rows = (
+            db.query(Inventory.product_variant_id, Inventory.warehouse_id, Inventory.quantity)
+            .filter(Inventory.product_variant_id.in_(list(variant_ids)))
+            .all()
+        )
+        fresh = {vid: {} for vid in variant_ids}
+        for variant_id, warehouse_id, quantity in rows:
+            if quantity and quantity > 0:
+                fresh[variant_id][warehouse_id] = quantity
+        with self._lock:
+            self._stock.update(fresh)
+
+    # ---------- incremental updates ----------
+    def set(self, variant_id: int, warehouse_id: int, quantity: int) -> None:
+        if self._stock is None:
+            return
+        with self._lock:
+            per_wh = self._stock.setdefault(variant_id, {})
+            if quantity > 0:
+                per_wh[warehouse_id] = quantity
+            else:
+                per_wh.pop(warehouse_id, None)
+
+    def deduct(self, plan: dict) -> None:
+        """
+        Apply a committed allocation plan ({warehouse_id: {variant_id: qty}}).
+        """
+        if self._stock is None:
+            return
+        with self._lock:
+            for warehouse_id, lines in plan.items():
+                for variant_id, qty in lines.items():
+                    per_wh = self._stock.get(variant_id, {})
+                    left = per_wh.get(warehouse_id, 0) - qty
+                    if left > 0:
+                        per_wh[warehouse_id] = left
+                    else:
+                        per_wh.pop(warehouse_id, None)
+
+    # ---------- allocation ----------
+    def allocate(self, needed: dict, weights: dict, country: str | None) -> dict:
+        """
+        Split {variant_id: qty} across warehouses, minimising the number of
+        shipments first and shipping cost second. Returns
+        {warehouse_id: {variant_id: qty}} or raises 400 with a shortage report.
+        """
+        # Copied under the lock: refresh() / deduct() mutate the per-variant dicts
+        with self._lock:
+            stock = {vid: dict(self._stock.get(vid, {})) for vid in needed}
+
+        shortages = [
+            {"product_variant_id": vid, "requested": qty, "available": sum(stock[vid].values())}
+            for vid, qty in needed.items() if sum(stock[vid].values()) < qty
+        ]
+        if shortages:
+            raise HTTPException(400, {"message": "Not enough stock", "shortages": shortages})
+
+        # Transposed: warehouse -> {variant_id: quantity} for the cart's variants
+        by_wh = {}
+        for vid, per_wh in stock.items():
+            for wh, qty in per_wh.items():
+                by_wh.setdefault(wh, {})[vid] = qty
+
+        # One warehouse can ship everything: a single shipment. Shipping rates
+        # are priced by destination and weight only (ShippingRate has no
+        # origin), so every such warehouse costs the same; lowest id wins
+        full = [
+            wh for wh, held in by_wh.items()
+            if len(held) == len(needed) and all(held[vid] >= qty for vid, qty in needed.items())
+        ]
+        if full:
+            return {min(full): dict(needed)}
+
+        # Otherwise greedily take the warehouse covering the most of what is
+        # left. Each warehouse's candidate shipment and its score (lines it
+        # completes, units it covers) are kept up to date as lines are taken,
+        # touching only the warehouses that stock the affected variants.
+        remaining = dict(needed)
+        offers = {wh: {vid: min(qty, needed[vid]) for vid, qty in held.items()} for wh, held in by_wh.items()}
+        scores = {
+            wh: [sum(1 for vid, qty in lines.items() if qty == needed[vid]), sum(lines.values())]
+            for wh, lines in offers.items()
+        }
+        plan = {}
+        while remaining:
+            if not scores:
+                # Unreachable once the shortage check above has passed
+                raise HTTPException(400, "Unable to allocate stock")
+            top = max(scores.values())
+            best_wh = min(
+                (wh for wh, score in scores.items() if score == top),
+                key=lambda wh: (shipment_cost(offers[wh], weights, country), wh)
+            )
+            plan[best_wh] = offers.pop(best_wh)
+            del scores[best_wh]
+            for vid, qty in plan[best_wh].items():
+                before = remaining[vid]
+                after = remaining[vid] = before - qty
+                for wh in stock[vid]:
+                    lines = offers.get(wh)
+                    if lines is None:
+                        continue
+                    score, old = scores[wh], lines[vid]
+                    score[0] -= old == before
+                    score[1] -= old
+                    if after:
+                        lines[vid] = min(by_wh[wh][vid], after)
+                        score[0] += lines[vid] == after
+                        score[1] += lines[vid]
+                    else:
+                        del lines[vid]
+                        if not lines:
+                            del offers[wh], scores[wh]
+                if not after:
+                    del remaining[vid]
+        return plan
+
+
+availability = AvailabilityIndex()
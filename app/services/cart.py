@@ -0,0 +1,354 @@
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy.orm import Session, selectinload
+
+from app.models import Cart, CartItem, Order, OrderAddress, Payment, ProductVariant, Shipment
+from app.payments.dispatcher import payment_dispatcher
+from app.schemas.cart import CartItemCreate, CheckoutRequest, OrderResponse
+from app.services import coupons, idempotency, reservations, stock, totals
+from app.services.allocation import availability, shipment_cost
+from app.services.facets import facet_index
+from app.services.pricing import price_index
+from app.services import rates
+from app.services.rates import tax_rates
+
+# Cart & checkout logic shared by the sync router (app.routes.cart) and the
+# async router (app.routes.cart_async, which runs these through
+# AsyncSession.run_sync).
+
+
+# -------------------------
+# Cart Loading
+# -------------------------
+def load_cart(db: Session, cart_id: int) -> Optional[Cart]:
+    """
+    Load a cart with its items, variants and products in two queries
+    (cart, then items joined to variant and product), however many lines it has.
+    """
+    return (
+        db.query(Cart)
+        .options(
+            selectinload(Cart.items)
+            .joinedload(CartItem.product_variant)
+            .joinedload(ProductVariant.product)
+        )
+        .filter(Cart.id == cart_id)
+        .execution_options(populate_existing=True)
+        .first()
+    )
+
+
+def serialize_cart(cart: Cart) -> dict:
+    """
+    Build the CartResponse payload from a cart loaded by load_cart.
+    """
+    items_out = []
+    for item in cart.items:
+        variant = item.product_variant
+        if variant:
+            product = variant.product
+            items_out.append({
+                "id": item.id,
+                "product_variant_id": item.product_variant_id,
+                "quantity": item.quantity,
+                "price": variant.price,
+                "name": product.name if product else "Unnamed Product",
+                "description": product.description if product else "",
+                "url": product.url if product else "",
+                "image_url": product.url if product else "",  # use an image field if you have one
+            })
+        else:
+            items_out.append({
+                "id": item.id,
+                "product_variant_id": item.product_variant_id,
+                "quantity": item.quantity,
+                "price": 0,
+                "name": "Unknown",
+                "description": "",
+                "url": "",
+                "image_url": "",
+            })
+
+    return {
+        "id": cart.id,
+        "user_id": cart.user_id,
+        "is_abandoned": cart.is_abandoned,
+        "items": items_out
+    }
+
+
+# -------------------------
+# Add to Cart
+# -------------------------
+def add_to_cart(db: Session, payload: CartItemCreate, cart_id: Optional[int] = None) -> dict:
+    # Fetch or create cart
+    cart = load_cart(db, cart_id) if cart_id else None
+    item = None
+    if not cart:
+        cart = Cart(
+            user_id=None,
+            is_abandoned=False,
+            last_activity_at=datetime.utcnow()
+        )
+        db.add(cart)
+        db.flush()  # cart.id available
+    else:
+        # Items are already loaded, no need to query for the line
+        item = next(
+            (ci for ci in cart.items if ci.product_variant_id == payload.product_variant_id),
+            None
+        )
+
+    # Hold the extra stock for this cart before touching the line
+    line_quantity = (item.quantity if item else 0) + payload.quantity
+    reservations.place_hold(db, cart.id, payload.product_variant_id, payload.quantity, line_quantity)
+
+    # Add or update item
+    if item:
+        item.quantity = line_quantity
+    else:
+        item = CartItem(
+            cart_id=cart.id,
+            product_variant_id=payload.product_variant_id,
+            quantity=payload.quantity
+        )
+        db.add(item)
+
+    # Update cart metadata
+    cart.last_activity_at = datetime.utcnow()
+    cart.is_abandoned = False
+
+    db.commit()
+
+    return serialize_cart(load_cart(db, cart.id))
+
+
+# -------------------------
+# Checkout
+# -------------------------
+def warm_indexes(db: Session) -> None:
+    """
+    Load or refresh the in-memory indexes checkout reads (price rules,
+    stock, tax / shipping rates, automatic discounts), so that checkout finds
+    them fresh. The async routes run this in a worker thread first: a reload
+    scans a table and blocks on the indexes' reload locks.
+    """
+    price_index.ensure_loaded(db)
+    rates.ensure_loaded(db)
+    availability.ensure_loaded(db)
+    coupons.automatic_discounts(db, None)
+
+
+def checkout(db: Session, payload: CheckoutRequest) -> OrderResponse:
+    # 1️⃣ Fetch the cart
+    cart = load_cart(db, payload.cart_id)
+    if not cart or not cart.items:
+        raise HTTPException(400, "Cart is empty or missing")
+
+    # 2️⃣ Price lines (active price rules override the variant's base price)
+    price_index.ensure_loaded(db)
+    segment = cart.user.customer_segment if cart.user_id else None
+    priced_at = datetime.utcnow()
+    lines = []
+    needed = {}
+    weights = {}
+    for item in cart.items:
+        rule = price_index.resolve(item.product_variant_id, segment, payload.country, priced_at)
+        price = rule[1] if rule else item.product_variant.price
+        lines.append({
+            "product_variant_id": item.product_variant_id,
+            "quantity": item.quantity,
+            "price": price
+        })
+        needed[item.product_variant_id] = needed.get(item.product_variant_id, 0) + item.quantity
+        weights[item.product_variant_id] = item.product_variant.weight
+
+    reservations.check_checkout(db, cart.id, needed)
+
+    # 3️⃣ Pick warehouses (or honour the one the frontend chose), then lock +
+    #    deduct stock per warehouse in ascending id order to avoid deadlocks
+    rates.ensure_loaded(db)
+    if payload.warehouse_id:
+        plan = {payload.warehouse_id: needed}
+    else:
+        availability.ensure_loaded(db)
+        try:
+            plan = availability.allocate(needed, weights, payload.country)
+        except HTTPException:
+            # The shortage may only be in our copy (restocked through another
+            # worker); re-read these variants before reporting it
+            availability.refresh(db, needed)
+            plan = availability.allocate(needed, weights, payload.country)
+
+    try:
+        for warehouse_id in sorted(plan):
+            stock.reserve_stock(db, warehouse_id, plan[warehouse_id])
+    except HTTPException:
+        # Release the row locks, then fix our in-memory view: it was stale
+        # (another worker sold the stock)
+        db.rollback()
+        availability.refresh(db, needed)
+        raise
+
+    # 4️⃣ Totals: automatic discounts stacked with the coupon, then tax and
+    #    shipping; then the order, its items and one shipment per warehouse
+    discounts = coupons.automatic_discounts(db, segment, priced_at)
+    if payload.coupon_code:
+        discounts.append(coupons.validate(db, payload.coupon_code, segment))
+    shipping_cost = sum(shipment_cost(plan[wh], weights, payload.country) for wh in plan)
+    sums = totals.basket_totals(
+        [line["price"] for line in lines],
+        [line["quantity"] for line in lines],
+        discounts,
+        tax_rates.percentage(payload.country),
+        shipping_cost
+    )
+    total = sums["total"]
+    order = Order(
+        user_id=cart.user_id,
+        status="CREATED",
+        currency=payload.currency,
+        total=total,
+        discount=sums["discount"],
+        tax=sums["tax"],
+        shipping_cost=shipping_cost,
+        coupon_code=payload.coupon_code
+    )
+    db.add(order)
+    db.flush()  # to get order.id
+
+    stock.add_order_items(db, order.id, lines)
+    for warehouse_id in sorted(plan):
+        db.add(Shipment(order_id=order.id, warehouse_id=warehouse_id, status="PENDING"))
+
+    # 5️⃣ Save shipping / address snapshot
+    if payload.line1:
+        db.add(OrderAddress(
+            order_id=order.id,
+            line1=payload.line1,
+            city=payload.city,
+            country=payload.country
+        ))
+
+    # 6️⃣ Create payment record; the provider is called by the payment
+    #    dispatcher after commit, never inside this request
+    payment = Payment(
+        order_id=order.id,
+        provider=payload.payment_provider,  # e.g., "MPESA"
+        status="PENDING",
+        amount=total,
+        phone=payload.phone
+    )
+    db.add(payment)
+
+    # 7️⃣ Holds become the deduction above; delete them with the cart
+    reservations.release_holds(db, cart.id)
+    db.delete(cart)
+
+    # 8️⃣ Count the coupon use last so its row lock is held as briefly as
+    #    possible, then commit all changes
+    if payload.coupon_code:
+        coupons.redeem(db, payload.coupon_code, segment)
+    response = OrderResponse(
+        order_id=order.id,
+        status=order.status,
+        total=order.total,
+        currency=order.currency,
+    )
+    idempotency.record(db, response)  # the stored replay commits with the order
+    db.commit()
+    availability.deduct(plan)
+    facet_index.deduct(plan)
+    payment_dispatcher.notify()
+
+    return response
+
+
+# -------------------------
+# Bulk Re-pricing
+# -------------------------
+def open_cart_totals(db: Session) -> list[dict]:
+    """
+    Current totals for every open (non-abandoned) cart, e.g. after a price
+    change: one query for all lines, then one vectorised pass.
+    """
+    rows = (
+        db.query(CartItem.cart_id, CartItem.product_variant_id, CartItem.quantity, ProductVariant.price)
+        .join(Cart, Cart.id == CartItem.cart_id)
+        .join(ProductVariant, ProductVariant.id == CartItem.product_variant_id)
+        .filter(Cart.is_abandoned == False)
+        .all()
+    )
+    if not rows:
+        return []
+
+    price_index.ensure_loaded(db)
+    now = datetime.utcnow()
+    cart_ids, prices, quantities = [], [], []
+    for cart_id, variant_id, quantity, base_price in rows:
+        rule = price_index.resolve(variant_id, None, None, now)
+        cart_ids.append(cart_id)
+        prices.append(rule[1] if rule else base_price)
+        quantities.append(quantity)
+
+    unique_ids, basket_index = np.unique(np.array(cart_ids), return_inverse=True)
+    sums = totals.many_totals(
+        basket_index, prices, quantities, len(unique_ids),
+        coupons.automatic_discounts(db, None, now)
+    )
+    return [
+        {
+            "cart_id": int(cart_id),
+            "subtotal": float(sums["subtotal"][i]),
+            "discount": float(sums["discount"][i]),
+            "total": float(sums["total"][i]),
+        }
+        for i, cart_id in enumerate(unique_ids)
+    ]
+
+
+# -------------------------
+# Read / Clear Cart
+# -------------------------
+def get_cart_items(db: Session, cart_id: Optional[int]) -> dict:
+    """
+    Fetch all items in a cart by cart_id with full product details.
+    """
+    if not cart_id:
+        raise HTTPException(status_code=400, detail="cart_id is required")
+
+    cart = load_cart(db, cart_id)
+    if not cart:
+        raise HTTPException(status_code=404, detail="Cart not found")
+
+    return serialize_cart(cart)
+
+
+def clear_cart(db: Session, cart_id: Optional[int]) -> dict:
+    """
+    Clear all items from a cart.
+    """
+    if not cart_id:
+        raise HTTPException(status_code=400, detail="cart_id is required")
+
+    cart = db.query(Cart).filter(Cart.id == cart_id).first()
+    if not cart:
+        raise HTTPException(status_code=404, detail="Cart not found")
+
+    # Delete all items in the cart and give their stock back
+    db.query(CartItem).filter(CartItem.cart_id == cart.id).delete()
+    reservations.release_holds(db, cart.id)
+    cart.last_activity_at = datetime.utcnow()
+    db.commit()
+    db.refresh(cart)
+
+    # Return the empty cart
+    return {
+        "id": cart.id,
+        "user_id": cart.user_id,
+        "is_abandoned": cart.is_abandoned,
+        "items": []
+    }
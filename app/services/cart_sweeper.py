@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Cart, CartItem, StockHold
+from app.services.housekeeping import in_batches, start_sweeper
+
+# Abandoned-cart housekeeping. Carts idle for CART_ABANDON_AFTER_SECONDS are
+# flagged is_abandoned; guest carts idle past GUEST_CART_RETENTION_SECONDS are
+# deleted together with their items and holds. Both walk the
+# last_activity_at index in batches of CART_SWEEP_BATCH, one short
+# transaction per batch, and re-check the idle condition in the write itself
+# so a cart touched by add_to_cart meanwhile is left alone.
+
+CART_ABANDON_AFTER_SECONDS = int(os.getenv("CART_ABANDON_AFTER_SECONDS", 3600))
+GUEST_CART_RETENTION_SECONDS = int(os.getenv("GUEST_CART_RETENTION_SECONDS", 7 * 86400))
+CART_SWEEP_INTERVAL = int(os.getenv("CART_SWEEP_INTERVAL", 300))
+CART_SWEEP_BATCH = int(os.getenv("CART_SWEEP_BATCH", 500))
+CART_SWEEP_PAUSE = float(os.getenv("CART_SWEEP_PAUSE", 0.05))  # seconds between batches
+
+last_run = {}
+
+
+def mark_abandoned(db: Session, batch_size: int = CART_SWEEP_BATCH) -> int:
+    """
+    Flag carts idle beyond the threshold as abandoned. Returns rows updated.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=CART_ABANDON_AFTER_SECONDS)
+    idle = (
+        db.query(Cart.id)
+        .filter(Cart.last_activity_at < cutoff, Cart.is_abandoned == False)
+        .order_by(Cart.last_activity_at)
+    )
+
+    def mark(ids):
+        return db.execute(
+            update(Cart)
+            .where(Cart.id.in_(ids), Cart.last_activity_at < cutoff, Cart.is_abandoned == False)
+            .values(is_abandoned=True)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    return in_batches(db, idle, mark, batch_size, CART_SWEEP_PAUSE)
+
+
+def purge_guest_carts(db: Session, batch_size: int = CART_SWEEP_BATCH) -> dict:
+    """
+    Delete guest carts idle past the retention window, with their items and
+    stock holds. Returns {"carts": n, "items": n}.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=GUEST_CART_RETENTION_SECONDS)
+    purged = {"carts": 0, "items": 0}
+    idle = (
+        db.query(Cart.id)
+        .filter(Cart.last_activity_at < cutoff, Cart.user_id == None)
+        .order_by(Cart.last_activity_at)
+    )
+
+    def purge(ids):
+        # Lock the carts that are still idle (skipping any add_to_cart is
+        # busy with), then delete children before parents: the FKs cascade
+        # on Postgres, so deleting carts first would leave nothing to count
+        locked = [
+            row[0] for row in
+            db.query(Cart.id)
+            .filter(Cart.id.in_(ids), Cart.last_activity_at < cutoff)
+            .with_for_update(skip_locked=True)
+            .all()
+        ]
+        if not locked:
+            return 0
+        # Re-checked in every statement too: SQLite has no row locks, but
+        # holds its write lock from the first DELETE until commit
+        still_idle = select(Cart.id).where(Cart.id.in_(locked), Cart.last_activity_at < cutoff)
+        items = db.execute(
+            delete(CartItem).where(CartItem.cart_id.in_(still_idle)).execution_options(synchronize_session=False)
+        )
+        db.execute(
+            delete(StockHold).where(StockHold.cart_id.in_(still_idle)).execution_options(synchronize_session=False)
+        )
+        deleted = db.execute(
+            delete(Cart)
+            .where(Cart.id.in_(locked), Cart.last_activity_at < cutoff)
+            .returning(Cart.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        purged["items"] += items.rowcount
+        return len(deleted)
+
+    purged["carts"] = in_batches(db, idle, purge, batch_size, CART_SWEEP_PAUSE)
+    return purged
+
+
+def sweep(db: Session) -> dict:
+    """
+    One full sweeper run. The report is also kept in `last_run`.
+    """
+    start = time.perf_counter()
+    marked = mark_abandoned(db)
+    purged = purge_guest_carts(db)
+    report = {
+        "finished_at": datetime.utcnow().isoformat(),
+        "marked_abandoned": marked,
+        "purged_carts": purged["carts"],
+        "purged_items": purged["items"],
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    last_run.clear()
+    last_run.update(report)
+    return report
+
+
+def _sweep(db: Session) -> str | None:
+    report = sweep(db)
+    if report["marked_abandoned"] or report["purged_carts"]:
+        return (
+            f"Cart sweep: {report['marked_abandoned']} abandoned, "
+            f"{report['purged_carts']} guest carts ({report['purged_items']} items) purged"
+        )
+    return None
+
+
+def start_cart_sweeper() -> threading.Thread:
+    return start_sweeper("cart-sweeper", CART_SWEEP_INTERVAL, _sweep)
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.services import versions
+
+# Read-through cache for serialized product payloads (TTL + LRU).
+# Concurrent misses on the same key are coalesced: one caller runs the loader
+# while the others wait for its result, so a cold hot-product page costs one
+# database load rather than one per request.
+# Keys carry the version the ETag is built from, so once any worker changes
+# a product its old entries can no longer be served alongside the new ETag;
+# they age out by TTL / LRU. A single product is keyed by its own
+# products.version, list pages by the products / product_variants table stamp.
+
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", 60))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", 5000))
+
+_MISSING = object()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ReadThroughCache:
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL, max_size: int = CATALOG_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._flights = {}             # key -> _Flight
+        self._generation = 0           # bumped to drop every list entry at once
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def get_or_load(self, key, loader):
+        """
+        Cached value for `key`, calling loader() at most once per miss.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            with self._lock:
+                # Only store if nobody invalidated the key while we were loading
+                if self._flights.get(key) is flight:
+                    self._entries[key] = (time.monotonic() + self.ttl, flight.value)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+            return flight.value
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._flights.pop(key, None)
+
+    def invalidate_prefix(self, prefix: tuple) -> None:
+        """
+        Drop every entry (and in-flight load) whose key starts with `prefix`.
+        """
+        n = len(prefix)
+        with self._lock:
+            for key in [k for k in self._entries if k[:n] == prefix]:
+                del self._entries[key]
+            for key in [k for k in self._flights if k[:n] == prefix]:
+                del self._flights[key]
+
+    def invalidate_lists(self) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if k[0] == "list"]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._flights.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+product_cache = ReadThroughCache()
+
+
+# Tables product payloads are built from (and the ETags of product lists)
+PRODUCT_TABLES = ("products", "product_variants")
+
+
+def product_key(product_id: int, version: int):
+    return ("product", product_id, version)
+
+
+def list_key(*params):
+    return ("list", product_cache.generation, versions.stamp(*PRODUCT_TABLES)) + params
+
+
+def invalidate_product(product_id: int | None = None) -> None:
+    """
+    Call after any product / variant write.
+    """
+    if product_id is not None:
+        product_cache.invalidate_prefix(("product", product_id))
+    product_cache.invalidate_lists()
@@ -0,0 +1,124 @@
+import csv
+import io
+import json
+import os
+from itertools import groupby
+
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models import Inventory, Product, ProductVariant
+
+# Streaming catalog export. Rows come off a server-side cursor in batches of
+# EXPORT_BATCH_SIZE and are written out in ~64KB chunks, so memory stays flat
+# however big the catalog is.
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 2000))
+CHUNK_BYTES = 64 * 1024
+
+PRODUCT_FIELDS = ["id", "name", "type", "description", "is_active", "url"]
+VARIANT_FIELDS = ["variant_id", "sku", "price", "size", "color", "variant_active"]
+STOCK_FIELDS = ["warehouse_id", "quantity"]
+
+
+def _statement(include_variants: bool, include_stock: bool):
+    columns = [
+        Product.id, Product.name, Product.product_type, Product.description,
+        Product.is_active, Product.url
+    ]
+    order_by = [Product.id]
+    if include_variants:
+        columns += [
+            ProductVariant.id, ProductVariant.sku, ProductVariant.price,
+            ProductVariant.size, ProductVariant.color, ProductVariant.is_active
+        ]
+        order_by.append(ProductVariant.id)
+    if include_variants and include_stock:
+        columns += [Inventory.warehouse_id, Inventory.quantity]
+        order_by.append(Inventory.warehouse_id)
+
+    stmt = select(*columns)
+    if include_variants:
+        stmt = stmt.outerjoin(ProductVariant, ProductVariant.product_id == Product.id)
+    if include_variants and include_stock:
+        stmt = stmt.outerjoin(Inventory, Inventory.product_variant_id == ProductVariant.id)
+    return stmt.order_by(*order_by)
+
+
+def _stream_rows(include_variants: bool, include_stock: bool):
+    # Own session: the request-scoped one is closed before streaming starts
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            _statement(include_variants, include_stock),
+            execution_options={"yield_per": EXPORT_BATCH_SIZE}
+        )
+        for row in result:
+            yield tuple(row)
+    finally:
+        db.close()
+
+
+def _chunked(lines):
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def export_csv(include_variants: bool = False, include_stock: bool = False):
+    """
+    One CSV row per product, per variant, or per variant+warehouse.
+    """
+    header = list(PRODUCT_FIELDS)
+    if include_variants:
+        header += VARIANT_FIELDS
+    if include_variants and include_stock:
+        header += STOCK_FIELDS
+
+    def lines():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(header)
+        for row in _stream_rows(include_variants, include_stock):
+            writer.writerow(row)
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+        yield out.getvalue()
+
+    return _chunked(lines())
+
+
+def export_ndjson(include_variants: bool = False, include_stock: bool = False):
+    """
+    One JSON object per product per line, with nested variants and a
+    {warehouse_id: quantity} stock map when requested.
+    """
+    def lines():
+        rows = _stream_rows(include_variants, include_stock)
+        for product_row, group in groupby(rows, key=lambda r: r[:6]):
+            product = dict(zip(PRODUCT_FIELDS, product_row))
+            if include_variants:
+                variants = []
+                for variant_row, stock_rows in groupby(group, key=lambda r: r[6:12]):
+                    if variant_row[0] is None:
+                        continue  # product without variants (outer join)
+                    variant = {
+                        "id": variant_row[0], "sku": variant_row[1], "price": variant_row[2],
+                        "size": variant_row[3], "color": variant_row[4], "is_active": variant_row[5],
+                    }
+                    if include_stock:
+                        variant["stock"] = {
+                            r[12]: r[13] for r in stock_rows if r[12] is not None
+                        }
+                    variants.append(variant)
+                product["variants"] = variants
+            yield json.dumps(product, default=str) + "\n"
+
+    return _chunked(lines())
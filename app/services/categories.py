@@ -0,0 +1,101 @@
+import threading
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.models import Category, Product
+from app.services import versions
+
+# Category tree as path enumeration: every category stores its ancestry as
+# "/<root id>/.../<own id>/". A subtree is then a single indexed prefix match
+# (path LIKE '/1/4/%') regardless of depth, and the whole tree is one query
+# ordered by path.
+
+_lock = threading.Lock()
+_tree_cache = {"version": None, "tree": None}
+
+
+def create_category(db: Session, name: str, parent_id: int | None) -> Category:
+    parent = None
+    if parent_id is not None:
+        parent = db.get(Category, parent_id)
+        if not parent:
+            raise HTTPException(404, "Parent category not found")
+
+    cat = Category(name=name, parent_id=parent_id)
+    db.add(cat)
+    db.flush()  # cat.id available
+    cat.path = f"{parent.path}{cat.id}/" if parent else f"/{cat.id}/"
+    cat.depth = parent.depth + 1 if parent else 0
+    db.commit()
+    db.refresh(cat)
+    return cat
+
+
+def backfill_paths(db: Session) -> int:
+    """
+    Fill path/depth for categories created before the tree was materialized.
+    Returns the number of rows updated.
+    """
+    if not db.query(Category.id).filter(Category.path == None).first():
+        return 0
+    rows = db.query(Category).all()
+    by_id = {c.id: c for c in rows}
+
+    def path_of(cat, seen=()):
+        if cat.parent_id is None or cat.parent_id not in by_id or cat.id in seen:
+            return f"/{cat.id}/", 0
+        parent_path, parent_depth = path_of(by_id[cat.parent_id], seen + (cat.id,))
+        return f"{parent_path}{cat.id}/", parent_depth + 1
+
+    updated = 0
+    for cat in rows:
+        path, depth = path_of(cat)
+        if cat.path != path or cat.depth != depth:
+            cat.path, cat.depth = path, depth
+            updated += 1
+    db.commit()
+    return updated
+
+
+def category_tree(db: Session) -> list[dict]:
+    """
+    Nested tree of all categories, rebuilt only when the categories table
+    version changes.
+    """
+    version = versions.current().get("categories", 0)
+    if _tree_cache["version"] == version and _tree_cache["tree"] is not None:
+        return _tree_cache["tree"]
+
+    rows = (
+        db.query(Category.id, Category.name, Category.parent_id, Category.depth)
+        .order_by(Category.path)
+        .all()
+    )
+    nodes = {}
+    roots = []
+    for cat_id, name, parent_id, depth in rows:
+        node = {"id": cat_id, "name": name, "depth": depth, "children": []}
+        nodes[cat_id] = node
+        # Ordered by path, so a parent is always seen before its children
+        parent = nodes.get(parent_id)
+        (parent["children"] if parent else roots).append(node)
+
+    with _lock:
+        _tree_cache["version"] = version
+        _tree_cache["tree"] = roots
+    return roots
+
+
+def subtree_products_query(db: Session, category_id: int):
+    """
+    Query for every product in a category or any of its descendants.
+    """
+    root = db.get(Category, category_id)
+    if not root:
+        raise HTTPException(404, "Category not found")
+    return (
+        db.query(Product)
+        .join(Category, Category.id == Product.category_id)
+        .filter(Category.path.like(f"{root.path}%"))
+    )
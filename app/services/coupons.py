@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import and_, exists, or_, update
+from sqlalchemy.orm import Session
+
+from app.models import Coupon, Discount
+from app.services import totals
+
+# Coupon validation and redemption.
+# - validate() answers "apply coupon" clicks from a short-lived in-process
+#   cache (including misses), so a viral code does not hit the database on
+#   every click. It is advisory: usage counts in the cache may lag.
+# - redeem() is authoritative: one conditional UPDATE that bumps times_used
+#   only while the limit, the discount window and the segment all still hold.
+
+COUPON_CACHE_TTL = float(os.getenv("COUPON_CACHE_TTL", 30))
+COUPON_CACHE_SIZE = int(os.getenv("COUPON_CACHE_SIZE", 10000))
+
+
+# -------------------------
+# Validation Cache
+# -------------------------
+class CouponCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # code -> (expires_at, snapshot or None)
+
+    def get(self, code: str):
+        entry = self._entries.get(code)
+        if entry and entry[0] > time.monotonic():
+            return True, entry[1]
+        return False, None
+
+    def put(self, code: str, snapshot) -> None:
+        with self._lock:
+            if len(self._entries) >= COUPON_CACHE_SIZE:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= COUPON_CACHE_SIZE:
+                    self._entries.clear()
+            self._entries[code] = (time.monotonic() + COUPON_CACHE_TTL, snapshot)
+
+    def invalidate(self, code: str | None = None) -> None:
+        with self._lock:
+            if code is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(code, None)
+
+
+coupon_cache = CouponCache()
+
+
+def _snapshot(db: Session, code: str):
+    row = (
+        db.query(
+            Coupon.code, Coupon.usage_limit, Coupon.times_used, Discount.id, Discount.type,
+            Discount.value, Discount.start_date, Discount.end_date, Discount.active,
+            Discount.customer_segment
+        )
+        .join(Discount, Discount.id == Coupon.discount_id)
+        .filter(Coupon.code == code)
+        .first()
+    )
+    if not row:
+        return None
+    return {
+        "code": row[0], "usage_limit": row[1], "times_used": row[2] or 0,
+        "discount_id": row[3], "type": row[4], "value": row[5], "start_date": row[6],
+        "end_date": row[7], "active": row[8], "customer_segment": row[9],
+    }
+
+
+def _problem(snapshot, segment: str | None, now: datetime) -> str | None:
+    if snapshot is None:
+        return "Coupon not found"
+    if not snapshot["active"]:
+        return "Coupon is not active"
+    if snapshot["start_date"] and snapshot["start_date"] > now:
+        return "Coupon is not valid yet"
+    if snapshot["end_date"] and snapshot["end_date"] < now:
+        return "Coupon has expired"
+    if snapshot["customer_segment"] and snapshot["customer_segment"] != segment:
+        return "Coupon is not available for this customer"
+    if snapshot["usage_limit"] is not None and snapshot["times_used"] >= snapshot["usage_limit"]:
+        return "Coupon usage limit reached"
+    return None
+
+
+def validate(db: Session, code: str, segment: str | None = None) -> dict:
+    """
+    Cached check of a coupon for a customer segment. Returns the discount
+    snapshot or raises 400.
+    """
+    hit, snapshot = coupon_cache.get(code)
+    if not hit:
+        snapshot = _snapshot(db, code)
+        coupon_cache.put(code, snapshot)
+
+    problem = _problem(snapshot, segment, datetime.utcnow())
+    if problem:
+        raise HTTPException(400, problem)
+    return snapshot
+
+
+# -------------------------
+# Discount Amount
+# -------------------------
+def discount_amount(discount_type: str, value: float, subtotal: float) -> float:
+    return float(totals.apply_discounts(
+        np.array([subtotal]),
+        [{"discount_id": None, "type": discount_type, "value": value}]
+    )[0])
+
+
+# -------------------------
+# Automatic Discounts
+# -------------------------
+# Discounts flagged `automatic` apply to every matching basket without a
+# coupon. The active set is small and changes rarely, so it is cached like the
+# rate tables.
+_automatic = {"loaded_at": 0.0, "rows": None}
+_automatic_lock = threading.Lock()  # one reload at a time; invalidate() waits for it
+
+
+def _cached_automatic():
+    rows = _automatic["rows"]
+    if rows is not None and time.monotonic() - _automatic["loaded_at"] <= COUPON_CACHE_TTL:
+        return rows
+    return None
+
+
+def _automatic_rows(db: Session) -> list[dict]:
+    rows = _cached_automatic()
+    if rows is not None:
+        return rows
+    with _automatic_lock:
+        rows = _cached_automatic()
+        if rows is not None:
+            return rows
+        rows = [
+            {
+                "discount_id": r[0], "type": r[1], "value": r[2], "start_date": r[3],
+                "end_date": r[4], "customer_segment": r[5],
+            }
+            for r in db.query(
+                Discount.id, Discount.type, Discount.value, Discount.start_date,
+                Discount.end_date, Discount.customer_segment
+            ).filter(Discount.active == True, Discount.automatic == True)
+        ]
+        _automatic["rows"] = rows
+        _automatic["loaded_at"] = time.monotonic()
+        return rows
+
+
+def automatic_discounts(db: Session, segment: str | None, now: datetime | None = None) -> list[dict]:
+    now = now or datetime.utcnow()
+    return [
+        d for d in _automatic_rows(db)
+        if (d["start_date"] is None or d["start_date"] <= now)
+        and (d["end_date"] is None or d["end_date"] >= now)
+        and (d["customer_segment"] is None or d["customer_segment"] == segment)
+    ]
+
+
+def invalidate() -> None:
+    coupon_cache.invalidate()
+    with _automatic_lock:
+        _automatic["rows"] = None
+
+
+# -------------------------
+# Redemption
+# -------------------------
+def redeem(db: Session, code: str, segment: str | None = None) -> None:
+    """
+    Atomically count one use of `code`. Runs in the caller's transaction, so
+    a failed checkout gives the use back on rollback. Raises 400 if the
+    coupon can no longer be used.
+    """
+    now = datetime.utcnow()
+    discount_ok = exists().where(and_(
+        Discount.id == Coupon.discount_id,
+        Discount.active == True,
+        or_(Discount.start_date == None, Discount.start_date <= now),
+        or_(Discount.end_date == None, Discount.end_date >= now),
+        or_(Discount.customer_segment == None, Discount.customer_segment == segment),
+    ))
+    result = db.execute(
+        update(Coupon)
+        .where(
+            Coupon.code == code,
+            or_(Coupon.usage_limit == None, Coupon.times_used < Coupon.usage_limit),
+            discount_ok
+        )
+        .values(times_used=Coupon.times_used + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        coupon_cache.invalidate(code)
+        raise HTTPException(400, "Coupon is no longer valid")
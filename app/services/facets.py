@@ -0,0 +1,254 @@
+import os
+import threading
+import time
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import Category, Inventory, Product, ProductVariant
+
+# Faceted browse over product variants. Every variant occupies one slot in a
+# set of parallel NumPy columns (product, category, price, size/color codes,
+# stock, active), so a filter is a handful of vectorised comparisons and the
+# facet counts are a bincount over the matching slots -- no GROUP BY per page.
+# Variant, product and inventory writes patch the affected slots in place;
+# a full reload every FACET_INDEX_TTL seconds picks up other workers' writes.
+
+FACET_INDEX_TTL = int(os.getenv("FACET_INDEX_TTL", 300))
+
+_NO_CODE = -1
+
+
+class _Vocabulary:
+    """
+    String value <-> small integer code, for one facet.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value) -> int:
+        if value is None or value == "":
+            return _NO_CODE
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, values) -> list[int]:
+        return [self.codes[v] for v in values if v in self.codes]
+
+
+class FacetIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._loaded_at = None
+        self._reset(0)
+
+    def _reset(self, capacity: int) -> None:
+        self.slots = {}  # variant_id -> slot
+        self.size_vocab = _Vocabulary()
+        self.color_vocab = _Vocabulary()
+        self.count = 0
+        self.variant_id = np.zeros(capacity, dtype=np.int64)
+        self.product_id = np.zeros(capacity, dtype=np.int64)
+        self.category_id = np.full(capacity, _NO_CODE, dtype=np.int64)
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self.size = np.full(capacity, _NO_CODE, dtype=np.int32)
+        self.color = np.full(capacity, _NO_CODE, dtype=np.int32)
+        self.stock = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.variant_id)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name, fill in (
+            ("variant_id", 0), ("product_id", 0), ("category_id", _NO_CODE), ("price", 0),
+            ("size", _NO_CODE), ("color", _NO_CODE), ("stock", 0), ("active", False),
+        ):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    # ---------- loading ----------
+    @staticmethod
+    def _rows(db: Session):
+        stock = (
+            db.query(Inventory.product_variant_id.label("variant_id"), func.sum(Inventory.quantity).label("qty"))
+            .group_by(Inventory.product_variant_id)
+            .subquery()
+        )
+        return (
+            db.query(
+                ProductVariant.id, ProductVariant.product_id, Product.category_id,
+                ProductVariant.price, ProductVariant.size, ProductVariant.color,
+                func.coalesce(stock.c.qty, 0),
+                ProductVariant.is_active, Product.is_active
+            )
+            .join(Product, Product.id == ProductVariant.product_id)
+            .outerjoin(stock, stock.c.variant_id == ProductVariant.id)
+        )
+
+    def _put(self, row) -> None:
+        variant_id, product_id, category_id, price, size, color, qty, variant_active, product_active = row
+        slot = self.slots.get(variant_id)
+        if slot is None:
+            slot = self.slots[variant_id] = self.count
+            self.count += 1
+            self._grow(self.count)
+        self.variant_id[slot] = variant_id
+        self.product_id[slot] = product_id
+        self.category_id[slot] = category_id if category_id is not None else _NO_CODE
+        self.price[slot] = price or 0
+        self.size[slot] = self.size_vocab.code(size)
+        self.color[slot] = self.color_vocab.code(color)
+        self.stock[slot] = qty or 0
+        self.active[slot] = bool(variant_active) and product_active is not False
+
+    def load(self, db: Session) -> None:
+        # Built aside and swapped in, so browsing is not blocked by a reload
+        fresh = FacetIndex()
+        for row in self._rows(db).yield_per(10000):
+            fresh._put(row)
+        with self._lock:
+            for name, value in vars(fresh).items():
+                if name not in ("_lock", "_reload_lock"):
+                    setattr(self, name, value)
+            self._loaded_at = time.monotonic()
+
+    def _stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > FACET_INDEX_TTL
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self._stale():
+            return
+        # One browse request rebuilds; concurrent ones wait for it and then
+        # find the index fresh instead of each rebuilding it again
+        with self._reload_lock:
+            if self._stale():
+                self.load(db)
+
+    # ---------- incremental updates ----------
+    def refresh_products(self, db: Session, product_ids) -> None:
+        """
+        Re-read every variant of the given products (after product / variant
+        writes). Variants whose product is gone are deactivated.
+        """
+        if self._loaded_at is None:
+            return
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        rows = self._rows(db).filter(ProductVariant.product_id.in_(product_ids)).all()
+        with self._lock:
+            stale = np.isin(self.product_id[:self.count], product_ids)
+            self.active[:self.count][stale] = False
+            for row in rows:
+                self._put(row)
+
+    def add_stock(self, variant_id: int, delta: int) -> None:
+        if self._loaded_at is None:
+            return
+        with self._lock:
+            slot = self.slots.get(variant_id)
+            if slot is not None:
+                self.stock[slot] += delta
+
+    def deduct(self, plan: dict) -> None:
+        """
+        Apply a committed allocation plan ({warehouse_id: {variant_id: qty}}).
+        """
+        for lines in plan.values():
+            for variant_id, qty in lines.items():
+                self.add_stock(variant_id, -qty)
+
+    # ---------- queries ----------
+    def browse(
+        self,
+        db: Session,
+        category_id: int | None = None,
+        sizes: list[str] | None = None,
+        colors: list[str] | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        in_stock: bool = False,
+    ) -> tuple[list[int], dict]:
+        """
+        Ids of products with at least one matching variant (ascending), and
+        variant counts per facet. Each facet's counts apply every filter
+        except its own, so the UI can offer the alternatives.
+        """
+        category_ids = None
+        if category_id is not None:
+            root = db.get(Category, category_id)
+            if not root:
+                raise HTTPException(404, "Category not found")
+            category_ids = [
+                cid for (cid,) in db.query(Category.id).filter(Category.path.like(f"{root.path}%"))
+            ]
+
+        self.ensure_loaded(db)
+        with self._lock:
+            n = self.count
+            base = self.active[:n].copy()
+            if category_ids is not None:
+                base &= np.isin(self.category_id[:n], category_ids)
+            if min_price is not None:
+                base &= self.price[:n] >= min_price
+            if max_price is not None:
+                base &= self.price[:n] <= max_price
+
+            size_col, color_col = self.size[:n], self.color[:n]
+            in_stock_mask = self.stock[:n] > 0
+            size_mask = np.isin(size_col, self.size_vocab.lookup(sizes)) if sizes else None
+            color_mask = np.isin(color_col, self.color_vocab.lookup(colors)) if colors else None
+
+            def without(*skip):
+                mask = base.copy()
+                if size_mask is not None and "size" not in skip:
+                    mask &= size_mask
+                if color_mask is not None and "color" not in skip:
+                    mask &= color_mask
+                if in_stock and "in_stock" not in skip:
+                    mask &= in_stock_mask
+                return mask
+
+            def counts(column, vocab, mask):
+                codes = column[mask]
+                codes = codes[codes != _NO_CODE]
+                tally = np.bincount(codes, minlength=len(vocab.values))
+                return {vocab.values[i]: int(c) for i, c in enumerate(tally) if c}
+
+            matched = without()
+            facets = {
+                "size": counts(size_col, self.size_vocab, without("size")),
+                "color": counts(color_col, self.color_vocab, without("color")),
+                "in_stock": int(np.count_nonzero(without("in_stock") & in_stock_mask)),
+                "variants": int(np.count_nonzero(matched)),
+            }
+            prices = self.price[:n][matched]
+            facets["price"] = (
+                {"min": float(prices.min()), "max": float(prices.max())} if len(prices) else None
+            )
+            product_ids = np.unique(self.product_id[:n][matched])
+
+        return product_ids.tolist(), facets
+
+    def stats(self) -> dict:
+        return {
+            "variants": self.count,
+            "sizes": len(self.size_vocab.values),
+            "colors": len(self.color_vocab.values),
+            "loaded": self._loaded_at is not None,
+        }
+
+
+facet_index = FacetIndex()
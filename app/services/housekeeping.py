@@ -0,0 +1,70 @@
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+
+# Shared plumbing for the background sweepers (stock holds, idempotency keys,
+# abandoned carts): work through matching rows a batch at a time, one short
+# transaction per batch, and a daemon thread that runs a sweep every interval.
+
+
+def in_batches(db: Session, ids_query, work: Callable[[list], int], batch_size: int, pause: float = 0) -> int:
+    """
+    Call work(ids) for successive batches of up to `batch_size` ids from
+    `ids_query` (a query selecting one id column, re-run for every batch, so
+    `work` must make its rows stop matching), committing after each batch.
+    Returns the sum of what `work` returned. A batch where `work` returns 0
+    (e.g. every row locked by someone else) ends the run: re-running the
+    query would only fetch the same rows again, so they wait for the next sweep.
+    """
+    done = 0
+    while True:
+        ids = [row[0] for row in ids_query.limit(batch_size).all()]
+        if not ids:
+            return done
+        changed = work(ids)
+        db.commit()
+        done += changed
+        if len(ids) < batch_size or not changed:
+            return done
+        if pause:
+            time.sleep(pause)
+
+
+def delete_in_batches(db: Session, model, condition, batch_size: int, pause: float = 0) -> int:
+    """
+    Delete rows of `model` matching `condition` in batches. Returns rows removed.
+    """
+    pk = model.__mapper__.primary_key[0]
+
+    def remove(ids):
+        return db.query(model).filter(pk.in_(ids)).delete(synchronize_session=False)
+
+    return in_batches(db, db.query(pk).filter(condition), remove, batch_size, pause)
+
+
+def start_sweeper(name: str, interval: float, sweep: Callable[[Session], str | None]) -> threading.Thread:
+    """
+    Run sweep(db) every `interval` seconds on a daemon thread. A returned
+    message is printed; failures are reported and retried next interval.
+    """
+    def run_forever():
+        while True:
+            time.sleep(interval)
+            db = SessionLocal()
+            try:
+                message = sweep(db)
+                if message:
+                    print(message)
+            except Exception as exc:
+                db.rollback()
+                print(f"⚠️ {name} failed: {exc}")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=run_forever, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, dialect_insert
+from app.models import IdempotencyKey
+from app.services.housekeeping import delete_in_batches, start_sweeper
+
+# Idempotency-Key support for non-repeatable POSTs (checkout, order creation).
+# The first request with a key claims it by inserting an IN_PROGRESS row
+# (unique on scope + key) in its own short transaction. The handler marks the
+# row DONE with its response inside its own transaction, just before it
+# commits (record()), so the business rows and the stored response commit or
+# roll back together. A retry with the same key replays that response, from
+# the in-process cache when possible, and a duplicate arriving while the
+# first is still running gets 409. Failed requests release the key so the
+# client can retry for real.
+#
+# A key left IN_PROGRESS therefore never has committed business rows behind
+# it; once stale (the worker died) another request may take it over. Claims
+# carry a lease (locked_at), and record() / release() only act while the
+# lease is still theirs, so a slow first attempt cannot commit after a
+# takeover.
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 60))  # stale IN_PROGRESS takeover
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+IDEMPOTENCY_SWEEP_INTERVAL = int(os.getenv("IDEMPOTENCY_SWEEP_INTERVAL", 600))
+IDEMPOTENCY_SWEEP_BATCH = int(os.getenv("IDEMPOTENCY_SWEEP_BATCH", 1000))
+
+MAX_KEY_LENGTH = 255
+
+
+# -------------------------
+# Completed Response Cache
+# -------------------------
+class ResponseCache:
+    """
+    LRU of completed responses: (scope, key) -> (expires, fingerprint, status_code, body).
+    """
+
+    def __init__(self, max_size: int = IDEMPOTENCY_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, scope: str, key: str):
+        with self._lock:
+            entry = self._entries.get((scope, key))
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[(scope, key)]
+                return None
+            self._entries.move_to_end((scope, key))
+            return entry[1:]
+
+    def put(self, scope: str, key: str, expires_at: datetime, fingerprint: str, status_code: int, body) -> None:
+        expires = time.time() + (expires_at - datetime.utcnow()).total_seconds()
+        with self._lock:
+            self._entries[(scope, key)] = (expires, fingerprint, status_code, body)
+            self._entries.move_to_end((scope, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+response_cache = ResponseCache()
+
+
+def fingerprint(payload) -> str:
+    return hashlib.sha256(
+        json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def _replay(scope: str, key: str, expected: str, stored: str, status_code: int, body) -> JSONResponse:
+    if stored != expected:
+        raise HTTPException(422, f"{IDEMPOTENCY_HEADER} was already used with a different request body")
+    return JSONResponse(
+        status_code=status_code,
+        content=body,
+        headers={IDEMPOTENCY_HEADER: key, "Idempotent-Replayed": "true"},
+    )
+
+
+# -------------------------
+# Claim / Complete / Release
+# -------------------------
+def claim(scope: str, key: str, request_fingerprint: str):
+    """
+    Claim `key` for a new request. Returns (None, lease) when the caller
+    should run the request, or (JSONResponse replaying the original result, None).
+    """
+    cached = response_cache.get(scope, key)
+    if cached:
+        return _replay(scope, key, request_fingerprint, *cached), None
+
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        insert = dialect_insert(db)
+        stmt = insert(IdempotencyKey).values(
+            scope=scope, key=key, fingerprint=request_fingerprint, status="IN_PROGRESS",
+            locked_at=now, expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+        ).on_conflict_do_nothing(index_elements=["scope", "key"])
+        claimed = db.execute(stmt).rowcount == 1
+        db.commit()
+        if claimed:
+            return None, now
+
+        row = db.query(IdempotencyKey).filter_by(scope=scope, key=key).first()
+        if row is None:
+            # Released between our insert and read; let the client retry
+            raise HTTPException(409, "A request with this Idempotency-Key is in progress")
+        if row.status == "DONE":
+            body = json.loads(row.response) if row.response else None
+            response_cache.put(scope, key, row.expires_at, row.fingerprint, row.status_code, body)
+            return _replay(scope, key, request_fingerprint, row.fingerprint, row.status_code, body), None
+        if row.fingerprint != request_fingerprint:
+            raise HTTPException(422, f"{IDEMPOTENCY_HEADER} was already used with a different request body")
+
+        # The first attempt is still running, unless it died holding the key.
+        # Its business rows would have committed with DONE, so a stale
+        # IN_PROGRESS row means there are none and the request can run again.
+        stale_before = now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+        taken = db.execute(
+            update(IdempotencyKey)
+            .where(
+                IdempotencyKey.id == row.id,
+                IdempotencyKey.status == "IN_PROGRESS",
+                IdempotencyKey.locked_at < stale_before,
+            )
+            .values(locked_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if taken:
+            return None, now
+        raise HTTPException(409, "A request with this Idempotency-Key is in progress")
+    finally:
+        db.close()
+
+
+def record(db: Session, result) -> None:
+    """
+    Store `result` as the response for the key this request claimed, in the
+    handler's own transaction. Call right before the handler commits; a
+    no-op when the request carries no Idempotency-Key.
+    """
+    claimed = db.info.get("idempotency")
+    if claimed is None:
+        return
+    body = jsonable_encoder(result)
+    done = db.execute(
+        update(IdempotencyKey)
+        .where(
+            IdempotencyKey.scope == claimed["scope"],
+            IdempotencyKey.key == claimed["key"],
+            IdempotencyKey.status == "IN_PROGRESS",
+            IdempotencyKey.locked_at == claimed["lease"],
+        )
+        .values(status="DONE", status_code=claimed["status_code"], response=json.dumps(body))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if done != 1:
+        # Our lease went stale and another request took the key over
+        db.rollback()
+        raise HTTPException(409, "A request with this Idempotency-Key is in progress")
+    claimed.update(body=body, recorded=True)
+
+
+def complete(scope: str, key: str, lease: datetime, status_code: int, body) -> None:
+    """
+    Fallback for handlers that do not call record(): store the response in
+    a separate transaction after the handler committed.
+    """
+    db = SessionLocal()
+    try:
+        row = db.query(IdempotencyKey).filter_by(scope=scope, key=key, locked_at=lease).first()
+        if row is None:
+            return
+        row.status = "DONE"
+        row.status_code = status_code
+        row.response = json.dumps(body)
+        db.commit()
+        response_cache.put(scope, key, row.expires_at, row.fingerprint, status_code, body)
+    finally:
+        db.close()
+
+
+def release(scope: str, key: str, lease: datetime) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(
+            delete(IdempotencyKey)
+            .where(
+                IdempotencyKey.scope == scope,
+                IdempotencyKey.key == key,
+                IdempotencyKey.status == "IN_PROGRESS",
+                IdempotencyKey.locked_at == lease,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _begin(db, scope: str, key: str, lease: datetime, request_fingerprint: str, status_code: int) -> dict:
+    claimed = {
+        "scope": scope, "key": key, "lease": lease, "fingerprint": request_fingerprint,
+        "status_code": status_code, "recorded": False,
+    }
+    db.info["idempotency"] = claimed
+    return claimed
+
+
+def _finish(claimed: dict) -> None:
+    # Committed by the handler; safe to serve from this worker's cache now
+    expires_at = claimed["lease"] + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    response_cache.put(
+        claimed["scope"], claimed["key"], expires_at, claimed["fingerprint"],
+        claimed["status_code"], claimed["body"]
+    )
+
+
+def run(db: Session, scope: str, key: str | None, payload, handler, status_code: int = 200):
+    """
+    Call `handler()` at most once per (scope, key). The handler runs on `db`
+    and should call record() just before it commits. Without a key the
+    handler simply runs.
+    """
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(400, f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters")
+
+    request_fingerprint = fingerprint(payload)
+    replay, lease = claim(scope, key, request_fingerprint)
+    if replay is not None:
+        return replay
+    claimed = _begin(db, scope, key, lease, request_fingerprint, status_code)
+    try:
+        result = handler()
+    except Exception:
+        release(scope, key, lease)
+        raise
+    finally:
+        db.info.pop("idempotency", None)
+    if claimed["recorded"]:
+        _finish(claimed)
+    else:
+        complete(scope, key, lease, status_code, jsonable_encoder(result))
+    return result
+
+
+async def run_async(db: AsyncSession, scope: str, key: str | None, payload, handler, status_code: int = 200):
+    """
+    run() for async handlers (`handler` is awaited); the key bookkeeping
+    goes through the threadpool so it never blocks the event loop.
+    """
+    if not key:
+        return await handler()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(400, f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters")
+
+    request_fingerprint = fingerprint(payload)
+    replay, lease = await run_in_threadpool(claim, scope, key, request_fingerprint)
+    if replay is not None:
+        return replay
+    claimed = _begin(db, scope, key, lease, request_fingerprint, status_code)
+    try:
+        result = await handler()
+    except Exception:
+        await run_in_threadpool(release, scope, key, lease)
+        raise
+    finally:
+        db.info.pop("idempotency", None)
+    if claimed["recorded"]:
+        _finish(claimed)
+    else:
+        await run_in_threadpool(complete, scope, key, lease, status_code, jsonable_encoder(result))
+    return result
+
+
+# -------------------------
+# Cleanup
+# -------------------------
+def purge_expired(db: Session, batch_size: int = IDEMPOTENCY_SWEEP_BATCH) -> int:
+    """
+    Delete expired keys in batches of `batch_size`. Returns rows removed.
+    """
+    return delete_in_batches(db, IdempotencyKey, IdempotencyKey.expires_at <= datetime.utcnow(), batch_size)
+
+
+def _sweep(db: Session) -> str | None:
+    removed = purge_expired(db)
+    return f"Purged {removed} expired idempotency keys" if removed else None
+
+
+def start_idempotency_sweeper() -> threading.Thread:
+    return start_sweeper("idempotency-sweeper", IDEMPOTENCY_SWEEP_INTERVAL, _sweep)
@@ -0,0 +1,45 @@
+from sqlalchemy import literal, select, true
+from sqlalchemy.orm import Session
+
+from app.database import dialect_insert
+from app.models import Inventory, ProductVariant, Warehouse
+
+# Set-based inventory fan-out: every (variant, warehouse) pair gets an
+# Inventory row, created with one INSERT ... SELECT instead of a row per ORM
+# object. ON CONFLICT DO NOTHING against uq_inventory_variant_warehouse makes
+# it idempotent, so existing rows (and their stock) are left alone.
+
+INVENTORY_COLUMNS = ["product_variant_id", "warehouse_id", "quantity", "reorder_level"]
+
+
+def _fan_out(db: Session, condition) -> None:
+    pairs = (
+        select(ProductVariant.id, Warehouse.id, literal(0), literal(0))
+        .select_from(ProductVariant)
+        .join(Warehouse, true())  # variant x warehouse
+        .where(condition)
+    )
+    insert = dialect_insert(db)
+    db.execute(
+        insert(Inventory)
+        .from_select(INVENTORY_COLUMNS, pairs)
+        .on_conflict_do_nothing(index_elements=["product_variant_id", "warehouse_id"])
+    )
+
+
+def fan_out_variants(db: Session, variant_ids) -> None:
+    """
+    Create zero-stock inventory rows for the given variants in every
+    warehouse. Runs inside the caller's transaction.
+    """
+    if variant_ids:
+        _fan_out(db, ProductVariant.id.in_(list(variant_ids)))
+
+
+def fan_out_warehouses(db: Session, warehouse_ids) -> None:
+    """
+    Create zero-stock inventory rows for every variant in the given
+    warehouses. Runs inside the caller's transaction.
+    """
+    if warehouse_ids:
+        _fan_out(db, Warehouse.id.in_(list(warehouse_ids)))
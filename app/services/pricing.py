@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from bisect import bisect_right, insort
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import Session
+
+from app.models import PriceRule, ProductVariant
+
+# Compiled price rules. Active PriceRule rows are grouped by
+# (variant, segment, region) into start-sorted interval lists, so resolving a
+# price is at most four dict lookups plus a binary search each, with no query.
+
+PRICE_INDEX_TTL = int(os.getenv("PRICE_INDEX_TTL", 300))  # full reload, picks up other workers' writes
+
+_OPEN_START = datetime.min
+_OPEN_END = datetime.max
+
+
+class PriceIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._rules = None  # (variant_id, segment, region) -> [(start, end, rule_id, price)]
+        self._loaded_at = 0.0
+
+    # ---------- loading / incremental updates ----------
+    def load(self, db: Session) -> None:
+        rules = {}
+        rows = (
+            db.query(
+                PriceRule.id, PriceRule.product_variant_id, PriceRule.customer_segment,
+                PriceRule.region, PriceRule.price, PriceRule.start_time, PriceRule.end_time
+            )
+            .filter(PriceRule.active == True)
+            .yield_per(10000)
+        )
+        for rule_id, variant_id, segment, region, price, start, end in rows:
+            rules.setdefault((variant_id, segment, region), []).append(
+                (start or _OPEN_START, end or _OPEN_END, rule_id, price)
+            )
+        for entries in rules.values():
+            entries.sort()
+        with self._lock:
+            self._rules = rules
+            self._loaded_at = time.monotonic()
+
+    def _stale(self) -> bool:
+        return self._rules is None or time.monotonic() - self._loaded_at > PRICE_INDEX_TTL
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self._stale():
+            return
+        # One request reloads; concurrent ones wait for it instead of each
+        # scanning price_rules, then find the index fresh
+        with self._reload_lock:
+            if self._stale():
+                self.load(db)
+
+    def add(self, rule: PriceRule) -> None:
+        """
+        Index a newly created rule without rebuilding everything.
+        """
+        if self._rules is None or not rule.active:
+            return
+        entry = (rule.start_time or _OPEN_START, rule.end_time or _OPEN_END, rule.id, rule.price)
+        with self._lock:
+            insort(self._rules.setdefault((rule.product_variant_id, rule.customer_segment, rule.region), []), entry)
+
+    # ---------- lookup ----------
+    def _match(self, key, at: datetime):
+        entries = self._rules.get(key)
+        if not entries:
+            return None
+        # Latest-starting rule that has begun and not yet ended wins
+        i = bisect_right(entries, (at, _OPEN_END, float("inf"), 0))
+        while i > 0:
+            i -= 1
+            start, end, rule_id, price = entries[i]
+            if end > at:
+                return rule_id, price
+        return None
+
+    def resolve(self, variant_id: int, segment: str | None, region: str | None, at: datetime):
+        """
+        (rule_id, price) of the most specific rule in effect at `at`:
+        segment+region, then segment, then region, then variant-wide.
+        Returns None when no rule applies (use the variant's base price).
+        """
+        if not self._rules:
+            return None
+        keys = dict.fromkeys([
+            (variant_id, segment, region),
+            (variant_id, segment, None),
+            (variant_id, None, region),
+            (variant_id, None, None),
+        ])
+        for key in keys:
+            found = self._match(key, at)
+            if found:
+                return found
+        return None
+
+
+price_index = PriceIndex()
+
+
+def quote_lines(db: Session, lines: dict, segment: str | None, region: str | None, at: datetime | None = None) -> list[dict]:
+    """
+    Price {variant_id: quantity} in one query for base prices plus in-memory
+    rule lookups.
+    """
+    at = at or datetime.utcnow()
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)  # rules are stored as naive UTC
+    price_index.ensure_loaded(db)
+    base = dict(
+        db.query(ProductVariant.id, ProductVariant.price)
+        .filter(ProductVariant.id.in_(list(lines)))
+        .all()
+    )
+
+    quoted = []
+    for variant_id, quantity in lines.items():
+        if variant_id not in base:
+            quoted.append({"product_variant_id": variant_id, "quantity": quantity, "error": "Unknown variant"})
+            continue
+        found = price_index.resolve(variant_id, segment, region, at)
+        unit_price = found[1] if found else base[variant_id]
+        quoted.append({
+            "product_variant_id": variant_id,
+            "quantity": quantity,
+            "base_price": base[variant_id],
+            "unit_price": unit_price,
+            "price_rule_id": found[0] if found else None,
+            "line_total": round(unit_price * quantity, 2),
+        })
+    return quoted
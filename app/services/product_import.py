@@ -0,0 +1,276 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, dialect_insert
+from app.models import ImportJob, Product, ProductVariant
+from app.services.catalog_cache import product_cache
+from app.services import versions
+from app.services.inventory import fan_out_variants
+from app.services.facets import facet_index
+from app.services.search import product_search
+
+# Background product importer. The upload is spooled to a temp file, parsed
+# row by row, and written in batches of IMPORT_BATCH_SIZE rows: one multi-row
+# upsert for products (by url), one for variants (by sku), one INSERT ...
+# SELECT for missing inventory, then a commit that also records progress.
+# The product cache, search index and facet index are refreshed once at the
+# end of the job (in chunks of IMPORT_PUBLISH_BATCH_SIZE products), not per
+# batch.
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", 1000))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", 2))
+IMPORT_PUBLISH_BATCH_SIZE = int(os.getenv("IMPORT_PUBLISH_BATCH_SIZE", 5000))
+
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="product-import")
+
+PRODUCT_COLUMNS = ("name", "description", "product_type", "is_active", "url")
+VARIANT_COLUMNS = ("sku", "price", "size", "color", "weight")
+
+
+# -------------------------
+# Job Submission / Status
+# -------------------------
+def submit(db: Session, upload, format: str) -> ImportJob:
+    """
+    Spool the upload to disk and queue it. Returns the PENDING job.
+    """
+    spool = tempfile.NamedTemporaryFile(prefix="import-", suffix=f".{format}", delete=False)
+    with spool:
+        shutil.copyfileobj(upload.file, spool, length=1024 * 1024)
+
+    job = ImportJob(filename=upload.filename, format=format, status="PENDING")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    _executor.submit(run_job, job.id, spool.name)
+    return job
+
+
+def job_status(job: ImportJob) -> dict:
+    return {
+        "job_id": job.id,
+        "filename": job.filename,
+        "format": job.format,
+        "status": job.status,
+        "rows_processed": job.rows_processed,
+        "rows_imported": job.rows_imported,
+        "rows_failed": job.rows_failed,
+        "errors": json.loads(job.errors) if job.errors else [],
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# -------------------------
+# Parsing
+# -------------------------
+def _read_rows(path: str, format: str):
+    with open(path, encoding="utf-8", newline="") as fh:
+        if format == "csv":
+            for n, row in enumerate(csv.DictReader(fh), start=1):
+                yield n, row
+        else:
+            for n, line in enumerate(fh, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield n, json.loads(line)
+                except ValueError as exc:
+                    yield n, exc
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ("0", "false", "no", "")
+
+
+def _parse_row(row: dict) -> tuple[dict, dict | None]:
+    """
+    Validate one input row into (product values, variant values or None).
+    Raises ValueError with a human readable message.
+    """
+    name = (row.get("name") or "").strip()
+    url = (row.get("url") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+    if not url:
+        raise ValueError("url is required")
+
+    product = {
+        "name": name,
+        "description": row.get("description"),
+        "product_type": row.get("product_type") or "physical",
+        "is_active": _to_bool(row.get("is_active", True)),
+        "url": url,
+    }
+
+    sku = (row.get("sku") or "").strip()
+    if not sku:
+        return product, None
+    try:
+        price = float(row.get("price"))
+    except (TypeError, ValueError):
+        raise ValueError("price must be a number when sku is given")
+    if price <= 0:
+        raise ValueError("price must be greater than 0")
+
+    variant = {
+        "sku": sku,
+        "price": price,
+        "size": row.get("size") or None,
+        "color": row.get("color") or None,
+        "weight": float(row.get("weight") or 0),
+        "is_active": _to_bool(row.get("variant_active", True)),
+        "url": url,  # resolved to product_id after the product upsert
+    }
+    return product, variant
+
+
+# -------------------------
+# Batched Upserts
+# -------------------------
+def _upsert_batch(db: Session, products: dict, variants: dict) -> list[int]:
+    insert = dialect_insert(db)
+
+    # Rows are passed as executemany parameters rather than .values(rows):
+    # the statement compiles once and is cached, and SQLAlchemy still sends
+    # multi-row INSERT ... RETURNING batches ("insertmanyvalues")
+    stmt = insert(Product)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Product.url],
+        set_={**{c: stmt.excluded[c] for c in PRODUCT_COLUMNS if c != "url"}, "version": Product.version + 1}
+    ).returning(Product.id, Product.url)
+    product_ids = {url: pid for pid, url in db.execute(stmt, list(products.values()))}
+
+    if not variants:
+        return list(product_ids.values())
+
+    rows = []
+    for variant in variants.values():
+        values = dict(variant)
+        values["product_id"] = product_ids[values.pop("url")]
+        rows.append(values)
+
+    # Products these skus move away from change as well
+    versions.bump_products(db, select(ProductVariant.product_id).where(ProductVariant.sku.in_(list(variants))))
+
+    stmt = insert(ProductVariant)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProductVariant.sku],
+        set_={c: stmt.excluded[c] for c in ("product_id", "price", "size", "color", "weight", "is_active")}
+    ).returning(ProductVariant.id)
+    variant_ids = [vid for (vid,) in db.execute(stmt, rows)]
+
+    fan_out_variants(db, variant_ids)
+    return list(product_ids.values())
+
+
+def _publish(db: Session, product_ids: set) -> None:
+    """
+    Make the imported products visible to the in-memory read paths.
+    """
+    product_cache.clear()
+    product_ids = sorted(product_ids)
+    for i in range(0, len(product_ids), IMPORT_PUBLISH_BATCH_SIZE):
+        chunk = product_ids[i:i + IMPORT_PUBLISH_BATCH_SIZE]
+        product_search.reindex(db, chunk)
+        facet_index.refresh_products(db, chunk)
+
+
+# -------------------------
+# Job Runner
+# -------------------------
+def run_job(job_id: int, path: str) -> None:
+    db = SessionLocal()
+    counts = {"processed": 0, "imported": 0, "failed": 0}
+    touched = set()  # product ids committed so far, published at the end
+    errors = []
+
+    def record_error(row_number, message):
+        counts["failed"] += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"row": row_number, "error": message})
+
+    def save_progress(job, **fields):
+        job.rows_processed = counts["processed"]
+        job.rows_imported = counts["imported"]
+        job.rows_failed = counts["failed"]
+        job.errors = json.dumps(errors) if errors else None
+        for key, value in fields.items():
+            setattr(job, key, value)
+        db.commit()
+
+    try:
+        job = db.get(ImportJob, job_id)
+        job.status = "RUNNING"
+        db.commit()
+        format = job.format
+
+        def flush(products, variants, row_numbers):
+            if not products:
+                return
+            product_ids = []
+            try:
+                product_ids = _upsert_batch(db, products, variants)
+                versions.bump(db, ["products", "product_variants"])
+                counts["imported"] += len(row_numbers)
+            except Exception as exc:
+                db.rollback()
+                for n in row_numbers:
+                    record_error(n, f"batch failed: {exc.__class__.__name__}: {exc}")
+            counts["processed"] += len(row_numbers)
+            # Progress is committed together with the batch it describes
+            save_progress(db.get(ImportJob, job_id))
+            touched.update(product_ids)
+
+        # Keyed by url / sku so a repeated key inside one batch collapses to
+        # its last occurrence (a multi-row upsert cannot touch a row twice)
+        products, variants, row_numbers = {}, {}, []
+        for n, row in _read_rows(path, format):
+            try:
+                if isinstance(row, Exception):
+                    raise ValueError(f"invalid JSON: {row}")
+                product, variant = _parse_row(row)
+            except ValueError as exc:
+                record_error(n, str(exc))
+                counts["processed"] += 1
+                continue
+
+            products[product["url"]] = product
+            if variant:
+                variants[variant["sku"]] = variant
+            row_numbers.append(n)
+
+            if len(row_numbers) >= IMPORT_BATCH_SIZE:
+                flush(products, variants, row_numbers)
+                products, variants, row_numbers = {}, {}, []
+
+        flush(products, variants, row_numbers)
+        _publish(db, touched)
+        save_progress(db.get(ImportJob, job_id), status="DONE", finished_at=datetime.utcnow())
+    except Exception as exc:
+        db.rollback()
+        record_error(None, str(exc))
+        job = db.get(ImportJob, job_id)
+        if job:
+            save_progress(job, status="FAILED", finished_at=datetime.utcnow())
+        print(f"⚠️ Product import {job_id} failed: {exc}")
+        # Batches committed before the failure are live in the database
+        try:
+            _publish(db, touched)
+        except Exception as exc:
+            print(f"⚠️ Product import {job_id}: refreshing the indexes failed: {exc}")
+    finally:
+        db.close()
+        os.unlink(path)
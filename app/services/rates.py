@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+
+from sqlalchemy.orm import Session
+
+from app.models import ShippingRate, TaxRule
+
+# In-memory copies of the tax_rules and shipping_rates tables so checkout and
+# quotes never query them per request. Tax is a hash by region; shipping keeps
+# per-country brackets sorted by min_weight for a binary search by weight.
+# Writes through the API rebuild the local copy and swap it in, so requests
+# never see an empty table; RATES_TTL bounds how long another worker's writes
+# take to show up.
+
+RATES_TTL = int(os.getenv("RATES_TTL", 300))
+
+
+class _RateTable(ABC):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._data = None
+        self._loaded_at = 0.0
+
+    @abstractmethod
+    def _build(self, db: Session):
+        """
+        Read the table into the structure the lookups use.
+        """
+
+    def load(self, db: Session) -> None:
+        # Built aside and swapped in; readers keep the old copy meanwhile
+        data = self._build(db)
+        with self._lock:
+            self._data = data
+            self._loaded_at = time.monotonic()
+
+    def _stale(self) -> bool:
+        return self._data is None or time.monotonic() - self._loaded_at > RATES_TTL
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self._stale():
+            return
+        with self._reload_lock:
+            if self._stale():  # another request may have reloaded while we waited
+                self.load(db)
+
+
+class TaxTable(_RateTable):
+    def _build(self, db: Session) -> dict:
+        rates = {}
+        rows = db.query(TaxRule.region, TaxRule.tax_percentage).filter(TaxRule.active == True)
+        for region, percentage in rows:
+            # Several active rules for one region stack (e.g. VAT + levy)
+            key = region.upper()
+            rates[key] = rates.get(key, 0) + percentage
+        return rates
+
+    def percentage(self, region: str | None) -> float:
+        if not region or not self._data:
+            return 0.0
+        return self._data.get(region.upper(), 0.0)
+
+    def tax(self, region: str | None, amount: float) -> float:
+        return round(amount * self.percentage(region) / 100, 2)
+
+
+class ShippingTable(_RateTable):
+    def _build(self, db: Session) -> dict:
+        rows = (
+            db.query(ShippingRate.country, ShippingRate.min_weight, ShippingRate.max_weight, ShippingRate.price)
+            .order_by(ShippingRate.country, ShippingRate.min_weight)
+            .all()
+        )
+        countries = {}  # country -> (min_weights, [(max_weight, price)])
+        for country, min_weight, max_weight, price in rows:
+            mins, brackets = countries.setdefault(country.upper(), ([], []))
+            mins.append(min_weight or 0)
+            brackets.append((max_weight, price))
+        return countries
+
+    def cost(self, country: str | None, weight: float) -> float | None:
+        """
+        Price of one shipment of `weight` to `country`, or None if no bracket matches.
+        """
+        if not country or not self._data:
+            return None
+        entry = self._data.get(country.upper())
+        if not entry:
+            return None
+        mins, brackets = entry
+        i = bisect_right(mins, weight) - 1
+        if i < 0:
+            return None
+        max_weight, price = brackets[i]
+        if max_weight is not None and weight > max_weight:
+            return None
+        return price
+
+
+tax_rates = TaxTable()
+shipping_rates = ShippingTable()
+
+
+def ensure_loaded(db: Session) -> None:
+    tax_rates.ensure_loaded(db)
+    shipping_rates.ensure_loaded(db)
@@ -0,0 +1,172 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import false, func, insert, text, update
+from sqlalchemy.orm import Session
+
+from app.models import Inventory, StockHold
+from app.services.housekeeping import delete_in_batches, start_sweeper
+
+# Cart stock holds. Adding to a cart appends a row to stock_holds instead of
+# touching the (hot) Inventory row; holds stop counting once expires_at has
+# passed and are physically removed later by the batched sweeper.
+
+HOLD_TTL_SECONDS = int(os.getenv("HOLD_TTL_SECONDS", 900))
+HOLD_SWEEP_INTERVAL = int(os.getenv("HOLD_SWEEP_INTERVAL", 60))
+HOLD_SWEEP_BATCH = int(os.getenv("HOLD_SWEEP_BATCH", 1000))
+
+# First key of the two-key advisory locks, so variant ids cannot collide
+# with other users of pg_advisory_xact_lock
+_HOLD_LOCK_NAMESPACE = 7_240_002
+
+
+# -------------------------
+# Availability
+# -------------------------
+def on_hand(db: Session, variant_ids) -> dict:
+    """
+    Total quantity across warehouses per variant.
+    """
+    rows = (
+        db.query(Inventory.product_variant_id, func.coalesce(func.sum(Inventory.quantity), 0))
+        .filter(Inventory.product_variant_id.in_(variant_ids))
+        .group_by(Inventory.product_variant_id)
+        .all()
+    )
+    return dict(rows)
+
+
+def held(db: Session, variant_ids, exclude_cart_id: int | None = None) -> dict:
+    """
+    Active (unexpired) held quantity per variant, optionally ignoring one cart.
+    """
+    query = (
+        db.query(StockHold.product_variant_id, func.sum(StockHold.quantity))
+        .filter(
+            StockHold.product_variant_id.in_(variant_ids),
+            StockHold.expires_at > datetime.utcnow()
+        )
+    )
+    if exclude_cart_id is not None:
+        query = query.filter(StockHold.cart_id != exclude_cart_id)
+    return dict(query.group_by(StockHold.product_variant_id).all())
+
+
+def available(db: Session, variant_ids, exclude_cart_id: int | None = None) -> dict:
+    """
+    Sellable quantity per variant: on hand minus other carts' active holds.
+    """
+    stock = on_hand(db, variant_ids)
+    holds = held(db, variant_ids, exclude_cart_id)
+    return {vid: stock.get(vid, 0) - holds.get(vid, 0) for vid in variant_ids}
+
+
+# -------------------------
+# Placing / Releasing Holds
+# -------------------------
+def lock_variants(db: Session, variant_ids) -> None:
+    """
+    Serialize availability checks per variant until the transaction ends, so
+    two carts cannot both see the last unit as free and both hold it. Takes
+    Postgres advisory locks in variant order (no deadlocks).
+    """
+    if db.bind.dialect.name != "postgresql":
+        # SQLite has a single, database-wide write lock; any write statement
+        # takes it, even one matching no rows, and holds it until commit
+        db.execute(
+            update(StockHold).where(false()).values(quantity=StockHold.quantity)
+            .execution_options(synchronize_session=False)
+        )
+        return
+    for variant_id in sorted(set(variant_ids)):
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(:ns, :id)"),
+            {"ns": _HOLD_LOCK_NAMESPACE, "id": variant_id}
+        )
+
+
+def place_hold(db: Session, cart_id: int, variant_id: int, quantity: int, cart_total: int) -> None:
+    """
+    Hold `quantity` more units of a variant for a cart whose line will then
+    total `cart_total`. Extends the cart's other holds to the same expiry.
+    """
+    lock_variants(db, [variant_id])
+    free = available(db, [variant_id], exclude_cart_id=cart_id)[variant_id]
+    if free < cart_total:
+        raise HTTPException(400, {
+            "message": "Not enough stock",
+            "shortages": [{"product_variant_id": variant_id, "requested": cart_total, "available": max(free, 0)}]
+        })
+
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=HOLD_TTL_SECONDS)
+    db.execute(
+        update(StockHold)
+        .where(StockHold.cart_id == cart_id, StockHold.expires_at > now)
+        .values(expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(insert(StockHold).values(
+        cart_id=cart_id,
+        product_variant_id=variant_id,
+        quantity=quantity,
+        expires_at=expires_at
+    ))
+
+
+def cart_holds(db: Session, cart_id: int) -> dict:
+    """
+    Active held quantity per variant for one cart.
+    """
+    rows = (
+        db.query(StockHold.product_variant_id, func.sum(StockHold.quantity))
+        .filter(StockHold.cart_id == cart_id, StockHold.expires_at > datetime.utcnow())
+        .group_by(StockHold.product_variant_id)
+        .all()
+    )
+    return dict(rows)
+
+
+def check_checkout(db: Session, cart_id: int, needed: dict) -> None:
+    """
+    Lines still covered by this cart's holds go through; lines whose hold has
+    lapsed must fit in what other carts are not holding.
+    """
+    mine = cart_holds(db, cart_id)
+    lapsed = [vid for vid, qty in needed.items() if mine.get(vid, 0) < qty]
+    if not lapsed:
+        return
+
+    lock_variants(db, lapsed)
+    free = available(db, lapsed, exclude_cart_id=cart_id)
+    shortages = [
+        {"product_variant_id": vid, "requested": needed[vid], "available": max(free[vid], 0)}
+        for vid in lapsed if free[vid] < needed[vid]
+    ]
+    if shortages:
+        raise HTTPException(400, {"message": "Not enough stock", "shortages": shortages})
+
+
+def release_holds(db: Session, cart_id: int) -> None:
+    db.query(StockHold).filter(StockHold.cart_id == cart_id).delete(synchronize_session=False)
+
+
+# -------------------------
+# Sweeper
+# -------------------------
+def purge_expired_holds(db: Session, batch_size: int = HOLD_SWEEP_BATCH) -> int:
+    """
+    Delete expired holds in batches of `batch_size`. Returns rows removed.
+    """
+    return delete_in_batches(db, StockHold, StockHold.expires_at <= datetime.utcnow(), batch_size)
+
+
+def _sweep(db: Session) -> str | None:
+    removed = purge_expired_holds(db)
+    return f"Purged {removed} expired stock holds" if removed else None
+
+
+def start_hold_sweeper() -> threading.Thread:
+    return start_sweeper("stock-hold-sweeper", HOLD_SWEEP_INTERVAL, _sweep)
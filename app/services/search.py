@@ -0,0 +1,356 @@
+import math
+import os
+import re
+import threading
+import time
+from itertools import groupby, islice
+
+import numpy as np
+from sortedcontainers import SortedList
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Product, ProductVariant
+
+# In-process inverted index over active products: name, description and the
+# variants' sku / color / size. Terms are weighted per field, ranked with
+# BM25, and the last query word is prefix-expanded for typeahead against a
+# SortedList vocabulary (O(log V) inserts and removals). The index is built
+# in a background thread at startup, kept current by the product endpoints,
+# and fully rebuilt every SEARCH_REBUILD_INTERVAL seconds to pick up writes
+# made by other workers. Scoring is vectorised with NumPy; postings of common
+# terms are kept as compiled arrays, patched with the docs written since and
+# recompiled once those reach an eighth of the posting.
+
+SEARCH_REBUILD_INTERVAL = int(os.getenv("SEARCH_REBUILD_INTERVAL", 600))
+SEARCH_BATCH_SIZE = int(os.getenv("SEARCH_BATCH_SIZE", 5000))
+PREFIX_EXPANSIONS = int(os.getenv("SEARCH_PREFIX_EXPANSIONS", 50))
+COMPILE_MIN_POSTINGS = int(os.getenv("SEARCH_COMPILE_MIN_POSTINGS", 1000))  # smaller ones are converted per query
+
+FIELD_WEIGHTS = {"name": 3.0, "sku": 2.0, "description": 1.0, "color": 1.0, "size": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text) -> list[str]:
+    return _TOKEN.findall(str(text).lower()) if text else []
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.postings = {}   # term -> {product_id: weighted tf}
+        self.terms = SortedList()  # vocabulary, for prefix lookups
+        self._new_terms = []       # bulk build: merged into terms by finish_bulk()
+        self.doc_len = {}    # product_id -> weighted length
+        self.doc_terms = {}  # product_id -> terms (for removal)
+        self.docs = {}       # product_id -> (name, url) for result display
+        self.total_len = 0.0
+        self._lengths = np.zeros(0)  # doc_len as a dense array by product id, for vectorised scoring
+        self._compiled = {}  # term -> (product ids, tfs) arrays of its posting as last compiled
+        self._dirty = {}     # term -> product ids written since it was compiled
+
+    # ---------- writes ----------
+    def add(self, product_id: int, name, url, description, variants=(), keep_sorted: bool = True) -> None:
+        """
+        (Re)index one product. variants: iterable of (sku, color, size).
+        Bulk builds pass keep_sorted=False and call finish_bulk() at the end.
+        """
+        weights = {}
+        fields = [("name", name), ("description", description)]
+        for sku, color, size in variants:
+            fields += [("sku", sku), ("color", color), ("size", size)]
+        for field, text in fields:
+            for term in tokenize(text):
+                weights[term] = weights.get(term, 0.0) + FIELD_WEIGHTS[field]
+
+        with self._lock:
+            self.remove(product_id)
+            for term, weight in weights.items():
+                self._touch(term, product_id)
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = {}
+                    if keep_sorted:
+                        self.terms.add(term)
+                    else:
+                        self._new_terms.append(term)
+                posting[product_id] = weight
+            length = sum(weights.values())
+            self.doc_len[product_id] = length
+            if product_id >= len(self._lengths):
+                grown = np.zeros(max(product_id + 1, 2 * len(self._lengths), 1024))
+                grown[:len(self._lengths)] = self._lengths
+                self._lengths = grown
+            self._lengths[product_id] = length
+            self.doc_terms[product_id] = tuple(weights)
+            self.docs[product_id] = (name, url)
+            self.total_len += length
+
+    def remove(self, product_id: int) -> None:
+        with self._lock:
+            terms = self.doc_terms.pop(product_id, None)
+            if terms is None:
+                return
+            for term in terms:
+                self._touch(term, product_id)
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(product_id, None)
+                    if not posting:
+                        del self.postings[term]
+                        self._compiled.pop(term, None)
+                        self._dirty.pop(term, None)
+                        self.terms.discard(term)
+            self.total_len -= self.doc_len.pop(product_id, 0.0)
+            self._lengths[product_id] = 0.0
+            self.docs.pop(product_id, None)
+
+    def _touch(self, term: str, product_id: int) -> None:
+        if term in self._compiled:
+            self._dirty.setdefault(term, set()).add(product_id)
+
+    def finish_bulk(self) -> None:
+        with self._lock:
+            # One sort for the whole build; skip terms whose postings emptied since
+            self.terms.update(t for t in set(self._new_terms) if t in self.postings)
+            self._new_terms = []
+            # Compile common terms now rather than in the first query for each
+            for term, posting in self.postings.items():
+                if len(posting) >= COMPILE_MIN_POSTINGS:
+                    self._arrays(term)
+
+    # ---------- reads ----------
+    def _expand(self, prefix: str) -> list[str]:
+        # Terms sharing the prefix sort together, right from the prefix itself
+        out = []
+        for term in islice(self.terms.irange(minimum=prefix), PREFIX_EXPANSIONS):
+            if not term.startswith(prefix):
+                break
+            out.append(term)
+        return out
+
+    def _arrays(self, term: str):
+        arrays = self._compiled.get(term)
+        dirty = self._dirty.get(term)
+        if arrays is not None and dirty and len(dirty) * 8 < len(arrays[0]):
+            # Patch the few docs written since compiling instead of recompiling
+            posting = self.postings[term]
+            changed = np.zeros(len(self._lengths), dtype=bool)
+            changed[np.fromiter(dirty, dtype=np.int64, count=len(dirty))] = True
+            keep = ~changed[arrays[0]]
+            live = [doc for doc in dirty if doc in posting]
+            return (
+                np.concatenate([arrays[0][keep], np.array(live, dtype=np.int64)]),
+                np.concatenate([arrays[1][keep], np.array([posting[doc] for doc in live], dtype=np.float64)]),
+            )
+        if arrays is None or dirty:
+            posting = self.postings.get(term, {})
+            n = len(posting)
+            arrays = (
+                np.fromiter(posting.keys(), dtype=np.int64, count=n),
+                np.fromiter(posting.values(), dtype=np.float64, count=n),
+            )
+            if n >= COMPILE_MIN_POSTINGS:
+                self._compiled[term] = arrays
+            else:
+                self._compiled.pop(term, None)
+            self._dirty.pop(term, None)
+        return arrays
+
+    def _term_scores(self, terms: list[str]):
+        """
+        (product ids, BM25 scores) over `terms`; a doc matching several
+        expansions of one prefix keeps its best score.
+        """
+        n = len(self.doc_len)
+        avg_len = self.total_len / n if n else 1.0
+        scored = []
+        for term in terms:
+            docs, tf = self._arrays(term)
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[docs] / avg_len)
+            scored.append((docs, idf * tf * (BM25_K1 + 1) / norm))
+        if len(scored) <= 1:
+            return scored[0] if scored else (np.empty(0, dtype=np.int64), np.empty(0))
+        docs = np.concatenate([d for d, _ in scored])
+        scores = np.concatenate([s for _, s in scored])
+        if self._dense(len(docs)):
+            # Scatter-max into a dense array: linear however many postings (BM25 scores are > 0)
+            best = np.zeros(len(self._lengths))
+            for d, s in scored:
+                best[d] = np.maximum(best[d], s)
+            docs = np.flatnonzero(best)
+            return docs, best[docs]
+        # Sort by doc, best score first, and keep each doc's first entry
+        order = np.lexsort((-scores, docs))
+        docs, scores = docs[order], scores[order]
+        first = np.ones(len(docs), dtype=bool)
+        first[1:] = docs[1:] != docs[:-1]
+        return docs[first], scores[first]
+
+    def _dense(self, n: int) -> bool:
+        # A dense array by product id beats sorting once n is a sizeable share of the ids
+        return n * 16 >= len(self._lengths)
+
+    def search(self, query: str, limit: int = 20, prefix: bool = True) -> list[dict]:
+        """
+        Products matching every query word (the last one as a prefix when
+        `prefix` is set), best BM25 score first.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            per_token = []
+            for i, token in enumerate(tokens):
+                is_last = i == len(tokens) - 1
+                terms = self._expand(token) if prefix and is_last else [token]
+                per_token.append(self._term_scores(terms))
+
+            # AND: look the rarest word's docs up in each other word's scores
+            per_token.sort(key=lambda scored: len(scored[0]))
+            docs, scores = per_token[0]
+            for other_docs, other_scores in per_token[1:]:
+                if self._dense(len(other_docs)):
+                    dense = np.zeros(len(self._lengths))
+                    dense[other_docs] = other_scores
+                    theirs = dense[docs]
+                    matched = theirs > 0
+                    docs, scores = docs[matched], scores[matched] + theirs[matched]
+                else:
+                    _, mine, theirs = np.intersect1d(docs, other_docs, assume_unique=True, return_indices=True)
+                    docs, scores = docs[mine], scores[mine] + other_scores[theirs]
+                if not len(docs):
+                    return []
+
+            if len(docs) > limit:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+                docs, scores = docs[top], scores[top]
+            best = np.lexsort((docs, -scores))
+            return [
+                {"id": doc, "name": self.docs[doc][0], "url": self.docs[doc][1], "score": round(score, 4)}
+                for doc, score in zip(docs[best].tolist(), scores[best].tolist())
+            ]
+
+    def stats(self) -> dict:
+        return {"documents": len(self.doc_len), "terms": len(self.postings)}
+
+
+# -------------------------
+# Building / Maintenance
+# -------------------------
+class SearchService:
+    def __init__(self):
+        self.index = SearchIndex()
+        self.ready = False
+        self.built_at = None
+        self.build_seconds = None
+        self._rebuilding = False
+        self._touched = set()  # products changed while a rebuild was running
+        self._lock = threading.Lock()
+
+    def _build(self) -> SearchIndex:
+        index = SearchIndex()
+        stmt = (
+            select(
+                Product.id, Product.name, Product.url, Product.description,
+                ProductVariant.sku, ProductVariant.color, ProductVariant.size
+            )
+            .outerjoin(ProductVariant, ProductVariant.product_id == Product.id)
+            .where(Product.is_active == True)
+            .order_by(Product.id)
+        )
+        db = SessionLocal()
+        try:
+            rows = db.execute(stmt, execution_options={"yield_per": SEARCH_BATCH_SIZE})
+            for product_id, group in groupby(rows, key=lambda r: r[0]):
+                group = list(group)
+                first = group[0]
+                variants = [(r[4], r[5], r[6]) for r in group if r[4] is not None]
+                index.add(product_id, first[1], first[2], first[3], variants, keep_sorted=False)
+        finally:
+            db.close()
+        index.finish_bulk()
+        return index
+
+    def rebuild(self) -> None:
+        start = time.perf_counter()
+        with self._lock:
+            self._rebuilding = True
+            self._touched = set()
+        index = self._build()
+        with self._lock:
+            self.index = index
+            self._rebuilding = False
+            touched, self._touched = self._touched, set()
+        if touched:
+            db = SessionLocal()
+            try:
+                self.reindex(db, touched)
+            finally:
+                db.close()
+        self.ready = True
+        self.built_at = time.time()
+        self.build_seconds = round(time.perf_counter() - start, 3)
+
+    def reindex(self, db: Session, product_ids) -> None:
+        """
+        Refresh the given products from the database (removing deleted or
+        inactive ones). Call after product / variant writes.
+        """
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with self._lock:
+            if self._rebuilding:
+                self._touched.update(product_ids)
+        rows = (
+            db.query(
+                Product.id, Product.name, Product.url, Product.description, Product.is_active,
+                ProductVariant.sku, ProductVariant.color, ProductVariant.size
+            )
+            .outerjoin(ProductVariant, ProductVariant.product_id == Product.id)
+            .filter(Product.id.in_(product_ids))
+            .order_by(Product.id)
+            .all()
+        )
+        seen = set()
+        for product_id, group in groupby(rows, key=lambda r: r[0]):
+            group = list(group)
+            first = group[0]
+            seen.add(product_id)
+            if not first[4]:
+                self.index.remove(product_id)
+                continue
+            variants = [(r[5], r[6], r[7]) for r in group if r[5] is not None]
+            self.index.add(product_id, first[1], first[2], first[3], variants)
+        for product_id in set(product_ids) - seen:
+            self.index.remove(product_id)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds,
+            **self.index.stats(),
+        }
+
+    def _run_forever(self):
+        while True:
+            try:
+                self.rebuild()
+            except Exception as exc:
+                print(f"⚠️ Search index build failed: {exc}")
+            time.sleep(SEARCH_REBUILD_INTERVAL)
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self._run_forever, name="search-indexer", daemon=True)
+        thread.start()
+        return thread
+
+
+product_search = SearchService()
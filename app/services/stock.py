@@ -0,0 +1,89 @@
+from fastapi import HTTPException
+from sqlalchemy import case, insert, update
+from sqlalchemy.orm import Session
+
+from app.models import Inventory, OrderItem
+
+# Set-based stock handling for checkout: one locking read and one
+# conditional update per warehouse, however many lines the order has.
+
+
+def lock_inventory(db: Session, warehouse_id: int, variant_ids) -> dict:
+    """
+    SELECT ... FOR UPDATE every inventory row for the given variants in one
+    warehouse. Rows are locked in variant order so concurrent checkouts
+    touching the same SKUs cannot deadlock.
+    """
+    rows = (
+        db.query(Inventory)
+        .filter(
+            Inventory.warehouse_id == warehouse_id,
+            Inventory.product_variant_id.in_(variant_ids)
+        )
+        .order_by(Inventory.product_variant_id)
+        .with_for_update()
+        .populate_existing()
+        .all()
+    )
+    return {inv.product_variant_id: inv for inv in rows}
+
+
+def find_shortages(locked: dict, needed: dict) -> list[dict]:
+    """
+    Per-line shortage report for quantities that the locked rows cannot cover.
+    """
+    shortages = []
+    for variant_id, qty in needed.items():
+        inv = locked.get(variant_id)
+        available = inv.quantity if inv else 0
+        if available < qty:
+            shortages.append({
+                "product_variant_id": variant_id,
+                "requested": qty,
+                "available": available,
+            })
+    return shortages
+
+
+def deduct_stock(db: Session, warehouse_id: int, needed: dict) -> None:
+    """
+    Decrement all lines in a single UPDATE. Each row is only touched when it
+    still holds enough stock; if any row is skipped the whole checkout fails.
+    """
+    delta = case(needed, value=Inventory.product_variant_id)
+    result = db.execute(
+        update(Inventory)
+        .where(
+            Inventory.warehouse_id == warehouse_id,
+            Inventory.product_variant_id.in_(list(needed)),
+            Inventory.quantity >= delta
+        )
+        .values(quantity=Inventory.quantity - delta)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(needed):
+        raise HTTPException(409, "Stock changed during checkout, please retry")
+
+
+def reserve_stock(db: Session, warehouse_id: int, needed: dict) -> None:
+    """
+    Lock, validate and deduct stock for {variant_id: quantity} in one warehouse.
+    Raises 400 with a per-line shortage report if anything is short; the
+    caller owns the transaction and rolls it back.
+    """
+    if not warehouse_id:
+        raise HTTPException(400, "warehouse_id is required")
+
+    locked = lock_inventory(db, warehouse_id, list(needed))
+    shortages = find_shortages(locked, needed)
+    if shortages:
+        raise HTTPException(400, {"message": "Not enough stock", "shortages": shortages})
+
+    deduct_stock(db, warehouse_id, needed)
+
+
+def add_order_items(db: Session, order_id: int, lines: list[dict]) -> None:
+    """
+    Bulk insert order lines ({product_variant_id, quantity, price}).
+    """
+    db.execute(insert(OrderItem), [{"order_id": order_id, **line} for line in lines])
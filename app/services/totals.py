@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+
+# Array-based basket maths. Line totals, discounts, tax and grand totals are
+# computed with NumPy over whole baskets, and over many carts at once via
+# bincount, instead of Python loops.
+#
+# Discount stacking is deterministic: percentage discounts first, then tiered,
+# then fixed, ties broken by discount id. Each discount applies to what the
+# previous ones left, and a basket never goes below zero.
+
+
+def parse_tiers(spec: str) -> list[tuple[float, float]]:
+    """
+    "1000:5,5000:10" -> [(0, 0), (1000, 5), (5000, 10)], sorted by threshold.
+    """
+    tiers = {0.0: 0.0}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        threshold, percent = part.split(":")
+        tiers[float(threshold)] = float(percent)
+    return sorted(tiers.items())
+
+
+# Tiered discounts: "minimum subtotal:percentage off" pairs, capped per
+# discount at Discount.value
+DISCOUNT_TIERS = parse_tiers(os.getenv("DISCOUNT_TIERS", "1000:5,5000:10,10000:15"))
+_TIER_THRESHOLDS = np.array([t for t, _ in DISCOUNT_TIERS], dtype=float)
+_TIER_PERCENTS = np.array([p for _, p in DISCOUNT_TIERS], dtype=float)
+
+_STACK_ORDER = {"percentage": 0, "tiered": 1, "fixed": 2}
+
+
+def stack(discounts: list[dict]) -> list[dict]:
+    """
+    Order discount snapshots ({"discount_id", "type", "value"}) for stacking.
+    """
+    return sorted(discounts, key=lambda d: (_STACK_ORDER.get(d["type"], 3), d["discount_id"] or 0))
+
+
+def tier_percent(amounts: np.ndarray) -> np.ndarray:
+    idx = np.searchsorted(_TIER_THRESHOLDS, amounts, side="right") - 1
+    return np.where(idx >= 0, _TIER_PERCENTS[np.clip(idx, 0, None)], 0.0)
+
+
+def apply_discounts(subtotals: np.ndarray, discounts: list[dict]) -> np.ndarray:
+    """
+    Total discount per basket for an array of subtotals sharing one set of
+    discounts.
+    """
+    subtotals = np.asarray(subtotals, dtype=float)
+    remaining = subtotals.copy()
+    for d in stack(discounts):
+        value = float(d["value"] or 0)
+        if d["type"] == "percentage":
+            off = remaining * value / 100
+        elif d["type"] == "fixed":
+            off = np.full_like(remaining, value)
+        elif d["type"] == "tiered":
+            off = np.minimum(remaining * tier_percent(remaining) / 100, value)
+        else:
+            continue
+        remaining -= np.clip(off, 0, remaining)
+    return np.round(subtotals - remaining, 2)
+
+
+def basket_totals(prices, quantities, discounts: list[dict], tax_percent: float = 0, shipping: float = 0) -> dict:
+    """
+    Totals for one basket given per-line unit prices and quantities.
+    """
+    line_totals = np.asarray(prices, dtype=float) * np.asarray(quantities, dtype=float)
+    subtotal = round(float(line_totals.sum()), 2)
+    discount = float(apply_discounts(np.array([subtotal]), discounts)[0])
+    tax = round((subtotal - discount) * tax_percent / 100, 2)
+    return {
+        "line_totals": np.round(line_totals, 2).tolist(),
+        "subtotal": subtotal,
+        "discount": discount,
+        "tax": tax,
+        "shipping": shipping,
+        "total": round(subtotal - discount + tax + shipping, 2),
+    }
+
+
+def many_subtotals(basket_index, prices, quantities, n_baskets: int) -> np.ndarray:
+    """
+    Subtotal per basket for flat line arrays, where basket_index[i] says
+    which basket line i belongs to (0..n_baskets-1).
+    """
+    line_totals = np.asarray(prices, dtype=float) * np.asarray(quantities, dtype=float)
+    return np.round(np.bincount(np.asarray(basket_index), weights=line_totals, minlength=n_baskets), 2)
+
+
+def many_totals(basket_index, prices, quantities, n_baskets: int, discounts: list[dict], tax_percent=0.0) -> dict:
+    """
+    Subtotal, discount, tax and total arrays for many baskets at once.
+    tax_percent may be a scalar or one value per basket.
+    """
+    subtotals = many_subtotals(basket_index, prices, quantities, n_baskets)
+    discount = apply_discounts(subtotals, discounts)
+    tax = np.round((subtotals - discount) * np.asarray(tax_percent, dtype=float) / 100, 2)
+    return {
+        "subtotal": subtotals,
+        "discount": discount,
+        "tax": tax,
+        "total": np.round(subtotals - discount + tax, 2),
+    }
@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+import zlib
+
+from fastapi import Request, Response
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, dialect_insert
+from app.models import Product, ProductVariant, TableVersion
+
+# Per-table change counters behind the ETags of reference-data endpoints.
+# Any ORM flush touching a tracked table bumps its counter in the same
+# transaction. Readers use an in-process copy refreshed at most every
+# VERSION_TTL seconds (and right after this worker commits a change), so a
+# matching If-None-Match is answered with 304 without touching the database.
+# Single products carry their own products.version, bumped the same way by
+# writes to the product or its variants, so a write to one product leaves
+# every other product's cache entry and ETag valid.
+
+VERSION_TTL = float(os.getenv("VERSION_TTL", 2))
+REFERENCE_MAX_AGE = int(os.getenv("REFERENCE_MAX_AGE", 60))
+
+TRACKED_TABLES = {"products", "product_variants", "categories", "warehouses", "tax_rules", "discounts"}
+
+_lock = threading.Lock()
+_versions = {}
+_loaded_at = 0.0
+
+
+# -------------------------
+# Writing
+# -------------------------
+def bump(db: Session, tables) -> None:
+    """
+    Increment the counters for `tables` inside the caller's transaction.
+    Needed explicitly only for Core/bulk statements; ORM writes are tracked
+    by the flush hook below.
+    """
+    tables = sorted(set(tables) & TRACKED_TABLES)
+    if not tables:
+        return
+    insert = dialect_insert(db)
+    stmt = insert(TableVersion).values([{"table_name": t, "version": 1} for t in tables])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TableVersion.table_name],
+        set_={"version": TableVersion.version + 1}
+    )
+    db.connection().execute(stmt)
+    db.info["versions_bumped"] = True
+
+
+def bump_products(db: Session, product_ids) -> None:
+    """
+    Increment products.version for `product_ids` (a list or a select of
+    ids) inside the caller's transaction. Like bump(), needed explicitly
+    only for Core/bulk statements.
+    """
+    db.connection().execute(
+        update(Product.__table__)
+        .where(Product.__table__.c.id.in_(product_ids))
+        .values(version=Product.__table__.c.version + 1)
+    )
+
+
+def _touched_products(session) -> set:
+    product_ids = set()
+    for obj in session.dirty:
+        if isinstance(obj, Product) and session.is_modified(obj):
+            product_ids.add(obj.id)
+    for obj in list(session.new) + list(session.deleted) + list(session.dirty):
+        if isinstance(obj, ProductVariant) and (obj not in session.dirty or session.is_modified(obj)):
+            product_ids.add(obj.product_id)
+            # A variant moved to another product changes the old one too
+            product_ids.update(inspect(obj).attrs.product_id.history.deleted)
+    product_ids.discard(None)
+    return product_ids
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_on_flush(session, flush_context):
+    touched = set()
+    for obj in list(session.new) + list(session.deleted):
+        touched.add(obj.__table__.name)
+    for obj in session.dirty:
+        if session.is_modified(obj):
+            touched.add(obj.__table__.name)
+    if touched & TRACKED_TABLES:
+        bump(session, touched)
+    if touched & {"products", "product_variants"}:
+        product_ids = _touched_products(session)
+        if product_ids:
+            bump_products(session, list(product_ids))
+
+
+@event.listens_for(Session, "after_commit")
+def _expire_on_commit(session):
+    global _loaded_at
+    if session.info.pop("versions_bumped", False):
+        _loaded_at = 0.0
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop("versions_bumped", None)
+
+
+# -------------------------
+# Reading
+# -------------------------
+def current() -> dict:
+    global _versions, _loaded_at
+    if time.monotonic() - _loaded_at > VERSION_TTL:
+        db = SessionLocal()
+        try:
+            rows = dict(db.query(TableVersion.table_name, TableVersion.version).all())
+        finally:
+            db.close()
+        with _lock:
+            _versions = rows
+            _loaded_at = time.monotonic()
+    return _versions
+
+
+def stamp(*tables) -> tuple:
+    """
+    Current version of each of `tables`, e.g. for cache keys.
+    """
+    versions = current()
+    return tuple(versions.get(t, 0) for t in tables)
+
+
+def _table_tag(tables) -> str:
+    return ".".join(str(v) for v in stamp(*tables))
+
+
+def etag_for(request: Request, tables) -> str:
+    return _etag(request, _table_tag(tables))
+
+
+def _etag(request: Request, tag: str) -> str:
+    # Different query strings (filters, cursors) are different representations
+    variant = zlib.crc32(str(request.url.query).encode())
+    return f'W/"{tag}-{variant:x}"'
+
+
+def not_modified(request: Request, response: Response, *tables, max_age: int = REFERENCE_MAX_AGE):
+    """
+    Stamp the response with ETag / Cache-Control for `tables`. Returns a 304
+    response when the client's If-None-Match already matches, else None.
+    """
+    return not_modified_as(request, response, _table_tag(tables), max_age=max_age)
+
+
+def not_modified_as(request: Request, response: Response, tag: str, max_age: int = REFERENCE_MAX_AGE):
+    """
+    not_modified() for a representation versioned by its own `tag` (e.g.
+    one product's version) rather than by table stamps.
+    """
+    etag = _etag(request, tag)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    candidates = request.headers.get("if-none-match", "")
+    if etag in [c.strip() for c in candidates.split(",")] or candidates.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
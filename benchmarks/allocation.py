@@ -0,0 +1,70 @@
+"""
+Warehouse allocation latency at catalogue scale.
+
+Builds an AvailabilityIndex of 10k variants stocked across 50 warehouses
+(each variant in a random subset) and times allocate() for random carts.
+Allocation runs entirely in memory, so no database is needed.
+
+    python -m benchmarks.allocation --variants 10000 --warehouses 50 --carts 5000
+"""
+import argparse
+import random
+import statistics
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", type=int, default=10000)
+    parser.add_argument("--warehouses", type=int, default=50)
+    parser.add_argument("--carts", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    from fastapi import HTTPException
+
+    from app.services.allocation import AvailabilityIndex
+    from app.services.rates import shipping_rates
+
+    # Three weight brackets for one destination, so split plans are priced
+    shipping_rates._data = {"KE": ([0, 5, 20], [(5, 200.0), (20, 450.0), (None, 900.0)])}
+
+    index = AvailabilityIndex()
+    index._stock = {
+        vid: {wh: rng.randint(1, 20) for wh in rng.sample(range(1, args.warehouses + 1), rng.randint(1, 15))}
+        for vid in range(1, args.variants + 1)
+    }
+    weights = {vid: rng.uniform(0.1, 3.0) for vid in index._stock}
+
+    for lines in (1, 5, 20):
+        carts = [
+            {vid: rng.randint(1, 4) for vid in rng.sample(range(1, args.variants + 1), lines)}
+            for _ in range(args.carts)
+        ]
+        timings, shipments, short = [], [], 0
+        for needed in carts:
+            start = time.perf_counter()
+            try:
+                plan = index.allocate(needed, weights, "KE")
+            except HTTPException:
+                short += 1
+                continue
+            finally:
+                timings.append(time.perf_counter() - start)
+            shipments.append(len(plan))
+
+        timings.sort()
+        print(
+            f"{lines:>2} lines: p50 {statistics.median(timings) * 1e6:7.1f}us  "
+            f"p99 {timings[int(len(timings) * 0.99) - 1] * 1e6:7.1f}us  "
+            f"shipments/cart {statistics.mean(shipments):.2f}  short {short}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Login throughput and latency while a registration storm saturates the
+password pool.
+
+A fixed set of users logs in continuously; midway through, a burst of
+concurrent registrations (each an Argon2 hash) starts. Login p50/p99, the
+share of 503s and the storm's own outcome are reported for the quiet and the
+stormy phase. Requests are driven in-process through httpx's ASGI transport.
+
+    python -m benchmarks.auth_storm --users 20 --logins 400 --registrations 400
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=300, help="logins per phase")
+    parser.add_argument("--login-concurrency", type=int, default=4)
+    parser.add_argument("--registrations", type=int, default=300)
+    parser.add_argument("--registration-concurrency", type=int, default=100)
+    return parser.parse_args()
+
+
+def summarize(name: str, results: list, elapsed: float) -> None:
+    ok = sorted(latency for status, latency in results if status == 200)
+    busy = sum(1 for status, _ in results if status == 503)
+    line = f"  {name:<13} {len(ok) / elapsed:7.1f} ok/s  503s {busy:>4}/{len(results)}"
+    if ok:
+        p99 = ok[max(int(len(ok) * 0.99) - 1, 0)]
+        line += f"  p50 {statistics.median(ok) * 1000:7.1f}ms  p99 {p99 * 1000:7.1f}ms"
+    print(line)
+
+
+async def burst(client, count: int, concurrency: int, request) -> list:
+    gate = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one(n):
+        async with gate:
+            start = time.perf_counter()
+            response = await request(client, n)
+            results.append((response.status_code, time.perf_counter() - start))
+
+    await asyncio.gather(*[one(n) for n in range(count)])
+    return results
+
+
+def main():
+    args = parse_args()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+
+    from fastapi import FastAPI
+    from httpx import ASGITransport, AsyncClient
+
+    from app.database import Base, engine
+    from app.migrations import run_migrations
+    from app.routes import auth
+
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    app = FastAPI()
+    app.include_router(auth.router)
+    run = uuid.uuid4().hex[:8]
+    password = "correct-horse-battery"
+
+    def login(client, n):
+        return client.post("/auth/login", json={"email": f"user{n % args.users}-{run}@example.com", "password": password})
+
+    def register(client, n):
+        return client.post("/auth/register", json={"email": f"storm{n}-{run}@example.com", "password": password})
+
+    async def scenario():
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+            for n in range(args.users):
+                response = await client.post("/auth/register", json={"email": f"user{n}-{run}@example.com", "password": password})
+                response.raise_for_status()
+
+            start = time.perf_counter()
+            quiet = await burst(client, args.logins, args.login_concurrency, login)
+            summarize("login, quiet", quiet, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            stormy, storm = await asyncio.gather(
+                burst(client, args.logins, args.login_concurrency, login),
+                burst(client, args.registrations, args.registration_concurrency, register),
+            )
+            elapsed = time.perf_counter() - start
+            summarize("login, storm", stormy, elapsed)
+            summarize("registration", storm, elapsed)
+
+    from app.auth import PASSWORD_MAX_PENDING, PASSWORD_WORKERS
+    print(f"password pool: {PASSWORD_WORKERS} workers, {PASSWORD_MAX_PENDING} pending max")
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Concurrency of the sync cart router versus the DB_ASYNC=true router.
+
+Each simulated shopper creates a cart (POST /cart/items) and reads it back
+(GET /cart/items). Requests are driven in-process through httpx's ASGI
+transport, so the sync router is bounded by the threadpool exactly as under
+uvicorn, without network noise.
+
+    python -m benchmarks.cart_sync_vs_async --shoppers 500 --concurrency 100
+    python -m benchmarks.cart_sync_vs_async --database-url postgresql+psycopg2://...
+
+Defaults to a throwaway SQLite file (aiosqlite for the async side).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--shoppers", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=100)
+    return parser.parse_args()
+
+
+async def drive(app, variant_id: int, shoppers: int, concurrency: int) -> dict:
+    from httpx import ASGITransport, AsyncClient
+
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def shopper(client):
+        async with gate:
+            start = time.perf_counter()
+            try:
+                added = await client.post("/cart/items", json={"product_variant_id": variant_id, "quantity": 1})
+                added.raise_for_status()
+                cart = await client.get(f"/cart/items?cart_id={added.json()['id']}")
+                cart.raise_for_status()
+            except Exception as exc:
+                # e.g. the sync engine's pool timing out under more threads than connections
+                errors.append(type(exc).__name__)
+                return
+            latencies.append(time.perf_counter() - start)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[shopper(client) for _ in range(shoppers)])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    result = {"shoppers/s": round(len(latencies) / elapsed, 1), "errors": len(errors)}
+    if latencies:
+        result["p50_ms"] = round(statistics.median(latencies) * 1000, 1)
+        result["p99_ms"] = round(latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000, 1)
+    return result
+
+
+def main():
+    args = parse_args()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+    from fastapi import FastAPI
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app import models
+    from app.database import Base, SessionLocal, _async_url, engine, get_async_db
+    from app.migrations import run_migrations
+    from app.routes import cart, cart_async
+
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    warehouse = models.Warehouse(name="Bench", location="bench")
+    product = models.Product(name="Bench", description="", product_type="physical", is_active=True,
+                             url=f"/bench/{time.time_ns()}")
+    db.add_all([warehouse, product])
+    db.flush()
+    variant = models.ProductVariant(product_id=product.id, sku=f"BENCH-{time.time_ns()}", price=10, is_active=True)
+    db.add(variant)
+    db.flush()
+    db.add(models.Inventory(product_variant_id=variant.id, warehouse_id=warehouse.id, quantity=10 ** 9))
+    db.commit()
+    variant_id = variant.id
+    db.close()
+
+    sync_app = FastAPI()
+    sync_app.include_router(cart.router)
+
+    async_engine = create_async_engine(_async_url(engine.url.render_as_string(hide_password=False)))
+    sessions = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+    async def get_db():
+        async with sessions() as session:
+            yield session
+
+    async_app = FastAPI()
+    async_app.include_router(cart_async.router)
+    async_app.dependency_overrides[get_async_db] = get_db
+
+    async def run():
+        results = {}
+        for name, app in (("sync", sync_app), ("async", async_app)):
+            results[name] = await drive(app, variant_id, args.shoppers, args.concurrency)
+        await async_engine.dispose()
+        return results
+
+    print(f"{args.shoppers} shoppers, {args.concurrency} in flight, {engine.url.get_backend_name()}")
+    for name, result in asyncio.run(run()).items():
+        print(f"  {name:>5}: {result}")
+
+
+if __name__ == "__main__":
+    main()
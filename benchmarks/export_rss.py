@@ -0,0 +1,121 @@
+"""
+Peak memory of the streaming catalog export at catalogue scale.
+
+Seeds ~1M products (one variant and one stock row each), then drains every
+export format in a fresh child process and reports its peak RSS next to the
+RSS it started with, so the growth is what the export itself costs.
+
+    python -m benchmarks.export_rss --products 1000000
+    python -m benchmarks.export_rss --database-url postgresql+psycopg2://...
+
+Defaults to a throwaway SQLite file.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+FORMATS = [
+    ("csv", False, False),
+    ("csv", True, True),
+    ("ndjson", False, False),
+    ("ndjson", True, True),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=20000)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def seed(products: int, batch: int) -> None:
+    from sqlalchemy import insert
+
+    from app import models
+    from app.database import Base, SessionLocal, engine
+    from app.migrations import run_migrations
+
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        if db.query(models.Product.id).count() >= products:
+            return
+        warehouse = models.Warehouse(name="Bench", location="bench")
+        db.add(warehouse)
+        db.flush()
+        tag = time.time_ns()
+        for start in range(1, products + 1, batch):
+            ids = range(start, min(start + batch, products + 1))
+            db.execute(insert(models.Product), [
+                {"id": i, "name": f"Product {i}", "description": "Benchmark product " * 4,
+                 "product_type": "physical", "is_active": True, "url": f"/bench/{tag}/{i}"}
+                for i in ids
+            ])
+            db.execute(insert(models.ProductVariant), [
+                {"id": i, "product_id": i, "sku": f"B-{tag}-{i}", "price": 10.0 + i % 500,
+                 "size": "M", "color": "red", "is_active": True}
+                for i in ids
+            ])
+            db.execute(insert(models.Inventory), [
+                {"product_variant_id": i, "warehouse_id": warehouse.id, "quantity": i % 50, "reorder_level": 0}
+                for i in ids
+            ])
+            db.commit()
+    finally:
+        db.close()
+
+
+def measure(spec: str) -> None:
+    from app.services import catalog_export
+
+    fmt, variants, stock = spec.split(":")
+    export = catalog_export.export_csv if fmt == "csv" else catalog_export.export_ndjson
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    size = 0
+    for chunk in export(variants == "1", stock == "1"):
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    print(f"{size / 2 ** 20:,.0f} MB in {elapsed:.1f}s, RSS {before:.0f} -> {peak_rss_mb():.0f} MB peak")
+
+
+def main():
+    args = parse_args()
+    os.environ["DATABASE_URL"] = args.database_url or os.environ.get(
+        "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    )
+    if args.child:
+        measure(args.child)
+        return
+
+    start = time.perf_counter()
+    seed(args.products, args.batch)
+    print(f"{args.products:,} products seeded in {time.perf_counter() - start:.0f}s")
+
+    # A child per format: ru_maxrss never goes down within one process
+    for fmt, variants, stock in FORMATS:
+        label = f"{fmt}{' +variants +stock' if stock else ''}"
+        spec = f"{fmt}:{int(variants)}:{int(stock)}"
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.export_rss", "--child", spec],
+            env=os.environ, capture_output=True, text=True, check=True
+        )
+        print(f"  {label:<24} {result.stdout.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Price rule index at scale: 100k rules over 20k variants.
+
+Seeds the rules (mixed segment / region scopes, half of them time-boxed),
+times a full PriceIndex load, raw resolve() lookups, and quote_lines()
+quotes, which add the base-price query.
+
+    python -m benchmarks.pricing --rules 100000 --variants 20000 --quotes 5000
+    python -m benchmarks.pricing --database-url postgresql+psycopg2://...
+
+Defaults to a throwaway SQLite file.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SEGMENTS = [None, "retail", "vip", "wholesale"]
+REGIONS = [None, "KE", "UG", "TZ"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--rules", type=int, default=100000)
+    parser.add_argument("--variants", type=int, default=20000)
+    parser.add_argument("--quotes", type=int, default=5000)
+    parser.add_argument("--lines", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def seed(rng, variants: int, rules: int) -> list[int]:
+    from sqlalchemy import insert
+
+    from app import models
+    from app.database import Base, SessionLocal, engine
+    from app.migrations import run_migrations
+
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        tag = time.time_ns()
+        product = models.Product(name="Bench", description="", product_type="physical", is_active=True,
+                                 url=f"/bench/{tag}")
+        db.add(product)
+        db.flush()
+        result = db.execute(
+            insert(models.ProductVariant).returning(models.ProductVariant.id),
+            [{"product_id": product.id, "sku": f"B-{tag}-{i}", "price": rng.uniform(5, 500), "is_active": True}
+             for i in range(variants)]
+        )
+        variant_ids = [row[0] for row in result]
+        now = datetime.utcnow()
+        batch = []
+        for _ in range(rules):
+            start = end = None
+            if rng.random() < 0.5:
+                start = now + timedelta(days=rng.randint(-60, 30))
+                end = start + timedelta(days=rng.randint(1, 60))
+            batch.append({
+                "product_variant_id": rng.choice(variant_ids), "customer_segment": rng.choice(SEGMENTS),
+                "region": rng.choice(REGIONS), "price": rng.uniform(5, 500),
+                "start_time": start, "end_time": end, "active": True,
+            })
+            if len(batch) == 10000:
+                db.execute(insert(models.PriceRule), batch)
+                batch = []
+        if batch:
+            db.execute(insert(models.PriceRule), batch)
+        db.commit()
+        return variant_ids
+    finally:
+        db.close()
+
+
+def main():
+    args = parse_args()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    rng = random.Random(args.seed)
+
+    from app.database import SessionLocal
+    from app.services.pricing import price_index, quote_lines
+
+    variant_ids = seed(rng, args.variants, args.rules)
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        price_index.load(db)
+        print(f"load {args.rules:,} rules: {(time.perf_counter() - start) * 1e3:.0f} ms")
+
+        now = datetime.utcnow()
+        lookups = [(rng.choice(variant_ids), rng.choice(SEGMENTS), rng.choice(REGIONS)) for _ in range(100000)]
+        start = time.perf_counter()
+        for variant_id, segment, region in lookups:
+            price_index.resolve(variant_id, segment, region, now)
+        elapsed = time.perf_counter() - start
+        print(f"resolve(): {len(lookups) / elapsed:,.0f} lookups/s ({elapsed / len(lookups) * 1e6:.2f} µs each)")
+
+        timings = []
+        for _ in range(args.quotes):
+            lines = {vid: rng.randint(1, 3) for vid in rng.sample(variant_ids, args.lines)}
+            segment, region = rng.choice(SEGMENTS), rng.choice(REGIONS)
+            start = time.perf_counter()
+            quote_lines(db, lines, segment, region)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"quote_lines() x{args.lines} lines: {len(timings) / sum(timings):,.0f} quotes/s per thread, "
+              f"p50 {statistics.median(timings) * 1e3:.2f} ms, "
+              f"p99 {timings[int(len(timings) * 0.99) - 1] * 1e3:.2f} ms")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Product import throughput: rows/s for a CSV or NDJSON upload.
+
+Writes a synthetic upload (one product per `--variants` rows, each row a
+variant with its own sku) and runs the importer job on it synchronously,
+reporting the upsert phase and the end-of-job index refresh separately.
+Run twice with the same --seed to time a re-import (every row an update).
+
+    python -m benchmarks.product_import --rows 1000000
+    python -m benchmarks.product_import --format ndjson --database-url postgresql+psycopg2://...
+
+Defaults to a throwaway SQLite file.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+
+FIELDS = ["name", "url", "description", "sku", "price", "size", "color"]
+SIZES = ["S", "M", "L", "XL"]
+COLORS = ["red", "blue", "green", "black", "white"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--variants", type=int, default=4, help="rows (variants) per product")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def write_upload(path: str, rows: int, per_product: int, format: str, rng) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, FIELDS) if format == "csv" else None
+        if writer:
+            writer.writeheader()
+        for n in range(rows):
+            product = n // per_product
+            row = {
+                "name": f"Bench product {product}", "url": f"/bench/{product}",
+                "description": "synthetic import row", "sku": f"BENCH-{n}",
+                "price": round(rng.uniform(5, 500), 2), "size": rng.choice(SIZES), "color": rng.choice(COLORS),
+            }
+            if writer:
+                writer.writerow(row)
+            else:
+                fh.write(json.dumps(row) + "\n")
+
+
+def main():
+    args = parse_args()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    rng = random.Random(args.seed)
+
+    from app import models
+    from app.database import Base, SessionLocal, engine
+    from app.migrations import run_migrations
+    from app.services import product_import
+
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+
+    path = tempfile.NamedTemporaryFile(suffix=f".{args.format}", delete=False).name
+    start = time.perf_counter()
+    write_upload(path, args.rows, args.variants, args.format, rng)
+    print(f"wrote {args.rows:,} rows ({os.path.getsize(path) / 1e6:.0f} MB) in {time.perf_counter() - start:.1f}s")
+
+    publish = product_import._publish
+    timings = {}
+
+    def timed_publish(db, product_ids):
+        started = time.perf_counter()
+        publish(db, product_ids)
+        timings["publish"] = time.perf_counter() - started
+
+    product_import._publish = timed_publish
+
+    db = SessionLocal()
+    try:
+        job = models.ImportJob(filename="bench", format=args.format, status="PENDING")
+        db.add(job)
+        db.commit()
+        start = time.perf_counter()
+        product_import.run_job(job.id, path)  # removes the upload
+        elapsed = time.perf_counter() - start
+        db.expire_all()
+        status = product_import.job_status(db.get(models.ImportJob, job.id))
+    finally:
+        db.close()
+
+    publish_time = timings.get("publish", 0.0)
+    print(f"job {status['status']}: {status['rows_imported']:,} imported, {status['rows_failed']:,} failed")
+    print(f"  total   {elapsed:.1f}s  {args.rows / elapsed:,.0f} rows/s")
+    print(f"  upserts {elapsed - publish_time:.1f}s  {args.rows / (elapsed - publish_time):,.0f} rows/s")
+    print(f"  refresh {publish_time:.1f}s (cache, search and facet indexes, once at the end)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Search index build and query latency at catalogue scale.
+
+Builds a SearchIndex in memory from synthetic products (Zipf-distributed
+words in names and descriptions, a unique SKU per variant, so the
+vocabulary grows with the catalogue), then times:
+  - the bulk build,
+  - queries: whole words, multi-word, and short typeahead prefixes (the
+    worst case: up to SEARCH_PREFIX_EXPANSIONS terms scored),
+  - incremental add() of products bringing new terms, as imports and
+    reindexes do, and their removal,
+  - a query on a word the previous write touched (recompiles its postings).
+
+    python -m benchmarks.search --products 1000000
+"""
+import argparse
+import itertools
+import random
+import statistics
+import time
+
+COLORS = ["red", "blue", "green", "black", "white", "grey", "navy", "pink"]
+SIZES = ["xs", "s", "m", "l", "xl", "xxl"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--words", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def make_words(rng, count: int) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(words)
+
+
+def report(label: str, timings: list[float]) -> None:
+    timings.sort()
+    print(f"  {label:<28} p50 {statistics.median(timings) * 1e3:7.3f} ms   "
+          f"p99 {timings[int(len(timings) * 0.99) - 1] * 1e3:7.3f} ms")
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    from app.services.search import SearchIndex
+
+    words = make_words(rng, args.words)
+    # Zipf: a few very common words
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+
+    def product(product_id: int):
+        name = " ".join(rng.choices(words, cum_weights=cum_weights, k=3))
+        description = " ".join(rng.choices(words, cum_weights=cum_weights, k=10))
+        variants = [(f"SKU{product_id}X{n}", rng.choice(COLORS), rng.choice(SIZES)) for n in range(2)]
+        return product_id, name, f"/p/{product_id}", description, variants
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    for product_id in range(1, args.products + 1):
+        index.add(*product(product_id), keep_sorted=False)
+    index.finish_bulk()
+    print(f"build {args.products:,} products: {time.perf_counter() - start:.1f}s, {index.stats()}")
+
+    common, rare = words[:50], words[-5000:]
+    queries = {
+        "common word": lambda: rng.choice(common),
+        "rare word": lambda: rng.choice(rare),
+        "two words": lambda: f"{rng.choice(common)} {rng.choice(rare)}",
+        "2-letter prefix": lambda: rng.choice(words)[:2],
+        "3-letter prefix": lambda: rng.choice(words)[:3],
+        "sku prefix": lambda: f"sku{rng.randint(1, args.products)}"[:7],
+    }
+    print(f"queries ({args.queries} each):")
+    for label, make_query in queries.items():
+        timings = []
+        for _ in range(args.queries):
+            query = make_query()
+            start = time.perf_counter()
+            index.search(query, 20, prefix=True)
+            timings.append(time.perf_counter() - start)
+        report(label, timings)
+
+    print(f"incremental ({args.updates:,} products, new terms each):")
+    adds, removes = [], []
+    new_ids = range(args.products + 1, args.products + args.updates + 1)
+    for product_id in new_ids:
+        doc = product(product_id)
+        start = time.perf_counter()
+        index.add(*doc)
+        adds.append(time.perf_counter() - start)
+    for product_id in new_ids:
+        start = time.perf_counter()
+        index.remove(product_id)
+        removes.append(time.perf_counter() - start)
+    report("add()", adds)
+    report("remove()", removes)
+
+    # A write drops the compiled postings of every term it touches; the next
+    # query on a common term recompiles them
+    timings = []
+    for product_id in range(args.products + 1, args.products + min(args.queries, args.updates) + 1):
+        doc = product(product_id)
+        index.add(*doc)
+        query = doc[1].split()[0]
+        start = time.perf_counter()
+        index.search(query, 20, prefix=False)
+        timings.append(time.perf_counter() - start)
+    report("name word, after a write", timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Totals engine throughput: one 1k-line basket, and 100k carts re-priced at once.
+
+    python -m benchmarks.totals --lines 1000 --carts 100000 --lines-per-cart 8
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services import totals
+
+DISCOUNTS = [
+    {"discount_id": 1, "type": "percentage", "value": 5},
+    {"discount_id": 2, "type": "tiered", "value": 500},
+    {"discount_id": 3, "type": "fixed", "value": 20},
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1000)
+    parser.add_argument("--carts", type=int, default=100000)
+    parser.add_argument("--lines-per-cart", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    return parser.parse_args()
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(7)
+
+    prices = rng.uniform(1, 500, args.lines).round(2)
+    quantities = rng.integers(1, 5, args.lines)
+    elapsed = best_of(args.repeat, lambda: totals.basket_totals(prices, quantities, DISCOUNTS, 16, 300))
+    print(f"{args.lines}-line basket: {elapsed * 1e3:.3f} ms")
+
+    n = args.carts * args.lines_per_cart
+    index = np.repeat(np.arange(args.carts), args.lines_per_cart)
+    prices = rng.uniform(1, 500, n).round(2)
+    quantities = rng.integers(1, 5, n)
+    tax = rng.choice([0, 8, 16], args.carts)
+    elapsed = best_of(
+        max(args.repeat // 4, 1),
+        lambda: totals.many_totals(index, prices, quantities, args.carts, DISCOUNTS, tax)
+    )
+    print(f"{args.carts} carts x {args.lines_per_cart} lines: {elapsed * 1e3:.1f} ms "
+          f"({args.carts / elapsed:,.0f} carts/s)")
+
+
+if __name__ == "__main__":
+    main()
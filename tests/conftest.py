@@ -0,0 +1,133 @@
+import os
+import tempfile
+
+# Point the app at a throwaway database before anything under app/ is
+# imported (app.database reads DATABASE_URL at import time). Set
+# TEST_DATABASE_URL to run the suite against Postgres; the row-locking tests
+# only exercise real SELECT ... FOR UPDATE there.
+_tmp = tempfile.mkdtemp(prefix="shop-tests-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or f"sqlite:///{_tmp}/test.db"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ["DB_ASYNC"] = "false"
+# Cheap Argon2 parameters; the cost itself is not under test
+os.environ.setdefault("ARGON2_TIME_COST", "1")
+os.environ.setdefault("ARGON2_MEMORY_COST", "1024")
+os.environ.setdefault("ARGON2_PARALLELISM", "1")
+
+import pytest
+
+from app import models
+from app.database import Base, SessionLocal, engine
+from app.migrations import run_migrations
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    yield
+
+
+def _reset_in_memory_state():
+    from app.services import coupons, idempotency, versions
+    from app.services.allocation import availability
+    from app.services.catalog_cache import product_cache
+    from app.services.facets import facet_index
+    from app.services.pricing import price_index
+    from app.services.rates import shipping_rates, tax_rates
+
+    availability._stock = None
+    availability._loaded_at = 0.0
+    price_index._rules = None
+    tax_rates._data = None
+    shipping_rates._data = None
+    facet_index._loaded_at = None
+    coupons.invalidate()
+    idempotency.response_cache._entries.clear()
+    product_cache.clear()
+    versions._versions.clear()
+    versions._loaded_at = 0.0
+
+
+@pytest.fixture(autouse=True)
+def clean_db(schema):
+    _reset_in_memory_state()
+    yield
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    _reset_in_memory_state()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+# -------------------------
+# Factories
+# -------------------------
+@pytest.fixture
+def make_warehouse(db):
+    def make(name="Main", location="test"):
+        warehouse = models.Warehouse(name=name, location=location)
+        db.add(warehouse)
+        db.commit()
+        return warehouse.id
+
+    return make
+
+
+@pytest.fixture
+def make_variant(db):
+    """
+    make_variant(stock={warehouse_id: qty}, price=...) -> variant id.
+    """
+    counter = {"n": 0}
+
+    def make(stock=None, price=100.0, weight=1.0, size=None, color=None):
+        counter["n"] += 1
+        n = counter["n"]
+        product = models.Product(
+            name=f"Product {n}", description="", product_type="physical",
+            is_active=True, url=f"/p/{n}-{id(counter)}"
+        )
+        db.add(product)
+        db.flush()
+        variant = models.ProductVariant(
+            product_id=product.id, sku=f"SKU-{n}-{id(counter)}", price=price,
+            weight=weight, size=size, color=color, is_active=True
+        )
+        db.add(variant)
+        db.flush()
+        for warehouse_id, qty in (stock or {}).items():
+            db.add(models.Inventory(
+                product_variant_id=variant.id, warehouse_id=warehouse_id, quantity=qty, reorder_level=0
+            ))
+        db.commit()
+        return variant.id
+
+    return make
+
+
+@pytest.fixture
+def make_cart(db):
+    """
+    make_cart({variant_id: qty}) -> cart id (no stock holds).
+    """
+    def make(lines):
+        cart = models.Cart(is_abandoned=False)
+        db.add(cart)
+        db.flush()
+        for variant_id, qty in lines.items():
+            db.add(models.CartItem(cart_id=cart.id, product_variant_id=variant_id, quantity=qty))
+        db.commit()
+        return cart.id
+
+    return make
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import Inventory, Shipment
+from app.schemas.cart import CheckoutRequest
+from app.services import allocation
+from app.services.allocation import AvailabilityIndex, availability
+from app.services.cart import checkout
+
+
+def index_of(stock):
+    index = AvailabilityIndex()
+    index._stock = stock
+    return index
+
+
+def test_single_warehouse_preferred_over_split():
+    index = index_of({1: {10: 5, 20: 1}, 2: {10: 1, 20: 3}})
+    assert index.allocate({1: 1, 2: 1}, {}, None) == {10: {1: 1, 2: 1}}
+
+
+def test_split_takes_fewest_shipments():
+    index = index_of({1: {10: 5}, 2: {20: 3}, 3: {20: 1, 30: 1}})
+    assert index.allocate({1: 2, 2: 2, 3: 1}, {}, None) == {20: {2: 2, 3: 1}, 10: {1: 2}}
+
+
+def test_shortage_reported_per_line():
+    index = index_of({1: {10: 1, 20: 1}})
+    with pytest.raises(HTTPException) as exc:
+        index.allocate({1: 3}, {}, None)
+    assert exc.value.detail["shortages"] == [{"product_variant_id": 1, "requested": 3, "available": 2}]
+
+
+def test_checkout_rereads_stock_before_reporting_shortage(db, make_warehouse, make_variant, make_cart):
+    first, second = make_warehouse("A"), make_warehouse("B")
+    variant_id = make_variant(stock={first: 1})
+    availability.load(db)
+
+    # Restocked behind the index's back (e.g. through another worker)
+    db.add(Inventory(product_variant_id=variant_id, warehouse_id=second, quantity=5, reorder_level=0))
+    db.commit()
+
+    cart_id = make_cart({variant_id: 3})
+    order = checkout(db, CheckoutRequest(cart_id=cart_id, payment_provider="STRIPE"))
+
+    assert [s.warehouse_id for s in db.query(Shipment).filter_by(order_id=order.order_id)] == [second]
+    assert availability._stock[variant_id] == {first: 1, second: 2}
+
+
+def test_index_reloads_after_ttl(db, make_warehouse, make_variant, monkeypatch):
+    warehouse_id = make_warehouse()
+    variant_id = make_variant(stock={warehouse_id: 1})
+    availability.ensure_loaded(db)
+
+    db.query(Inventory).update({"quantity": 9})
+    db.commit()
+    availability.ensure_loaded(db)
+    assert availability._stock[variant_id] == {warehouse_id: 1}
+
+    monkeypatch.setattr(allocation, "AVAILABILITY_TTL", -1)
+    availability.ensure_loaded(db)
+    assert availability._stock[variant_id] == {warehouse_id: 9}
+
+
+def test_concurrent_checkouts_share_one_reload(db, make_warehouse, make_variant, monkeypatch):
+    make_variant(stock={make_warehouse(): 5})
+    loads = []
+    load = availability.load
+
+    def slow_load(session):
+        loads.append(1)
+        time.sleep(0.2)
+        load(session)
+
+    monkeypatch.setattr(availability, "load", slow_load)
+    barrier = threading.Barrier(8)
+
+    def checkout_request():
+        barrier.wait()
+        availability.ensure_loaded(db)
+
+    threads = [threading.Thread(target=checkout_request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
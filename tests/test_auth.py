@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app import deps
+from app.auth import create_token
+from app.deps import get_current_user, revoke_token, token_digest
+from app.models import RevokedToken
+
+
+@pytest.fixture(autouse=True)
+def fresh_token_cache(monkeypatch):
+    monkeypatch.setattr(deps, "token_cache", deps.TokenCache())
+    monkeypatch.setattr(deps, "_revocations_synced_at", 0.0)
+
+
+def test_logout_revokes_the_token_locally_and_in_the_database(db):
+    token = create_token({"sub": "a@example.com", "role": "USER", "uid": 1})
+    claims = get_current_user(token)
+
+    revoke_token(db, token, claims["exp"])
+
+    assert db.get(RevokedToken, token_digest(token)) is not None
+    with pytest.raises(HTTPException) as exc:
+        get_current_user(token)
+    assert exc.value.status_code == 401
+
+
+def test_revocation_by_another_worker_is_picked_up(db, monkeypatch):
+    token = create_token({"sub": "a@example.com", "role": "USER", "uid": 1})
+    claims = get_current_user(token)  # now cached by this worker
+
+    # Another worker handled the logout: only the shared row exists here
+    other_worker = deps.TokenCache()
+    monkeypatch.setattr(deps, "token_cache", other_worker)
+    revoke_token(db, token, claims["exp"])
+    monkeypatch.setattr(deps, "token_cache", deps.TokenCache())
+    deps.token_cache.put(token_digest(token), claims)
+
+    monkeypatch.setattr(deps, "_revocations_synced_at", 0.0)
+    with pytest.raises(HTTPException) as exc:
+        get_current_user(token)
+    assert exc.value.detail == "Token has been revoked"
+
+
+def test_concurrent_requests_share_one_revocation_sync(monkeypatch):
+    opened = []
+    session_local = deps.SessionLocal
+
+    def slow_session():
+        opened.append(1)
+        time.sleep(0.2)
+        return session_local()
+
+    monkeypatch.setattr(deps, "SessionLocal", slow_session)
+    barrier = threading.Barrier(8)
+
+    def request():
+        barrier.wait()
+        deps.sync_revocations()
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(opened) == 1
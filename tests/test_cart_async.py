@@ -0,0 +1,127 @@
+import asyncio
+import threading
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import _async_url, engine, get_async_db
+from app.models import Inventory, Order
+from app.routes import cart_async
+from app.services import coupons
+from app.services.allocation import availability
+from app.services.pricing import price_index
+from app.services.rates import tax_rates
+
+
+def async_cart_app():
+    """
+    The DB_ASYNC=true cart router on an async engine over the test database
+    (aiosqlite for the default SQLite file, asyncpg for Postgres).
+    """
+    async_engine = create_async_engine(_async_url(engine.url.render_as_string(hide_password=False)))
+    sessions = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+    async def get_db():
+        async with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(cart_async.router)
+    app.dependency_overrides[get_async_db] = get_db
+    return app, async_engine
+
+
+def test_async_router_cart_lifecycle(db, make_warehouse, make_variant):
+    warehouse_id = make_warehouse()
+    variant_id = make_variant({warehouse_id: 10}, price=25.0)
+
+    async def scenario():
+        app, async_engine = async_cart_app()
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                added = await client.post("/cart/items", json={"product_variant_id": variant_id, "quantity": 2})
+                assert added.status_code == 200, added.text
+                cart_id = added.json()["id"]
+
+                again = await client.post(
+                    f"/cart/items?cart_id={cart_id}", json={"product_variant_id": variant_id, "quantity": 1}
+                )
+                assert again.json()["items"][0]["quantity"] == 3
+
+                items = await client.get(f"/cart/items?cart_id={cart_id}")
+                assert items.status_code == 200
+                assert items.json()["items"][0]["price"] == 25.0
+
+                body = {"cart_id": cart_id, "payment_provider": "STRIPE", "warehouse_id": warehouse_id}
+                headers = {"Idempotency-Key": "async-checkout"}
+                checkout = await client.post("/cart/checkout", json=body, headers=headers)
+                assert checkout.status_code == 200, checkout.text
+                retry = await client.post("/cart/checkout", json=body, headers=headers)
+                assert retry.headers["Idempotent-Replayed"] == "true"
+                assert retry.json() == checkout.json()
+                return checkout.json()
+        finally:
+            await async_engine.dispose()
+
+    order = asyncio.run(scenario())
+    assert order["total"] == 75.0
+    assert db.get(Order, order["order_id"]).status == "CREATED"
+    stock = db.query(Inventory.quantity).filter_by(product_variant_id=variant_id).scalar()
+    assert stock == 7
+
+
+def test_async_router_serves_concurrent_carts(db, make_warehouse, make_variant):
+    warehouse_id = make_warehouse()
+    variant_id = make_variant({warehouse_id: 100})
+
+    async def scenario():
+        app, async_engine = async_cart_app()
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                responses = await asyncio.gather(*[
+                    client.post("/cart/items", json={"product_variant_id": variant_id, "quantity": 1})
+                    for _ in range(20)
+                ])
+                return [r.status_code for r in responses], {r.json()["id"] for r in responses}
+        finally:
+            await async_engine.dispose()
+
+    statuses, cart_ids = asyncio.run(scenario())
+    assert statuses == [200] * 20
+    assert len(cart_ids) == 20
+
+
+def test_async_checkout_reloads_indexes_off_the_event_loop(db, make_warehouse, make_variant, monkeypatch):
+    warehouse_id = make_warehouse()
+    variant_id = make_variant({warehouse_id: 10}, price=25.0)
+    loaded_on = {}
+
+    def record(name, load, cold=lambda: True):
+        def wrapper(*args):
+            if cold():
+                loaded_on.setdefault(name, []).append(threading.current_thread())
+            return load(*args)
+        return wrapper
+
+    for name, target in (("prices", price_index), ("stock", availability), ("tax", tax_rates)):
+        monkeypatch.setattr(target, "load", record(name, target.load))
+    # Called on every checkout; it only queries when the cache is cold
+    monkeypatch.setattr(coupons, "_automatic_rows",
+                        record("discounts", coupons._automatic_rows, lambda: coupons._cached_automatic() is None))
+
+    async def scenario():
+        app, async_engine = async_cart_app()
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                added = await client.post("/cart/items", json={"product_variant_id": variant_id, "quantity": 1})
+                body = {"cart_id": added.json()["id"], "payment_provider": "STRIPE"}
+                checkout = await client.post("/cart/checkout", json=body)
+                assert checkout.status_code == 200, checkout.text
+                return threading.current_thread()
+        finally:
+            await async_engine.dispose()
+
+    loop_thread = asyncio.run(scenario())
+    assert set(loaded_on) == {"prices", "stock", "tax", "discounts"}
+    assert not any(loop_thread in threads for threads in loaded_on.values())
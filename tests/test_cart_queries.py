@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.database import engine
+from app.services.cart import get_cart_items, load_cart
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.mark.parametrize("load", [load_cart, get_cart_items])
+def test_cart_query_count_is_independent_of_size(db, make_variant, make_cart, load):
+    counts = {}
+    for size in (1, 5, 40):
+        cart_id = make_cart({make_variant(): 1 for _ in range(size)})
+        db.expunge_all()
+        with count_queries() as statements:
+            result = load(db, cart_id)
+        items = result.items if load is load_cart else result["items"]
+        assert len(items) == size
+        counts[size] = len(statements)
+
+    assert len(set(counts.values())) == 1, counts
+    assert counts[1] <= 2
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app.models import Cart, CartItem, StockHold
+from app.services import cart_sweeper, housekeeping
+
+
+def age(db, cart_id, days):
+    db.execute(
+        update(Cart).where(Cart.id == cart_id)
+        .values(last_activity_at=datetime.utcnow() - timedelta(days=days))
+    )
+    db.commit()
+
+
+def test_purge_counts_items_of_deleted_guest_carts(db, make_variant, make_cart):
+    first, second = make_variant(), make_variant()
+    stale = make_cart({first: 1, second: 2})
+    fresh = make_cart({first: 1})
+    db.add(StockHold(cart_id=stale, product_variant_id=first, quantity=1, expires_at=datetime.utcnow()))
+    db.commit()
+    age(db, stale, 30)
+
+    report = cart_sweeper.sweep(db)
+
+    assert report["purged_carts"] == 1
+    assert report["purged_items"] == 2
+    assert db.query(Cart.id).all() == [(fresh,)]
+    assert db.query(CartItem).count() == 1
+    assert db.query(StockHold).count() == 0
+
+
+def test_batches_stop_when_every_row_is_skipped(db, make_cart, monkeypatch):
+    # As if another transaction held every idle cart: SKIP LOCKED returns
+    # nothing, the rows keep matching, and the sweep must not spin on them
+    for _ in range(3):
+        age(db, make_cart({}), 30)
+    calls = []
+    idle = db.query(Cart.id).filter(Cart.user_id == None)
+
+    assert housekeeping.in_batches(db, idle, lambda ids: calls.append(ids) or 0, batch_size=2) == 0
+    assert len(calls) == 1
+    assert db.query(Cart).count() == 3
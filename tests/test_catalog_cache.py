@@ -0,0 +1,96 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app.models import Product, ProductVariant
+from app.routes import products
+from app.services import versions
+
+
+def client():
+    app = FastAPI()
+    app.include_router(products.router)
+    return TestClient(app)
+
+
+def write_from_another_worker(db, product_id, name):
+    # A direct write plus version bump, leaving this worker's cache untouched
+    db.execute(update(Product).where(Product.id == product_id).values(name=name))
+    versions.bump(db, ["products"])
+    versions.bump_products(db, [product_id])
+    db.commit()
+    versions._loaded_at = 0.0  # as if VERSION_TTL had passed
+
+
+def test_body_follows_the_etag_after_another_workers_write(db, make_variant):
+    make_variant()
+    product_id = db.query(Product.id).scalar()
+    http = client()
+
+    first = http.get(f"/products/{product_id}")
+    listed = http.get("/products/")
+    assert first.json()["name"] == listed.json()[0]["name"] == "Product 1"
+
+    write_from_another_worker(db, product_id, "Renamed")
+
+    second = http.get(f"/products/{product_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json()["name"] == "Renamed"
+    assert http.get("/products/").json()[0]["name"] == "Renamed"
+
+
+def test_unchanged_product_is_served_from_cache(db, make_variant):
+    make_variant()
+    product_id = db.query(Product.id).scalar()
+    http = client()
+
+    first = http.get(f"/products/{product_id}")
+    hits = products.product_cache.hits
+    again = http.get(f"/products/{product_id}")
+    assert again.json() == first.json()
+    assert products.product_cache.hits == hits + 1
+    assert http.get(f"/products/{product_id}", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+
+def test_a_write_to_one_product_leaves_the_others_cached(db, make_variant):
+    make_variant()
+    make_variant()
+    first_id, second_id = [pid for (pid,) in db.query(Product.id).order_by(Product.id)]
+    http = client()
+    first = http.get(f"/products/{first_id}")
+    second = http.get(f"/products/{second_id}")
+
+    write_from_another_worker(db, second_id, "Renamed")
+
+    hits = products.product_cache.hits
+    assert http.get(f"/products/{first_id}", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    assert http.get(f"/products/{first_id}").json() == first.json()
+    assert products.product_cache.hits == hits + 1
+    changed = http.get(f"/products/{second_id}", headers={"If-None-Match": second.headers["ETag"]})
+    assert (changed.status_code, changed.json()["name"]) == (200, "Renamed")
+
+
+def test_variant_writes_change_their_product_version(db, make_variant):
+    variant_id = make_variant()
+    make_variant()
+    first_id, second_id = [pid for (pid,) in db.query(Product.id).order_by(Product.id)]
+    version = lambda pid: db.query(Product.version).filter(Product.id == pid).scalar()
+    before = version(first_id), version(second_id)
+
+    variant = db.get(ProductVariant, variant_id)
+    variant.price = 99
+    db.commit()
+    assert (version(first_id), version(second_id)) == (before[0] + 1, before[1])
+
+    variant.product_id = second_id  # moving it changes both products
+    db.commit()
+    assert (version(first_id), version(second_id)) == (before[0] + 2, before[1] + 1)
+
+    db.query(Product).filter(Product.id == first_id).one().name = "Renamed"
+    db.commit()
+    assert version(first_id) == before[0] + 3
+
+
+def test_unknown_product_is_a_404(db):
+    assert client().get("/products/999999").status_code == 404
@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models import Product, ProductVariant
+from app.routes import products
+from app.services import catalog_export
+
+
+@pytest.fixture
+def http(monkeypatch):
+    # Several fetch batches and several chunks even for a tiny catalog
+    monkeypatch.setattr(catalog_export, "EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(catalog_export, "CHUNK_BYTES", 64)
+    app = FastAPI()
+    app.include_router(products.router)
+    return TestClient(app)
+
+
+@pytest.fixture
+def catalog(db, make_warehouse, make_variant):
+    """
+    Three products: two variants stocked in two warehouses, one variant
+    stocked in one, and one product without variants.
+    """
+    first, second = make_warehouse("A"), make_warehouse("B")
+    make_variant(stock={first: 3, second: 4}, price=10)
+    product_id = db.query(Product.id).scalar()
+    db.add(ProductVariant(product_id=product_id, sku="EXTRA", price=11, is_active=True))
+    make_variant(stock={second: 7}, price=20)
+    db.add(Product(name="Bare", description="", product_type="digital", is_active=True, url="/bare"))
+    db.commit()
+    return first, second
+
+
+def read_csv(response):
+    return list(csv.reader(io.StringIO(response.text)))
+
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_csv_one_row_per_product(http, catalog):
+    response = http.get("/products/export?format=csv")
+    assert response.headers["content-type"].startswith("text/csv")
+    header, *rows = read_csv(response)
+    assert header == catalog_export.PRODUCT_FIELDS
+    assert [row[1] for row in rows] == ["Product 1", "Product 2", "Bare"]
+
+
+def test_csv_one_row_per_variant_and_warehouse(http, catalog):
+    first, second = catalog
+    header, *rows = read_csv(http.get("/products/export?format=csv&include_stock=true"))
+    assert header == catalog_export.PRODUCT_FIELDS + catalog_export.VARIANT_FIELDS + catalog_export.STOCK_FIELDS
+    records = [dict(zip(header, row)) for row in rows]
+    assert [(r["name"], r["warehouse_id"], r["quantity"]) for r in records] == [
+        ("Product 1", str(first), "3"),
+        ("Product 1", str(second), "4"),
+        ("Product 1", "", ""),  # EXTRA has no stock rows
+        ("Product 2", str(second), "7"),
+        ("Bare", "", ""),
+    ]
+    assert records[0]["sku"] == records[1]["sku"] != "EXTRA"
+    assert [r["sku"] for r in records[2:]] == ["EXTRA", records[3]["sku"], ""]
+
+
+def test_ndjson_nests_variants_and_stock(http, catalog):
+    first, second = catalog
+    response = http.get("/products/export?include_stock=true")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = read_ndjson(response)
+    assert [line["name"] for line in lines] == ["Product 1", "Product 2", "Bare"]
+    assert [v["sku"] for v in lines[0]["variants"]][1] == "EXTRA"
+    assert [v["stock"] for v in lines[0]["variants"]] == [{str(first): 3, str(second): 4}, {}]
+    assert lines[1]["variants"][0]["stock"] == {str(second): 7}
+    assert lines[1]["variants"][0]["price"] == 20
+    assert lines[2]["variants"] == []
+
+
+def test_ndjson_without_variants(http, catalog):
+    lines = read_ndjson(http.get("/products/export?format=ndjson"))
+    assert len(lines) == 3
+    assert set(lines[0]) == set(catalog_export.PRODUCT_FIELDS)
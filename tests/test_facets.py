@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import Inventory, Product, ProductVariant
+from app.services import categories
+from app.services.facets import facet_index
+
+
+@pytest.fixture
+def catalog(db, make_warehouse, make_variant):
+    """
+    Four products with one variant each:
+    red M $10 (5 in stock), red L $20 (none), blue M $30 (2), inactive S.
+    """
+    warehouse_id = make_warehouse()
+    variants = [
+        make_variant(stock={warehouse_id: 5}, price=10, size="M", color="red"),
+        make_variant(stock={warehouse_id: 0}, price=20, size="L", color="red"),
+        make_variant(stock={warehouse_id: 2}, price=30, size="M", color="blue"),
+        make_variant(stock={warehouse_id: 9}, price=40, size="S", color="red"),
+    ]
+    db.query(ProductVariant).filter(ProductVariant.id == variants[3]).update({"is_active": False})
+    db.commit()
+    products = [db.get(ProductVariant, vid).product_id for vid in variants]
+    return warehouse_id, variants, products
+
+
+def test_browse_filters_and_facets(db, catalog):
+    _, _, (red_m, red_l, blue_m, inactive) = catalog
+
+    ids, facets = facet_index.browse(db)
+    assert ids == [red_m, red_l, blue_m]
+    assert facets == {
+        "size": {"M": 2, "L": 1}, "color": {"red": 2, "blue": 1},
+        "in_stock": 2, "variants": 3, "price": {"min": 10.0, "max": 30.0},
+    }
+
+    assert facet_index.browse(db, min_price=15, max_price=25)[0] == [red_l]
+    assert facet_index.browse(db, colors=["green"])[0] == []
+    assert facet_index.browse(db, colors=["green"])[1]["price"] is None
+
+
+def test_facet_counts_ignore_their_own_filter(db, catalog):
+    _, _, (red_m, red_l, blue_m, _) = catalog
+
+    ids, facets = facet_index.browse(db, sizes=["M"])
+    assert ids == [red_m, blue_m]
+    assert facets["size"] == {"M": 2, "L": 1}  # the alternatives stay visible
+    assert facets["color"] == {"red": 1, "blue": 1}
+
+    ids, facets = facet_index.browse(db, colors=["red"], in_stock=True)
+    assert ids == [red_m]
+    assert facets["size"] == {"M": 1}
+    assert facets["color"] == {"red": 1, "blue": 1}
+    assert facets["in_stock"] == 1
+    assert facets["variants"] == 1
+
+
+def test_browse_by_category_subtree(db, catalog):
+    _, _, (red_m, red_l, blue_m, _) = catalog
+    root = categories.create_category(db, "Clothing", None)
+    child = categories.create_category(db, "Shirts", root.id)
+    db.query(Product).filter(Product.id == red_m).update({"category_id": child.id})
+    db.query(Product).filter(Product.id == blue_m).update({"category_id": root.id})
+    db.commit()
+
+    assert facet_index.browse(db, category_id=root.id)[0] == [red_m, blue_m]
+    assert facet_index.browse(db, category_id=child.id)[0] == [red_m]
+    with pytest.raises(HTTPException) as exc:
+        facet_index.browse(db, category_id=999999)
+    assert exc.value.status_code == 404
+
+
+def test_stock_updates_patch_the_index(db, catalog):
+    warehouse_id, (v_red_m, v_red_l, _, _), (red_m, red_l, blue_m, _) = catalog
+    facet_index.ensure_loaded(db)
+
+    facet_index.add_stock(v_red_l, 3)
+    assert facet_index.browse(db, in_stock=True)[0] == [red_m, red_l, blue_m]
+
+    facet_index.deduct({warehouse_id: {v_red_m: 5}})
+    assert facet_index.browse(db, in_stock=True)[0] == [red_l, blue_m]
+
+
+def test_refresh_products_rereads_variants(db, catalog, make_variant):
+    _, (_, v_red_l, v_blue_m, _), (red_m, red_l, blue_m, _) = catalog
+    facet_index.ensure_loaded(db)
+
+    db.query(ProductVariant).filter(ProductVariant.id == v_blue_m).update({"color": "green"})
+    db.add(ProductVariant(product_id=red_m, sku="XL-RED", price=12, size="XL", color="red", is_active=True))
+    db.query(Inventory).filter(Inventory.product_variant_id == v_red_l).delete()
+    db.query(ProductVariant).filter(ProductVariant.id == v_red_l).delete()
+    db.query(Product).filter(Product.id == red_l).delete()
+    db.commit()
+    facet_index.refresh_products(db, [red_m, red_l, blue_m])
+
+    ids, facets = facet_index.browse(db)
+    assert ids == [red_m, blue_m]
+    assert facets["size"] == {"M": 2, "XL": 1}
+    assert facets["color"] == {"red": 2, "green": 1}
+    assert facet_index.browse(db, sizes=["XL"])[0] == [red_m]
+
+
+def test_concurrent_requests_share_one_rebuild(db, catalog, monkeypatch):
+    loads = []
+    load = facet_index.load
+
+    def slow_load(session):
+        loads.append(1)
+        time.sleep(0.2)
+        load(session)
+
+    monkeypatch.setattr(facet_index, "load", slow_load)
+    barrier = threading.Barrier(8)
+
+    def request():
+        barrier.wait()
+        facet_index.ensure_loaded(db)
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
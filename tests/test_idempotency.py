@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal
+from app.models import IdempotencyKey, Order, StockHold
+from app.routes import cart
+from app.services import idempotency, reservations
+
+
+@pytest.fixture
+def http():
+    app = FastAPI()
+    app.include_router(cart.router)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+@pytest.fixture
+def checkout_body(make_warehouse, make_variant, make_cart):
+    warehouse_id = make_warehouse()
+    variant_id = make_variant(stock={warehouse_id: 10})
+    return {"cart_id": make_cart({variant_id: 2}), "payment_provider": "STRIPE", "warehouse_id": warehouse_id}
+
+
+def test_retry_replays_the_original_order(db, http, checkout_body):
+    headers = {"Idempotency-Key": "abc"}
+    first = http.post("/cart/checkout", json=checkout_body, headers=headers)
+    second = http.post("/cart/checkout", json=checkout_body, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json() == first.json()
+    assert db.query(Order).count() == 1
+
+
+def test_response_commits_with_the_order(db, http, checkout_body, monkeypatch):
+    # The worker dies right after the handler's commit, before any bookkeeping
+    def crash(claimed):
+        raise RuntimeError("worker died")
+
+    monkeypatch.setattr(idempotency, "_finish", crash)
+    assert http.post("/cart/checkout", json=checkout_body, headers={"Idempotency-Key": "abc"}).status_code == 500
+    monkeypatch.undo()
+
+    row = db.query(IdempotencyKey).one()
+    assert row.status == "DONE"
+    retry = http.post("/cart/checkout", json=checkout_body, headers={"Idempotency-Key": "abc"})
+    assert retry.status_code == 200
+    assert retry.json()["order_id"] == db.query(Order.id).scalar()
+    assert db.query(Order).count() == 1
+
+
+def test_taken_over_request_cannot_commit(db):
+    replay, lease = idempotency.claim("test", "abc", "fp")
+    assert replay is None
+
+    # Another request found the key stale and took it over
+    db.query(IdempotencyKey).update({"locked_at": lease + timedelta(seconds=1)})
+    db.commit()
+
+    session = SessionLocal()
+    try:
+        session.info["idempotency"] = {"scope": "test", "key": "abc", "lease": lease, "status_code": 200}
+        session.add(Order(status="CREATED", total=1))
+        session.flush()
+        with pytest.raises(HTTPException) as exc:
+            idempotency.record(session, {"order_id": 1})
+        assert exc.value.status_code == 409
+    finally:
+        session.close()
+    assert db.query(Order).count() == 0
+    assert db.query(IdempotencyKey.status).scalar() == "IN_PROGRESS"
+
+
+def test_sweepers_delete_expired_rows_in_batches(db, make_variant, make_cart):
+    now = datetime.utcnow()
+    db.add_all([
+        IdempotencyKey(scope="s", key=str(i), fingerprint="f", status="DONE", locked_at=now,
+                       expires_at=now + timedelta(seconds=-10 if i < 5 else 60))
+        for i in range(7)
+    ])
+    cart_id = make_cart({})
+    variant_id = make_variant()
+    db.add_all([
+        StockHold(cart_id=cart_id, product_variant_id=variant_id, quantity=1,
+                  expires_at=now + timedelta(seconds=-10 if i < 3 else 60))
+        for i in range(4)
+    ])
+    db.commit()
+
+    assert idempotency.purge_expired(db, batch_size=2) == 5
+    assert reservations.purge_expired_holds(db, batch_size=2) == 3
+    assert db.query(IdempotencyKey).count() == 2
+    assert db.query(StockHold).count() == 1
@@ -0,0 +1,45 @@
+from sqlalchemy import text
+
+from app.models import Order, User
+from app.pagination import Page, fetch_page
+from app.routes.orders import order_history_query
+
+
+def make_orders(db, count):
+    user = User(email="buyer@example.com", password="x", role="USER")
+    db.add(user)
+    db.flush()
+    db.add_all([Order(user_id=user.id, status="CREATED", total=i) for i in range(count)])
+    db.commit()
+    return user.id
+
+
+def test_history_pages_newest_first_without_gaps(db):
+    user_id = make_orders(db, 7)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = fetch_page(order_history_query(db, user_id), Order.id, Page(cursor=cursor, limit=3), True)
+        seen += [o.id for o in rows]
+        if not cursor:
+            break
+    assert seen == sorted(seen, reverse=True)
+    assert len(seen) == len(set(seen)) == 7
+
+
+def test_history_page_is_an_index_range_scan(db):
+    user_id = make_orders(db, 3)
+    query = (
+        db.query(Order.id)
+        .filter(Order.user_id == user_id, Order.id < 10 ** 9)
+        .order_by(Order.id.desc())
+        .limit(51)
+    )
+    sql = str(query.statement.compile(db.bind, compile_kwargs={"literal_binds": True}))
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text("SET enable_seqscan = off"))
+        plan = " ".join(row[0] for row in db.execute(text(f"EXPLAIN {sql}")))
+        db.rollback()
+        assert "ix_orders_user_id_id" in plan and "Sort" not in plan
+    else:
+        plan = " ".join(row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+        assert "ix_orders_user_id_id" in plan and "TEMP B-TREE" not in plan
@@ -0,0 +1,80 @@
+import pytest
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.testclient import TestClient
+
+from app.models import Coupon, Warehouse
+from app.pagination import NEXT_CURSOR_HEADER, Page, encode_cursor, fetch_page, paginate
+from app.routes import products
+
+
+def pages(db, limit, descending=False):
+    """
+    Follow the cursors to the end: [[ids of page 1], [ids of page 2], ...].
+    """
+    out, cursor = [], None
+    while True:
+        rows, cursor = fetch_page(db.query(Warehouse), Warehouse.id, Page(cursor=cursor, limit=limit), descending)
+        out.append([w.id for w in rows])
+        if not cursor:
+            return out
+
+
+def test_pages_ascending_and_descending(db, make_warehouse):
+    ids = [make_warehouse(f"W{n}") for n in range(7)]
+    assert pages(db, 3) == [ids[0:3], ids[3:6], ids[6:]]
+    assert pages(db, 3, descending=True) == [ids[6:3:-1], ids[3:0:-1], ids[:1]]
+
+
+def test_last_page_has_no_cursor_header(db, make_warehouse):
+    ids = [make_warehouse(f"W{n}") for n in range(4)]
+
+    response = Response()
+    rows = paginate(db.query(Warehouse), Warehouse.id, Page(cursor=None, limit=2), response)
+    cursor = response.headers[NEXT_CURSOR_HEADER]
+    assert [w.id for w in rows] == ids[:2]
+
+    # Exactly the remaining rows: no further page is advertised
+    response = Response()
+    rows = paginate(db.query(Warehouse), Warehouse.id, Page(cursor=cursor, limit=2), response)
+    assert [w.id for w in rows] == ids[2:]
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 json!",
+    encode_cursor({"id": 1}),
+    encode_cursor([1]),
+    encode_cursor(None),
+    encode_cursor(True),
+    encode_cursor(1.5),
+    encode_cursor("1"),  # a string where the key is an integer
+])
+def test_malformed_cursor_is_a_400(db, make_warehouse, cursor):
+    make_warehouse()
+    with pytest.raises(HTTPException) as exc:
+        fetch_page(db.query(Warehouse), Warehouse.id, Page(cursor=cursor, limit=2))
+    assert (exc.value.status_code, exc.value.detail) == (400, "Invalid cursor")
+
+
+def test_string_keys_take_string_cursors(db):
+    db.add_all([Coupon(code=code) for code in ("A", "B", "C")])
+    db.commit()
+    rows, cursor = fetch_page(db.query(Coupon), Coupon.code, Page(cursor=None, limit=2))
+    assert [c.code for c in rows] == ["A", "B"]
+    rows, cursor = fetch_page(db.query(Coupon), Coupon.code, Page(cursor=cursor, limit=2))
+    assert ([c.code for c in rows], cursor) == (["C"], None)
+    with pytest.raises(HTTPException):
+        fetch_page(db.query(Coupon), Coupon.code, Page(cursor=encode_cursor(1), limit=2))
+
+
+def test_browse_rejects_a_non_integer_cursor(db, make_variant):
+    make_variant(price=10)
+    app = FastAPI()
+    app.include_router(products.router)
+    http = TestClient(app)
+
+    for cursor in (encode_cursor({"id": 1}), encode_cursor("abc")):
+        response = http.get("/products/browse", params={"cursor": cursor})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+    assert http.get("/products/browse", params={"cursor": encode_cursor(0)}).status_code == 200
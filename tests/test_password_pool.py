@@ -0,0 +1,48 @@
+import os
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app import auth
+
+
+@pytest.fixture(autouse=True)
+def one_slot(monkeypatch):
+    monkeypatch.setattr(auth, "_pending", threading.BoundedSemaphore(1))
+
+
+def test_hash_and_verify_in_pool():
+    hashed = auth.run_in_password_pool(auth.hash_password, "s3cret")
+    valid, new_hash = auth.run_in_password_pool(auth.verify_and_update, "s3cret", hashed)
+    assert valid and new_hash is None
+
+
+def test_timeout_is_503_and_keeps_the_slot_until_the_job_ends(monkeypatch):
+    monkeypatch.setattr(auth, "PASSWORD_TIMEOUT", 0.2)
+    auth.run_in_password_pool(time.sleep, 0)  # pool started
+
+    with pytest.raises(HTTPException) as exc:
+        auth.run_in_password_pool(time.sleep, 1.5)
+    assert exc.value.status_code == 503
+
+    # The sleep is still running in the pool, so its slot is still taken
+    with pytest.raises(HTTPException) as exc:
+        auth.run_in_password_pool(time.sleep, 0)
+    assert exc.value.detail == "Server busy, please retry"
+
+    time.sleep(2)
+    assert auth.run_in_password_pool(time.sleep, 0) is None
+
+
+def test_dead_worker_is_503_and_the_pool_is_recreated():
+    auth.run_in_password_pool(time.sleep, 0)
+    broken = auth._pool
+
+    with pytest.raises(HTTPException) as exc:
+        auth.run_in_password_pool(os._exit, 1)
+    assert exc.value.status_code == 503
+
+    assert auth.run_in_password_pool(time.sleep, 0) is None
+    assert auth._pool is not broken
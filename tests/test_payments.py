@@ -0,0 +1,256 @@
+import base64
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.models import Order, Payment
+from app.payments import client as provider_client, mpesa, stripe
+from app.payments.client import CircuitBreaker
+from app.payments.dispatcher import PaymentDispatcher
+
+# Stripe and M-Pesa talk to a local stub server; each test scripts its
+# responses per path.
+
+
+class StubProvider(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.routes = {}    # path -> list of (delay seconds, status, body); the last one repeats
+        self.requests = []  # (path, headers, body)
+        self.release = threading.Event()  # a delay of None waits for this
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def _respond(self):
+        path = self.path.split("?")[0]
+        length = int(self.headers.get("Content-Length") or 0)
+        self.server.requests.append((path, dict(self.headers), self.rfile.read(length)))
+        script = self.server.routes[path]
+        delay, status, body = script.pop(0) if len(script) > 1 else script[0]
+        if delay is None:
+            self.server.release.wait(5)
+        else:
+            time.sleep(delay)
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except OSError:
+            pass  # the client gave up waiting
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    server = StubProvider()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.routes["/oauth/v1/generate"] = [(0, 200, {"access_token": "token", "expires_in": "3599"})]
+
+    monkeypatch.setattr(provider_client, "PAYMENT_READ_TIMEOUT", 0.3)
+    monkeypatch.setattr(provider_client, "PAYMENT_HTTP_BACKOFF", 0)
+    for module in (mpesa, stripe):
+        monkeypatch.setattr(module.client, "base_url", server.url)
+        monkeypatch.setattr(module.client, "breaker", CircuitBreaker(module.client.name))
+    monkeypatch.setattr(stripe, "STRIPE_SECRET_KEY", "sk_test")
+    for name, value in (("CONSUMER_KEY", "key"), ("CONSUMER_SECRET", "secret"),
+                        ("SHORTCODE", "174379"), ("PASSKEY", "passkey")):
+        monkeypatch.setattr(mpesa, f"MPESA_{name}", value)
+    monkeypatch.setattr(mpesa, "_token", {"value": None, "expires": 0.0})
+    try:
+        yield server
+    finally:
+        server.release.set()
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def make_payment(db):
+    def make(provider="MPESA"):
+        order = Order(source="ONLINE", total=100, currency="KES")
+        db.add(order)
+        db.flush()
+        payment = Payment(order_id=order.id, provider=provider, status="PENDING", amount=100, phone="254700000000")
+        db.add(payment)
+        db.commit()
+        return payment.id
+
+    return make
+
+
+def _payment(db, payment_id) -> Payment:
+    db.expire_all()
+    return db.get(Payment, payment_id)
+
+
+def _sent(provider, path) -> int:
+    return sum(1 for p, _, _ in provider.requests if p == path)
+
+
+STK_PUSH = "/mpesa/stkpush/v1/processrequest"
+STK_QUERY = "/mpesa/stkpushquery/v1/query"
+
+
+def test_stk_push_is_reconciled_through_the_status_query(db, provider, make_payment):
+    provider.routes[STK_PUSH] = [(0, 200, {"ResponseCode": "0", "CheckoutRequestID": "ws_CO_1"})]
+    provider.routes[STK_QUERY] = [(0, 200, {"ResponseCode": "0", "ResultCode": "0", "ResultDesc": "ok"})]
+    payment_id = make_payment()
+    dispatcher = PaymentDispatcher()
+
+    dispatcher.run_once()
+    payment = _payment(db, payment_id)
+    assert (payment.status, payment.reference) == ("PROCESSING", "ws_CO_1")
+    assert _sent(provider, STK_QUERY) == 0
+
+    # The customer has had time to answer the prompt
+    payment.next_attempt_at = datetime.utcnow()
+    db.commit()
+    dispatcher.run_once()
+    assert _payment(db, payment_id).status == "SUCCESS"
+    query = json.loads(next(body for path, _, body in provider.requests if path == STK_QUERY))
+    assert query["CheckoutRequestID"] == "ws_CO_1"
+    assert _sent(provider, STK_PUSH) == 1
+
+
+def test_stk_push_read_timeout_is_not_resent(db, provider, make_payment):
+    provider.routes[STK_PUSH] = [(1, 200, {"ResponseCode": "0", "CheckoutRequestID": "ws_CO_1"})]
+    payment_id = make_payment()
+    dispatcher = PaymentDispatcher()
+
+    dispatcher.run_once()
+    dispatcher.run_once()
+
+    payment = _payment(db, payment_id)
+    assert payment.status == "UNKNOWN"
+    assert "ReadTimeout" in payment.last_error
+    assert _sent(provider, STK_PUSH) == 1
+    assert dispatcher.counters["unknown"] == 1
+
+
+def test_stk_push_gateway_error_is_not_resent(db, provider, make_payment):
+    provider.routes[STK_PUSH] = [(0, 502, {"errorMessage": "bad gateway"})]
+    payment_id = make_payment()
+
+    PaymentDispatcher().run_once()
+
+    assert _payment(db, payment_id).status == "UNKNOWN"
+    assert _sent(provider, STK_PUSH) == 1
+
+
+def test_stk_push_is_retried_when_it_never_connected(db, provider, make_payment, monkeypatch):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        closed_port = sock.getsockname()[1]
+    mpesa._token.update(value="token", expires=time.monotonic() + 600)
+    monkeypatch.setattr(mpesa.client, "base_url", f"http://127.0.0.1:{closed_port}")
+    payment_id = make_payment()
+
+    PaymentDispatcher().run_once()
+
+    payment = _payment(db, payment_id)
+    assert payment.status == "PENDING"
+    assert payment.attempts == 1
+    assert "ConnectionError" in payment.last_error
+
+
+def test_stripe_read_timeout_is_retried_with_the_same_key(db, provider, make_payment):
+    provider.routes["/v1/payment_intents"] = [
+        (1, 200, {"id": "pi_1", "status": "processing"}),
+        (0, 200, {"id": "pi_1", "status": "succeeded"}),
+    ]
+    payment_id = make_payment("STRIPE")
+
+    PaymentDispatcher().run_once()
+
+    assert _payment(db, payment_id).status == "SUCCESS"
+    keys = [headers["Idempotency-Key"] for path, headers, _ in provider.requests if path == "/v1/payment_intents"]
+    assert keys == [f"payment-{payment_id}"] * 2
+
+
+def test_token_refresh_does_not_hold_the_lock(provider):
+    provider.routes["/oauth/v1/generate"] = [(None, 200, {"access_token": "token", "expires_in": "3599"})]
+    refresh = threading.Thread(target=mpesa.access_token)
+    refresh.start()
+    while not provider.requests:
+        time.sleep(0.01)
+
+    # The token endpoint is stalled; the cached value is still readable
+    assert mpesa._token_lock.acquire(timeout=1)
+    mpesa._token_lock.release()
+
+    provider.release.set()
+    refresh.join(5)
+    assert mpesa.access_token() == "token"
+    assert _sent(provider, "/oauth/v1/generate") == 1
+
+
+def test_stk_push_is_committed_as_sending_before_the_call(db, provider, make_payment):
+    provider.routes[STK_PUSH] = [(None, 200, {"ResponseCode": "0", "CheckoutRequestID": "ws_CO_1"})]
+    payment_id = make_payment()
+    worker = threading.Thread(target=PaymentDispatcher().run_once)
+    worker.start()
+    while not _sent(provider, STK_PUSH):
+        time.sleep(0.01)
+
+    # Visible to other sessions while the push is in flight
+    assert _payment(db, payment_id).status == "SENDING"
+    provider.release.set()
+    worker.join(5)
+    assert (_payment(db, payment_id).status, _payment(db, payment_id).reference) == ("PROCESSING", "ws_CO_1")
+
+
+def test_send_stalled_by_a_dead_worker_is_not_resent(db, provider, make_payment):
+    provider.routes[STK_PUSH] = [(0, 200, {"ResponseCode": "0", "CheckoutRequestID": "ws_CO_1"})]
+    payment_id = make_payment()
+    # The worker committed SENDING and died before recording the outcome
+    payment = _payment(db, payment_id)
+    payment.status, payment.next_attempt_at = "SENDING", datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    dispatcher = PaymentDispatcher()
+
+    dispatcher.run_once()
+    dispatcher.run_once()
+
+    payment = _payment(db, payment_id)
+    assert (payment.status, payment.next_attempt_at) == ("UNKNOWN", None)
+    assert _sent(provider, STK_PUSH) == 0
+    assert dispatcher.counters["unknown"] == 1
+
+
+def test_stk_password_uses_nairobi_time(monkeypatch):
+    monkeypatch.setattr(mpesa, "MPESA_SHORTCODE", "174379")
+    monkeypatch.setattr(mpesa, "MPESA_PASSKEY", "passkey")
+    local_tz = os.environ.get("TZ")
+    os.environ["TZ"] = "America/Los_Angeles"
+    time.tzset()
+    try:
+        password, timestamp = mpesa._password()
+    finally:
+        if local_tz is None:
+            del os.environ["TZ"]
+        else:
+            os.environ["TZ"] = local_tz
+        time.tzset()
+    nairobi = datetime.utcnow() + timedelta(hours=3)  # EAT, no DST
+    assert abs(datetime.strptime(timestamp, "%Y%m%d%H%M%S") - nairobi) < timedelta(seconds=5)
+    assert base64.b64decode(password).decode() == f"174379passkey{timestamp}"
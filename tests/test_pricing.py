@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models import PriceRule
+from app.routes import pricing
+from app.services.pricing import price_index
+
+NOW = datetime(2026, 6, 1, 12, 0)
+
+
+@pytest.fixture
+def add_rule(db):
+    def add(variant_id, price, segment=None, region=None, start=None, end=None, active=True):
+        rule = PriceRule(
+            product_variant_id=variant_id, price=price, customer_segment=segment, region=region,
+            start_time=start, end_time=end, active=active
+        )
+        db.add(rule)
+        db.commit()
+        return rule.id
+
+    return add
+
+
+def resolved_price(db, variant_id, segment=None, region=None, at=NOW):
+    price_index.ensure_loaded(db)
+    found = price_index.resolve(variant_id, segment, region, at)
+    return found[1] if found else None
+
+
+def test_most_specific_rule_wins(db, make_variant, add_rule):
+    variant_id = make_variant(price=100)
+    add_rule(variant_id, 90)
+    add_rule(variant_id, 85, region="KE")
+    add_rule(variant_id, 80, segment="vip")
+    add_rule(variant_id, 70, segment="vip", region="KE")
+    add_rule(variant_id, 1, active=False)
+
+    assert resolved_price(db, variant_id, "vip", "KE") == 70
+    assert resolved_price(db, variant_id, "vip", "UG") == 80
+    assert resolved_price(db, variant_id, None, "KE") == 85
+    assert resolved_price(db, variant_id, "retail", "UG") == 90
+    assert resolved_price(db, make_variant(price=100)) is None
+
+
+def test_latest_started_rule_in_effect_wins(db, make_variant, add_rule):
+    variant_id = make_variant(price=100)
+    add_rule(variant_id, 90, start=NOW - timedelta(days=30))
+    sale = add_rule(variant_id, 60, start=NOW - timedelta(days=1), end=NOW + timedelta(days=1))
+    add_rule(variant_id, 50, start=NOW + timedelta(days=7))
+
+    price_index.ensure_loaded(db)
+    assert price_index.resolve(variant_id, None, None, NOW) == (sale, 60)
+    # Before the sale, after it ended (the older rule still runs), and once
+    # the future rule starts
+    assert resolved_price(db, variant_id, at=NOW - timedelta(days=2)) == 90
+    assert resolved_price(db, variant_id, at=NOW + timedelta(days=2)) == 90
+    assert resolved_price(db, variant_id, at=NOW + timedelta(days=8)) == 50
+    assert resolved_price(db, variant_id, at=NOW - timedelta(days=31)) is None
+
+
+def test_added_rule_is_indexed_without_a_reload(db, make_variant, add_rule):
+    variant_id = make_variant(price=100)
+    add_rule(variant_id, 90)
+    price_index.ensure_loaded(db)
+
+    rule = PriceRule(product_variant_id=variant_id, price=40, start_time=NOW - timedelta(hours=1), active=True)
+    db.add(rule)
+    db.commit()
+    price_index.add(rule)
+    assert resolved_price(db, variant_id) == 40
+
+
+def test_concurrent_requests_share_one_reload(db, make_variant, add_rule, monkeypatch):
+    add_rule(make_variant(price=100), 90)
+    loads = []
+    load = price_index.load
+
+    def slow_load(session):
+        loads.append(1)
+        time.sleep(0.2)
+        load(session)
+
+    monkeypatch.setattr(price_index, "load", slow_load)
+    barrier = threading.Barrier(8)
+
+    def request():
+        barrier.wait()
+        price_index.ensure_loaded(db)
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+
+
+def test_quote_endpoint(db, make_variant, add_rule):
+    ruled, plain = make_variant(price=100), make_variant(price=30)
+    rule_id = add_rule(ruled, 70, segment="vip", region="KE")
+    app = FastAPI()
+    app.include_router(pricing.router)
+
+    response = TestClient(app).post("/pricing/quote", json={
+        "items": [
+            {"product_variant_id": ruled, "quantity": 2},
+            {"product_variant_id": plain, "quantity": 1},
+            {"product_variant_id": 999999, "quantity": 1},
+            {"product_variant_id": ruled, "quantity": 1},
+        ],
+        "customer_segment": "vip",
+        "region": "KE",
+    })
+    assert response.status_code == 200
+    body = response.json()
+    lines = {line["product_variant_id"]: line for line in body["lines"]}
+    assert (lines[ruled]["quantity"], lines[ruled]["unit_price"], lines[ruled]["price_rule_id"]) == (3, 70, rule_id)
+    assert lines[ruled]["line_total"] == 210
+    assert (lines[plain]["unit_price"], lines[plain]["price_rule_id"]) == (30, None)
+    assert lines[999999]["error"] == "Unknown variant"
+    assert body["subtotal"] == 240
@@ -0,0 +1,152 @@
+import csv
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models import ImportJob, Inventory, Product, ProductVariant
+from app.routes import products
+from app.services import product_import
+from app.services.search import SearchService
+
+FIELDS = ["name", "url", "description", "sku", "price", "size", "color"]
+
+
+@pytest.fixture
+def search(monkeypatch):
+    service = SearchService()
+    monkeypatch.setattr(product_import, "product_search", service)
+    return service
+
+
+@pytest.fixture
+def run_import(db, tmp_path, search):
+    """
+    run_import(rows, format="csv") -> job status dict, run synchronously.
+    """
+    def run(rows, format="csv"):
+        path = tmp_path / f"upload.{format}"
+        with open(path, "w", newline="", encoding="utf-8") as fh:
+            if format == "csv":
+                writer = csv.DictWriter(fh, FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                fh.writelines(row if isinstance(row, str) else json.dumps(row) + "\n" for row in rows)
+        job = ImportJob(filename=path.name, format=format, status="PENDING")
+        db.add(job)
+        db.commit()
+        product_import.run_job(job.id, str(path))
+        db.expire_all()
+        return product_import.job_status(db.get(ImportJob, job.id))
+
+    return run
+
+
+def row(n, sku=None, price=None, **fields):
+    values = {"name": f"Shirt {n}", "url": f"/shirt-{n}", "description": "cotton", "sku": sku, "price": price}
+    values.update(fields)
+    return values
+
+
+def test_upserts_by_url_and_sku(db, run_import, make_warehouse):
+    warehouse_id = make_warehouse()
+    status = run_import([row(1, "S1-M", 10, size="M"), row(1, "S1-L", 12, size="L"), row(2)])
+    assert (status["status"], status["rows_imported"], status["rows_failed"]) == ("DONE", 3, 0)
+    assert db.query(Product).count() == 2
+    assert db.query(ProductVariant).count() == 2
+    # New variants are fanned out to every warehouse
+    assert db.query(Inventory).filter(Inventory.warehouse_id == warehouse_id).count() == 2
+
+    versions = dict(db.query(Product.url, Product.version))
+    status = run_import([row(1, "S1-M", 11, name="Shirt One"), row(2, "S1-L", 15)])
+    assert status["rows_imported"] == 2
+    assert db.query(Product).count() == 2
+    assert db.query(Product.name).filter(Product.url == "/shirt-1").scalar() == "Shirt One"
+    moved = db.query(ProductVariant).filter(ProductVariant.sku == "S1-L").one()
+    assert (moved.price, moved.product.url) == (15, "/shirt-2")
+    assert db.query(ProductVariant.price).filter(ProductVariant.sku == "S1-M").scalar() == 11
+    # Both products changed (S1-L moved between them): their cached copies are stale
+    assert all(version > versions[url] for url, version in db.query(Product.url, Product.version))
+
+
+def test_bad_rows_are_reported_and_skipped(db, run_import):
+    status = run_import([
+        row(1, "S1", 10),
+        {"name": "", "url": "/no-name"},
+        row(3, "S3", "free"),
+        row(4, "S4", -1),
+        "{not json\n",
+        row(6),
+    ], format="ndjson")
+
+    assert (status["status"], status["rows_processed"], status["rows_imported"], status["rows_failed"]) == (
+        "DONE", 6, 2, 4
+    )
+    assert [(e["row"], e["error"].split(":")[0]) for e in status["errors"]] == [
+        (2, "name is required"),
+        (3, "price must be a number when sku is given"),
+        (4, "price must be greater than 0"),
+        (5, "invalid JSON"),
+    ]
+    assert sorted(url for (url,) in db.query(Product.url)) == ["/shirt-1", "/shirt-6"]
+
+
+def test_job_moves_through_running_to_done(db, run_import, monkeypatch):
+    seen = []
+    upsert = product_import._upsert_batch
+
+    def watch(session, products, variants):
+        seen.append(session.get(ImportJob, session.query(ImportJob.id).scalar()).status)
+        return upsert(session, products, variants)
+
+    monkeypatch.setattr(product_import, "_upsert_batch", watch)
+    status = run_import([row(1), row(2)])
+    assert seen == ["RUNNING"]
+    assert status["status"] == "DONE"
+    assert status["finished_at"] is not None
+
+
+def test_unreadable_upload_fails_the_job(db, run_import, tmp_path):
+    path = tmp_path / "broken.csv"
+    path.write_bytes(b"name,url\n\xff\xfe,/bad\n")
+    job = ImportJob(filename="broken.csv", format="csv", status="PENDING")
+    db.add(job)
+    db.commit()
+
+    product_import.run_job(job.id, str(path))
+    db.expire_all()
+    status = product_import.job_status(db.get(ImportJob, job.id))
+    assert status["status"] == "FAILED"
+    assert "codec" in status["errors"][-1]["error"]
+    assert not path.exists()
+
+
+def test_search_is_refreshed_once_after_the_last_batch(db, run_import, search, monkeypatch):
+    monkeypatch.setattr(product_import, "IMPORT_BATCH_SIZE", 2)
+    calls = []
+    reindex = search.reindex
+
+    def recording_reindex(session, product_ids):
+        calls.append(sorted(product_ids))
+        reindex(session, product_ids)
+
+    monkeypatch.setattr(search, "reindex", recording_reindex)
+    run_import([row(n, f"S{n}", 10) for n in range(1, 6)])
+
+    assert len(calls) == 1
+    assert len(calls[0]) == 5
+    assert [r["name"] for r in search.index.search("shirt 3", prefix=False)] == ["Shirt 3"]
+
+
+def test_import_status_endpoint(db, run_import):
+    status = run_import([row(1)])
+    app = FastAPI()
+    app.include_router(products.router)
+    http = TestClient(app)
+
+    response = http.get(f"/products/import/{status['job_id']}")
+    assert response.status_code == 200
+    assert response.json()["rows_imported"] == 1
+    assert http.get("/products/import/999999").status_code == 404
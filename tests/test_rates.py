@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from app.routes.pricing import create_shipping_rate, create_tax_rule
+from app.schemas.pricing import ShippingRateCreate, TaxRuleCreate
+from app.services import rates
+from app.services.rates import shipping_rates, tax_rates
+
+
+def test_rate_writes_swap_in_a_rebuilt_table(db):
+    create_tax_rule(TaxRuleCreate(region="KE", tax_percentage=16), db)
+    create_shipping_rate(ShippingRateCreate(country="KE", min_weight=0, max_weight=10, price=300), db)
+
+    assert tax_rates.percentage("ke") == 16
+    assert shipping_rates.cost("KE", 2) == 300
+
+    create_tax_rule(TaxRuleCreate(region="KE", tax_percentage=2), db)
+    assert tax_rates.percentage("KE") == 18
+
+
+def test_readers_keep_the_old_table_during_a_rebuild(db, monkeypatch):
+    create_tax_rule(TaxRuleCreate(region="KE", tax_percentage=16), db)
+
+    building, release = threading.Event(), threading.Event()
+    original = rates.TaxTable._build
+
+    def slow_build(self, session):
+        data = original(self, session)
+        building.set()
+        release.wait(5)
+        return data
+
+    monkeypatch.setattr(rates.TaxTable, "_build", slow_build)
+    writer = threading.Thread(target=create_tax_rule, args=(TaxRuleCreate(region="KE", tax_percentage=2), db))
+    writer.start()
+    building.wait(5)
+    try:
+        # An in-flight checkout still prices tax from the previous table
+        assert tax_rates.percentage("KE") == 16
+    finally:
+        release.set()
+        writer.join()
+    assert tax_rates.percentage("KE") == 18
+
+
+def test_expired_table_is_reloaded_once(db, monkeypatch):
+    create_tax_rule(TaxRuleCreate(region="KE", tax_percentage=16), db)
+    tax_rates._loaded_at = 0.0  # as if RATES_TTL had passed
+    builds = []
+    original = rates.TaxTable._build
+
+    def slow_build(self, session):
+        builds.append(1)
+        time.sleep(0.2)
+        return original(self, session)
+
+    monkeypatch.setattr(rates.TaxTable, "_build", slow_build)
+    barrier = threading.Barrier(8)
+
+    def request():
+        barrier.wait()
+        tax_rates.ensure_loaded(db)
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert builds == [1]
+    assert tax_rates.percentage("KE") == 16
+
+
+def test_rate_table_without_a_builder_cannot_be_created():
+    class Incomplete(rates._RateTable):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,61 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models import Product
+from app.routes import products
+from app.services.search import SearchIndex, SearchService
+
+
+@pytest.fixture
+def search(monkeypatch):
+    service = SearchService()
+    monkeypatch.setattr(products, "product_search", service)
+    return service
+
+
+def test_product_deleted_during_a_rebuild_stays_deleted(db, make_variant, search):
+    make_variant()
+    product_id = db.query(Product.id).scalar()
+    app = FastAPI()
+    app.include_router(products.router)
+    http = TestClient(app)
+
+    build = search._build
+
+    def build_then_delete():
+        index = build()  # snapshot still contains the product
+        assert http.delete(f"/products/{product_id}").status_code == 200
+        return index
+
+    search._build = build_then_delete
+    search.rebuild()
+
+    assert search.index.search("Product") == []
+
+
+def test_index_matches_every_word_and_expands_the_last():
+    index = SearchIndex()
+    index.add(1, "Red cotton shirt", "/1", "soft", [("SKU-RC1", "red", "M")], keep_sorted=False)
+    index.add(2, "Blue cotton shirt", "/2", "soft", [("SKU-BC1", "blue", "L")], keep_sorted=False)
+    index.add(3, "Red wool scarf", "/3", "warm", [], keep_sorted=False)
+    index.finish_bulk()
+
+    assert [r["id"] for r in index.search("cotton")] == [1, 2]
+    assert [r["id"] for r in index.search("red shi")] == [1]
+    assert [r["id"] for r in index.search("red shi", prefix=False)] == []
+    assert sorted(r["id"] for r in index.search("red")) == [1, 3]
+    assert [r["id"] for r in index.search("sku bc")] == [2]
+
+
+def test_vocabulary_follows_adds_and_removes():
+    index = SearchIndex()
+    index.add(1, "Linen shirt", "/1", "", [])
+    index.add(2, "Linen dress", "/2", "", [])
+    assert list(index.terms) == ["dress", "linen", "shirt"]
+
+    index.add(1, "Silk shirt", "/1", "", [])  # reindex drops "linen" for 1 only
+    index.remove(2)
+    assert list(index.terms) == ["shirt", "silk"]
+    assert index.search("lin") == []
+    assert [r["id"] for r in index.search("sil")] == [1]
@@ -0,0 +1,159 @@
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.database import SessionLocal
+from app.models import Coupon, Discount, Inventory
+from app.services import coupons, reservations
+from app.services.stock import reserve_stock
+
+THREADS = 24
+
+
+def run_concurrently(target, count=THREADS):
+    barrier = threading.Barrier(count)
+    outcomes = []
+    lock = threading.Lock()
+
+    def worker(n):
+        barrier.wait()
+        outcome = target(n)
+        with lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def checkout(warehouse_id, needed):
+    db = SessionLocal()
+    try:
+        reserve_stock(db, warehouse_id, needed)
+        db.commit()
+        return "ok"
+    except HTTPException as exc:
+        db.rollback()
+        return exc.status_code
+    except Exception:
+        # SQLite answers a competing writer with "database is locked"
+        db.rollback()
+        return "error"
+    finally:
+        db.close()
+
+
+def quantity(db, variant_id, warehouse_id):
+    db.expire_all()
+    return db.query(Inventory.quantity).filter_by(
+        product_variant_id=variant_id, warehouse_id=warehouse_id
+    ).scalar()
+
+
+def test_concurrent_checkouts_never_oversell(db, make_warehouse, make_variant):
+    warehouse_id = make_warehouse()
+    variant_id = make_variant(stock={warehouse_id: 10})
+
+    outcomes = run_concurrently(lambda n: checkout(warehouse_id, {variant_id: 1}))
+
+    remaining = quantity(db, variant_id, warehouse_id)
+    assert remaining >= 0
+    assert outcomes.count("ok") == 10 - remaining
+    if db.bind.dialect.name == "postgresql":
+        assert outcomes.count("ok") == 10
+        assert remaining == 0
+
+
+def test_concurrent_multi_line_checkouts_never_oversell(db, make_warehouse, make_variant):
+    warehouse_id = make_warehouse()
+    first = make_variant(stock={warehouse_id: 6})
+    second = make_variant(stock={warehouse_id: 9})
+
+    # Lines listed in both orders; rows are locked in variant order regardless
+    def target(n):
+        needed = {first: 1, second: 2} if n % 2 else {second: 2, first: 1}
+        return checkout(warehouse_id, needed)
+
+    outcomes = run_concurrently(target)
+
+    succeeded = outcomes.count("ok")
+    assert quantity(db, first, warehouse_id) == 6 - succeeded >= 0
+    assert quantity(db, second, warehouse_id) == 9 - 2 * succeeded >= 0
+    if db.bind.dialect.name == "postgresql":
+        assert succeeded == 4
+
+
+def test_concurrent_holds_never_exceed_stock(db, make_warehouse, make_variant, make_cart):
+    warehouse_id = make_warehouse()
+    variant_id = make_variant(stock={warehouse_id: 5})
+    carts = [make_cart({}) for _ in range(THREADS)]
+
+    def hold(n):
+        session = SessionLocal()
+        try:
+            reservations.place_hold(session, carts[n], variant_id, 1, 1)
+            session.commit()
+            return "ok"
+        except HTTPException as exc:
+            session.rollback()
+            return exc.status_code
+        except Exception:
+            session.rollback()
+            return "error"
+        finally:
+            session.close()
+
+    outcomes = run_concurrently(hold)
+
+    db.expire_all()
+    assert reservations.held(db, [variant_id]).get(variant_id, 0) == outcomes.count("ok") <= 5
+    if db.bind.dialect.name == "postgresql":
+        assert outcomes.count("ok") == 5
+
+
+def test_coupon_usage_limit_allows_exactly_n_redemptions(db):
+    discount = Discount(type="percentage", value=10, active=True)
+    db.add(discount)
+    db.flush()
+    db.add(Coupon(code="LIMITED", discount_id=discount.id, usage_limit=5, times_used=0))
+    db.commit()
+
+    def redeem(n):
+        session = SessionLocal()
+        try:
+            coupons.redeem(session, "LIMITED")
+            session.commit()
+            return "ok"
+        except HTTPException as exc:
+            session.rollback()
+            return exc.status_code
+        except Exception:
+            session.rollback()
+            return "error"
+        finally:
+            session.close()
+
+    outcomes = run_concurrently(redeem)
+
+    db.expire_all()
+    times_used = db.get(Coupon, "LIMITED").times_used
+    assert times_used == outcomes.count("ok") == 5
+    assert outcomes.count(400) == THREADS - 5
+
+
+def test_shortage_leaves_the_callers_transaction_alone(db, make_warehouse, make_variant):
+    warehouse_id = make_warehouse()
+    variant_id = make_variant(stock={warehouse_id: 1})
+    db.add(Coupon(code="PENDING"))
+    db.flush()
+
+    with pytest.raises(HTTPException) as exc:
+        reserve_stock(db, warehouse_id, {variant_id: 2})
+    assert exc.value.status_code == 400
+    # Not rolled back behind our back: the caller decides
+    assert db.query(Coupon).filter_by(code="PENDING").count() == 1
+    db.rollback()
@@ -0,0 +1,81 @@
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app.database import SessionLocal
+from app.models import Discount
+from app.services import coupons, totals
+
+
+def test_discounts_stack_percentage_then_tiered_then_fixed():
+    discounts = [
+        {"discount_id": 3, "type": "fixed", "value": 50},
+        {"discount_id": 2, "type": "tiered", "value": 1000},
+        {"discount_id": 1, "type": "percentage", "value": 10},
+    ]
+    # 2000 -> -10% = 1800 -> tier 5% = 1710 -> -50 = 1660
+    assert totals.apply_discounts(np.array([2000.0]), discounts).tolist() == [340.0]
+
+
+def test_discount_never_exceeds_subtotal():
+    assert totals.apply_discounts(np.array([30.0]), [{"discount_id": 1, "type": "fixed", "value": 50}]).tolist() == [30.0]
+
+
+def test_parse_tiers():
+    assert totals.parse_tiers("5000:10, 1000:5") == [(0.0, 0.0), (1000.0, 5.0), (5000.0, 10.0)]
+    assert totals.parse_tiers("") == [(0.0, 0.0)]
+
+
+def test_only_flagged_discounts_apply_automatically(db):
+    plain = Discount(type="percentage", value=10, active=True)
+    flagged = Discount(type="fixed", value=5, active=True, automatic=True)
+    db.add_all([plain, flagged])
+    db.commit()
+
+    applied = coupons.automatic_discounts(db, None, datetime.utcnow())
+    assert [d["discount_id"] for d in applied] == [flagged.id]
+
+
+def test_automatic_discounts_reload_once_under_load(db):
+    db.add(Discount(type="fixed", value=5, active=True, automatic=True))
+    db.commit()
+    queries = []
+
+    class SlowSession:
+        def __init__(self, session):
+            self.session = session
+
+        def query(self, *columns):
+            queries.append(1)
+            time.sleep(0.2)
+            return self.session.query(*columns)
+
+    barrier = threading.Barrier(8)
+    results = []
+
+    def request():
+        session = SessionLocal()
+        try:
+            barrier.wait()
+            results.append(len(coupons.automatic_discounts(SlowSession(session), None)))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert queries == [1]
+    assert results == [1] * 8
+
+
+def test_many_totals_matches_basket_totals():
+    discounts = [{"discount_id": 1, "type": "percentage", "value": 10}]
+    prices, quantities, index = [10.0, 5.5, 100.0], [2, 3, 1], [0, 0, 1]
+    many = totals.many_totals(index, prices, quantities, 2, discounts, 16)
+    single = totals.basket_totals(prices[:2], quantities[:2], discounts, 16)
+    assert many["total"][0] == single["total"]
+    assert many["total"][1] == round(100 * 0.9 * 1.16, 2)